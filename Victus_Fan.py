@@ -1,153 +1,78 @@
 #rohanshaj _K R
 import tkinter as tk
-import subprocess
-import threading
-import time
-import os
-import psutil
-import json
 import sys
+from fanctl import instrument, nbfc
+from fanctl.controller import FAN_MODES, log_changes
+from fanctl.core import open_core
 
 # Fan mode mapping
-fan_modes = {
-    "Silent": 25,
-    "Balanced": 50,
-    "Performance": 75,
-    "Turbo": 100,
-    "Auto": -1
-}
-
-state_file = "/home/rohan/fan_state.txt"
-current_mode = "Silent"
-auto_mode_enabled = False
+fan_modes = FAN_MODES
+
+# Mode shown in the window; None until the core reports one
+current_mode = None
 nbfc_popup = None
 
 # ------------------ NBFC Fan Control ------------------
-def set_fan_speed(speed):
-    for fan in [0, 1]:
-        try:
-            result = subprocess.run(
-                ["sudo", "/usr/bin/nbfc", "set", "--fan", str(fan), "--speed", str(speed)],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            print(f"[Info] Set fan {fan} to {speed}%: {result.stdout.strip()}")
-        except subprocess.CalledProcessError as e:
-            error = e.stderr.strip() if e.stderr else "Unknown error"
-            print(f"[Error] NBFC fan {fan} (speed {speed}%): {error}")
-        except Exception as e:
-            print(f"[Error] NBFC fan {fan}: {e}")
+NBFC_REFRESH_MS = 3000
+NBFC_COLUMNS = ("Fan", "Mode", "Temp", "Speed", "Target")
 
 def get_nbfc_status():
+    """(nbfc.ServiceStatus or None, error message or None), read from the service state file."""
     try:
-        result = subprocess.run(["sudo", "/usr/bin/nbfc", "status"], capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        return f"[NBFC Error] {e.stderr.strip() if e.stderr else 'Unknown error'}"
-    except Exception as e:
-        return f"[NBFC Error] {e}"
-
-# ------------------ Persistence ------------------
-def save_fan_state(mode):
-    try:
-        with open(state_file, "w") as f:
-            json.dump({"mode": mode}, f)
-        os.chmod(state_file, 0o644)
-    except Exception as e:
-        print(f"[Error] Saving fan state: {e}")
-
-def load_fan_state():
-    try:
-        if os.path.exists(state_file):
-            with open(state_file, "r") as f:
-                data = json.load(f)
-                mode = data.get("mode", "Silent")
-                if mode in fan_modes:
-                    return mode
+        return core.nbfc_status(), None
     except Exception as e:
-        print(f"[Error] Loading fan state: {e}")
-    return "Silent"
-
-# ------------------ Auto Mode ------------------
+        return None, f"[NBFC Error] {e}"
+
+def fan_fields(fan):
+    """Display texts of one fan's columns."""
+    def percent(value):
+        return "N/A" if value is None else f"{value:.0f}%"
+    mode = "N/A" if fan.automode is None else ("Auto" if fan.automode else "Manual")
+    temp = "N/A" if fan.temperature is None else f"{fan.temperature:.0f}°C"
+    return (fan.name + (" (critical)" if fan.critical else ""), mode, temp,
+            percent(fan.current_speed), percent(fan.target_speed))
+
+# ------------------ Modes ------------------
 def apply_mode(mode):
-    global current_mode, auto_mode_enabled
+    global current_mode
     current_mode = mode
-    save_fan_state(mode)
-    if mode == "Auto":
-        auto_mode_enabled = True
-    else:
-        auto_mode_enabled = False
-        set_fan_speed(fan_modes[mode])
+    # The controller persists the mode itself (atomically, off this thread)
+    core.set_mode(mode)
     update_mode_label()
 
-def auto_mode_loop():
-    while True:
-        if auto_mode_enabled:
-            temp = get_cpu_temp()
-            if temp is None:
-                temp = 0
-            if temp < 45:
-                set_fan_speed(fan_modes["Silent"])
-            elif temp < 60:
-                set_fan_speed(fan_modes["Balanced"])
-            elif temp < 75:
-                set_fan_speed(fan_modes["Performance"])
-            else:
-                set_fan_speed(fan_modes["Turbo"])
-        time.sleep(5)
+def on_status(mode, status):
+    global current_mode
+    if mode and mode != current_mode:
+        current_mode = mode
+        root.after(0, update_mode_label)
 
 # ------------------ System Info ------------------
-def get_cpu_temp():
-    try:
-        for hwmon in os.listdir("/sys/class/hwmon/"):
-            name_path = f"/sys/class/hwmon/{hwmon}/name"
-            if os.path.exists(name_path):
-                with open(name_path) as f:
-                    if "k10temp" in f.read().strip():
-                        with open(f"/sys/class/hwmon/{hwmon}/temp1_input") as tf:
-                            return int(tf.read()) / 1000
-    except Exception as e:
-        print(f"[Error] Getting CPU temp: {e}")
-    return None
-
-def get_nvidia_gpu_temp():
-    try:
-        output = subprocess.check_output(["nvidia-smi", "--query-gpu=temperature.gpu", "--format=csv,noheader,nounits"], text=True)
-        return int(output.strip().split('\n')[0])
-    except Exception as e:
-        print(f"[Error] Getting NVIDIA GPU temp: {e}")
-        return None
-
 def get_stats():
-    try:
-        cpu = psutil.cpu_percent(interval=0.1)
-        ram = psutil.virtual_memory()
-        temp = get_cpu_temp()
-        gpu_temp = get_nvidia_gpu_temp()
-        return cpu, ram.percent, temp, gpu_temp
-    except Exception as e:
-        print(f"[Error] Getting stats: {e}")
-        return 0, 0, None, None
+    snapshot = core.snapshot
+    cpu = snapshot.cpu_usage if snapshot.cpu_usage is not None else 0
+    ram = snapshot.ram_percent if snapshot.ram_percent is not None else 0
+    gpu_temp = snapshot.nvidia["temp"] if snapshot.nvidia else None
+    return cpu, ram, snapshot.cpu_temp, gpu_temp
 
 # ------------------ UI ------------------
 def update_mode_label():
-    mode_label.config(text=f"Mode: {current_mode}")
+    mode_label.config(text=f"Mode: {current_mode or 'Loading...'}")
 
 def update_stats_label():
-    cpu, ram, temp, gpu_temp = get_stats()
-    temp_val = temp if temp is not None else 0
-    gpu_val = f"{gpu_temp}°C" if gpu_temp is not None else "N/A"
+    with instrument.stage("ui"):
+        cpu, ram, temp, gpu_temp = get_stats()
+        temp_val = temp if temp is not None else 0
+        gpu_val = f"{gpu_temp}°C" if gpu_temp is not None else "N/A"
 
-    stats_text = f"CPU: {cpu:.1f}%\nRAM: {ram:.1f}%\nCPU Temp: {temp_val:.1f}°C\nNVIDIA GPU: {gpu_val}"
-    stats_label.config(text=stats_text)
+        stats_text = f"CPU: {cpu:.1f}%\nRAM: {ram:.1f}%\nCPU Temp: {temp_val:.1f}°C\nNVIDIA GPU: {gpu_val}"
+        stats_label.config(text=stats_text)
 
-    if temp_val < 50:
-        stats_label.config(fg="green")
-    elif temp_val < 70:
-        stats_label.config(fg="orange")
-    else:
-        stats_label.config(fg="red")
+        if temp_val < 50:
+            stats_label.config(fg="green")
+        elif temp_val < 70:
+            stats_label.config(fg="orange")
+        else:
+            stats_label.config(fg="red")
 
     root.after(3000, update_stats_label)
 
@@ -155,72 +80,155 @@ def on_mode_button(mode):
     apply_mode(mode)
 
 def show_nbfc_popup():
+    """Live NBFC status; only labels whose text changed are touched, nothing runs while hidden."""
     global nbfc_popup
     if nbfc_popup and tk.Toplevel.winfo_exists(nbfc_popup):
         nbfc_popup.lift()
         return
 
     nbfc_popup = tk.Toplevel(root)
-    nbfc_popup.title("NBFC Status - Live")
-    nbfc_popup.geometry("500x400")
-    nbfc_popup.configure(bg="#1e1e1e")
-
-    text_box = tk.Text(nbfc_popup, wrap="word", font=("Courier", 10), bg="#1e1e1e", fg="#cccccc")
-    text_box.pack(fill="both", expand=True, padx=10, pady=10)
+    popup = nbfc_popup
+    popup.title("NBFC Status - Live")
+    popup.geometry("500x400")
+    popup.configure(bg="#1e1e1e")
+
+    style = {"font": ("Courier", 10), "bg": "#1e1e1e", "fg": "#cccccc"}
+    info = tk.Frame(popup, bg="#1e1e1e")
+    info.pack(fill="x", padx=10, pady=10)
+    table = tk.Frame(popup, bg="#1e1e1e")
+    table.pack(fill="x", padx=10)
+    labels = {}
+    shown = {}
+    for row, key in enumerate(("Config", "Temperature", "Service")):
+        tk.Label(info, text=f"{key}:", **style).grid(row=row, column=0, sticky="w")
+        labels[key] = tk.Label(info, text="...", **style)
+        labels[key].grid(row=row, column=1, sticky="w", padx=6)
+    for column, name in enumerate(NBFC_COLUMNS):
+        tk.Label(table, text=name, font=("Courier", 10, "bold"), bg="#1e1e1e", fg="#00d4ff") \
+            .grid(row=0, column=column, sticky="w", padx=6)
+    fan_rows = []
+    refresh = {"visible": True, "job": None}
+
+    def set_text(key, text):
+        # Tk re-lays out a label on every config(), so unchanged text is left alone
+        if shown.get(key) != text:
+            shown[key] = text
+            labels[key].config(text=text)
 
     def update_nbfc_output():
-        if not tk.Toplevel.winfo_exists(nbfc_popup):
+        refresh["job"] = None
+        if not tk.Toplevel.winfo_exists(popup):
             return
-        output = get_nbfc_status()
-        text_box.config(state="normal")
-        text_box.delete("1.0", tk.END)
-        text_box.insert("1.0", output)
-        text_box.config(state="disabled")
-        nbfc_popup.after(3000, update_nbfc_output)
-
+        with instrument.stage("ui"):
+            status, error = get_nbfc_status()
+            if status is None:
+                set_text("Service", error or "No NBFC service state (is nbfc_service running?)")
+                fans = ()
+            else:
+                set_text("Config", status.config or "N/A")
+                set_text("Temperature", "N/A" if status.temperature is None else f"{status.temperature:.1f}°C")
+                set_text("Service", "Running (read-only)" if status.read_only else "Running")
+                fans = status.fans
+            while len(fan_rows) < len(fans):
+                row = len(fan_rows)
+                fan_rows.append([])
+                for column in range(len(NBFC_COLUMNS)):
+                    key = (row, column)
+                    labels[key] = tk.Label(table, text="", **style)
+                    labels[key].grid(row=row + 1, column=column, sticky="w", padx=6)
+                    fan_rows[row].append(key)
+            while len(fan_rows) > len(fans):
+                for key in fan_rows.pop():
+                    labels.pop(key).destroy()
+                    shown.pop(key, None)
+            for row, fan in enumerate(fans):
+                for key, text in zip(fan_rows[row], fan_fields(fan)):
+                    set_text(key, text)
+        schedule()
+
+    def schedule():
+        if refresh["visible"] and refresh["job"] is None:
+            refresh["job"] = popup.after(NBFC_REFRESH_MS, update_nbfc_output)
+
+    def set_visible(visible):
+        refresh["visible"] = visible
+        if not visible and refresh["job"] is not None:
+            popup.after_cancel(refresh["job"])
+            refresh["job"] = None
+        elif visible and refresh["job"] is None:
+            # Catch up at once rather than showing stale values for a cycle
+            update_nbfc_output()
+
+    def on_visibility(event):
+        if event.widget is popup:
+            set_visible(event.state != "VisibilityFullyObscured")
+
+    # Minimised (unmapped) or fully covered by other windows: stop refreshing
+    popup.bind("<Visibility>", on_visibility)
+    popup.bind("<Unmap>", lambda event: event.widget is popup and set_visible(False))
+    popup.bind("<Map>", lambda event: event.widget is popup and set_visible(True))
     update_nbfc_output()
 
-# ------------------ Build GUI ------------------
-root = tk.Tk()
-root.title("Victus Fan Controller")
-root.geometry("340x450")
-root.resizable(False, False)
-root.configure(bg="#1e1e1e")
-
-tk.Label(root, text="HP Victus Fan Control", font=("Helvetica", 16, "bold"), bg="#1e1e1e", fg="#00d4ff").pack(pady=10)
-
-mode_label = tk.Label(root, text="Mode: Loading...", font=("Helvetica", 12), bg="#1e1e1e", fg="#ffffff")
-mode_label.pack(pady=5)
-
-stats_label = tk.Label(root, text="Stats Loading...", font=("Courier", 11), bg="#1e1e1e")
-stats_label.pack(pady=5)
-
-button_frame = tk.Frame(root, bg="#1e1e1e")
-button_frame.pack(pady=10)
-
-btn_style = {
-    "font": ("Arial", 10),
-    "width": 20,
-    "bg": "#333333",
-    "fg": "#ffffff",
-    "activebackground": "#555555",
-    "relief": "ridge",
-    "bd": 2,
-    "highlightthickness": 0
-}
-
-for mode in fan_modes:
-    tk.Button(button_frame, text=mode, command=lambda m=mode: on_mode_button(m), **btn_style).pack(pady=3)
-
-tk.Button(root, text="NBFC Info", command=show_nbfc_popup, bg="#00d4ff", fg="#000000", font=("Arial", 10, "bold")).pack(pady=5)
-tk.Button(root, text="Quit", command=root.destroy, bg="#ff4444", fg="white", font=("Arial", 10, "bold")).pack(pady=10)
-
-# ------------------ Start ------------------
-try:
-    apply_mode(load_fan_state())
-    threading.Thread(target=auto_mode_loop, daemon=True).start()
-    update_stats_label()
-    root.mainloop()
-except Exception as e:
-    print(f"[Error] Application failed: {e}")
-    sys.exit(1)
+if __name__ == "__main__":
+    # ------------------ Build GUI ------------------
+    # The fan-control core samples hardware in the background; the GUI and auto
+    # mode only read its snapshots. An already running fanctl daemon is reused.
+    try:
+        core = open_core(lambda: nbfc.CliBackend(nbfc="/usr/bin/nbfc", sudo=True), interval=3)
+    except PermissionError as e:
+        # A controller we cannot reach still owns the fans; never start a second one
+        print(f"[Error] {e}")
+        sys.exit(1)
+    core.add_status_listener(log_changes())
+    core.add_status_listener(on_status)
+
+    root = tk.Tk()
+    root.title("Victus Fan Controller")
+    root.geometry("340x450")
+    root.resizable(False, False)
+    root.configure(bg="#1e1e1e")
+
+    tk.Label(root, text="HP Victus Fan Control", font=("Helvetica", 16, "bold"), bg="#1e1e1e", fg="#00d4ff").pack(pady=10)
+
+    mode_label = tk.Label(root, text="Mode: Loading...", font=("Helvetica", 12), bg="#1e1e1e", fg="#ffffff")
+    mode_label.pack(pady=5)
+
+    stats_label = tk.Label(root, text="Stats Loading...", font=("Courier", 11), bg="#1e1e1e")
+    stats_label.pack(pady=5)
+
+    button_frame = tk.Frame(root, bg="#1e1e1e")
+    button_frame.pack(pady=10)
+
+    btn_style = {
+        "font": ("Arial", 10),
+        "width": 20,
+        "bg": "#333333",
+        "fg": "#ffffff",
+        "activebackground": "#555555",
+        "relief": "ridge",
+        "bd": 2,
+        "highlightthickness": 0
+    }
+
+    for mode in fan_modes:
+        tk.Button(button_frame, text=mode, command=lambda m=mode: on_mode_button(m), **btn_style).pack(pady=3)
+
+    tk.Button(root, text="NBFC Info", command=show_nbfc_popup, bg="#00d4ff", fg="#000000", font=("Arial", 10, "bold")).pack(pady=5)
+    tk.Button(root, text="Quit", command=root.destroy, bg="#ff4444", fg="white", font=("Arial", 10, "bold")).pack(pady=10)
+
+    # ------------------ Start ------------------
+    try:
+        core.set_visible(True)
+        core.start()
+        # on_status only reports changes: show the mode the core starts (or is already) in
+        current_mode = core.mode or current_mode
+        update_mode_label()
+        update_stats_label()
+        root.mainloop()
+    except Exception as e:
+        print(f"[Error] Application failed: {e}")
+        sys.exit(1)
+    finally:
+        # Sends pending fan targets, restores power limits and reaps nvidia-smi, also after a
+        # failure; the fans stay at the last speed NBFC was given
+        core.stop()
@@ -1,24 +1,26 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import subprocess
-import threading
-import time
+import argparse
+import queue
 import os
-import psutil
-import pystray
-from PIL import Image, ImageDraw
 import sys
-import uuid
-import getpass
-
-# Fan modes with corresponding speed percentages
-fan_modes = {
-    "Silent": 25,
-    "Balanced": 50,
-    "Performance": 75,
-    "Turbo": 100,
-    "Auto": -1
-}
+from fanctl import bootstrap, configs, instrument, nbfc
+from fanctl.controller import FAN_MODES
+from fanctl.core import open_core
+from fanctl.tray import Tray
+
+# tkinter is imported by build_window(), so a tray-only start never loads it
+tk = None
+messagebox = None
+root = None
+setup_window = None
+graph = None
+
+fan_modes = FAN_MODES
+window_shown = False
+# Events from the background NBFC setup and what it found
+setup_events = queue.Queue()
+setup_result = {}
+setup_pending = 0
+gui_started = False
 
 def check_sudo():
     """Check if the script is running with sudo privileges."""
@@ -27,334 +29,422 @@ def check_sudo():
         return False
     return True
 
-def run_command(command, check=False, shell=True):
-    """Run a shell command and return its output, ignoring errors if check=False."""
-    try:
-        result = subprocess.run(command, shell=shell, capture_output=True, text=True, check=check)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        return f"Error: {e.stderr.strip()}"
-
-def setup_nbfc(status_label_setup):
-    """Automate NBFC installation and setup, continuing on failure."""
-    commands = [
-        ("apt update", "Updating package lists"),
-        ("apt install -y git build-essential mono-complete", "Installing dependencies"),
-        ("git clone https://github.com/nbfc-linux/nbfc-linux.git /tmp/nbfc-linux || true", "Cloning NBFC repository"),
-        ("cd /tmp/nbfc-linux && make && make install", "Building and installing NBFC"),
-        ("apt install -y nbfc-linux-probe", "Installing nbfc-linux-probe")
-    ]
-    
-    for cmd, desc in commands:
-        status_label_setup.config(text=f"{desc}...")
-        print(f"Executing: {cmd}")
-        output = run_command(cmd, check=False)
-        if "Error" in output:
-            status_label_setup.config(text=f"Warning: {desc} failed: {output}")
-            time.sleep(2)  # Brief pause to show warning
-        else:
-            status_label_setup.config(text=f"{desc} completed.")
-            time.sleep(1)
-    
-    # Check if NBFC is installed
-    output = run_command("nbfc --version", check=False)
-    if "Error" not in output:
-        return True
-    status_label_setup.config(text="Warning: NBFC not installed, fan control may not work.")
-    return False
-
-def get_nbfc_configs():
-    """Retrieve the list of available NBFC configurations."""
-    output = run_command("nbfc config -l", check=False)
-    if "Error" in output:
-        messagebox.showwarning("Warning", f"Failed to retrieve NBFC configs: {output}\nContinuing with GUI...")
-        return []
-    return output.splitlines()
-
-def apply_nbfc_config(config_name):
-    """Apply the selected NBFC configuration."""
-    output = run_command(f"nbfc config -s \"{config_name}\"", check=False)
-    if "Error" in output:
-        messagebox.showwarning("Warning", f"Failed to apply config {config_name}: {output}\nContinuing with GUI...")
-        return False
-    run_command("systemctl restart nbfc_service", check=False)
-    return True
-
-def get_cpu_temp():
-    """Get CPU temperature from hwmon."""
-    try:
-        for hwmon in os.listdir("/sys/class/hwmon/"):
-            name_path = f"/sys/class/hwmon/{hwmon}/name"
-            if os.path.exists(name_path):
-                with open(name_path) as f:
-                    if "coretemp" in f.read().strip():
-                        temp_path = f"/sys/class/hwmon/{hwmon}/temp1_input"
-                        if os.path.exists(temp_path):
-                            with open(temp_path) as tf:
-                                return int(tf.read()) / 1000
-        return None
-    except:
-        return None
-
-def get_cpu_usage():
-    """Get CPU usage percentage."""
-    return psutil.cpu_percent(interval=0.5)
-
-def get_ram_usage():
-    """Get RAM usage in GB."""
-    mem = psutil.virtual_memory()
-    return mem.used / (1024 ** 3), mem.total / (1024 ** 3)
-
-def get_gpu_info():
-    """Get GPU information (NVIDIA and AMD)."""
-    info = {}
-    try:
-        output = subprocess.check_output([
-            "nvidia-smi", "--query-gpu=name,utilization.gpu,temperature.gpu,memory.used,memory.total",
-            "--format=csv,noheader,nounits"
-        ]).decode().strip()
-        name, usage, temp, mem_used, mem_total = output.split(", ")
-        info["nvidia"] = {
-            "name": name,
-            "usage": int(usage),
-            "temp": int(temp),
-            "mem_used": int(mem_used),
-            "mem_total": int(mem_total)
-        }
-    except:
-        info["nvidia"] = None
-
-    try:
-        for hwmon in os.listdir("/sys/class/hwmon/"):
-            name_path = f"/sys/class/hwmon/{hwmon}/name"
-            if os.path.exists(name_path):
-                with open(name_path) as f:
-                    name = f.read().strip()
-                    if "amdgpu" in name:
-                        temp_path = f"/sys/class/hwmon/{hwmon}/temp1_input"
-                        if os.path.exists(temp_path):
-                            with open(temp_path) as tf:
-                                temp = int(tf.read()) / 1000
-                                info["amd"] = {
-                                    "name": "AMD iGPU",
-                                    "temp": round(temp, 1),
-                                    "usage": None
-                                }
-                                break
-    except:
-        info["amd"] = None
-
-    return info
-
-def set_fan_speed(speed):
-    """Set fan speed for both fans."""
-    try:
-        subprocess.run(["nbfc", "set", "--fan", "0", "--speed", str(speed)], check=True)
-        subprocess.run(["nbfc", "set", "--fan", "1", "--speed", str(speed)], check=True)
-        subprocess.run(["nbfc", "restart"], check=True)
-        status_label.config(text=f"Manual Mode: Set fan speed to {speed}%")
-    except subprocess.CalledProcessError:
-        status_label.config(text="Failed to set fan speed. NBFC may not be configured.")
+def show_status(mode, status):
+    """Mirror the controller mode and status in the GUI; called off the Tk thread."""
+    def update():
+        if mode:
+            current_mode.set(mode)
+        status_label.config(text=status)
+    if root is not None:
+        root.after(0, update)
+
+def on_snapshot(snapshot):
+    """Keep the tray icon current; labels and graph are only redrawn while the window is shown."""
+    tray.update(snapshot)
+    if graph is not None:
+        graph.add(snapshot)
+    if window_shown:
+        root.after(0, update_stats, snapshot)
 
 def apply_mode(mode_name):
     """Apply the selected fan mode."""
-    global auto_mode_enabled
     current_mode.set(mode_name)
-    if mode_name == "Auto":
-        auto_mode_enabled = True
-        status_label.config(text="Auto Mode Enabled")
-    else:
-        auto_mode_enabled = False
-        speed = fan_modes[mode_name]
-        set_fan_speed(speed)
-
-def auto_mode_loop():
-    """Automatically adjust fan speed based on CPU temperature."""
-    while True:
-        if current_mode.get() == "Auto":
-            temp = get_cpu_temp()
-            if temp is not None:
-                if temp < 45:
-                    set_fan_speed(fan_modes["Silent"])
-                elif temp < 60:
-                    set_fan_speed(fan_modes["Balanced"])
-                elif temp < 75:
-                    set_fan_speed(fan_modes["Performance"])
-                else:
-                    set_fan_speed(fan_modes["Turbo"])
-                status_label.config(text=f"Auto Mode: CPU Temp {temp:.1f}°C")
-        time.sleep(10)
-
-def update_stats():
-    """Update system stats in the GUI."""
-    while True:
-        cpu_temp = get_cpu_temp()
-        cpu_usage = get_cpu_usage()
-        gpu_info = get_gpu_info()
-        ram_used, ram_total = get_ram_usage()
+    core.set_mode(mode_name)
 
+def update_stats(snapshot):
+    """Update system stats in the GUI from a sampler snapshot."""
+    with instrument.stage("ui"):
+        cpu_temp = snapshot.cpu_temp
         cpu_temp_label.config(text=f"CPU Temp: {cpu_temp:.1f}°C" if cpu_temp else "CPU Temp: N/A")
-        cpu_usage_label.config(text=f"CPU Usage: {cpu_usage:.1f}%")
-        ram_label.config(text=f"RAM: {ram_used:.1f} / {ram_total:.1f} GB")
-
-        if gpu_info.get("nvidia"):
-            n = gpu_info["nvidia"]
+        usage = f"CPU Usage: {snapshot.cpu_usage:.1f}%" if snapshot.cpu_usage is not None else "CPU Usage: N/A"
+        freqs = [f for f in snapshot.cpu_freqs or () if f]
+        if freqs:
+            usage += f" @ {max(freqs) / 1000:.1f} GHz"
+        if snapshot.throttling:
+            usage += " (throttling)"
+        cpu_usage_label.config(text=usage)
+        ram_label.config(text=f"RAM: {snapshot.ram_used:.1f} / {snapshot.ram_total:.1f} GB" if snapshot.ram_used is not None else "RAM: N/A")
+
+        if snapshot.nvidia:
+            n = snapshot.nvidia
             gpu_n_label.config(text=f"NVIDIA {n['name']}: {n['usage']}% @ {n['temp']}°C ({n['mem_used']}/{n['mem_total']}MB)")
         else:
             gpu_n_label.config(text="NVIDIA: N/A")
 
-        if gpu_info.get("amd"):
-            a = gpu_info["amd"]
+        if snapshot.amd:
+            a = snapshot.amd
             gpu_a_label.config(text=f"{a['name']}: {a['temp']}°C")
         else:
             gpu_a_label.config(text="AMD: N/A")
+    graph.refresh()
 
-        time.sleep(5)
-
-def start_nbfc():
-    """Start the NBFC service."""
-    output = run_command("nbfc start", check=False)
-    if "Error" in output:
-        status_label.config(text="Failed to start NBFC service.")
-
-def create_image():
-    """Create a system tray icon image (purple circle)."""
-    image = Image.new('RGBA', (64, 64), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(image)
-    draw.ellipse((8, 8, 56, 56), fill="#bd93f9")
-    return image
-
-def show_window(icon, item):
+def show_window():
     """Show the main window from the system tray."""
-    icon.stop()
+    global window_shown
+    if root is None:
+        # Tray-only start: the main thread builds the window
+        setup_events.put(("show", None))
+        return
+    tray.stop()
+    window_shown = True
     root.after(0, root.deiconify)
+    root.after(0, graph.set_visible, True)
+    core.set_visible(True)
 
-def exit_app(icon, item):
+def exit_app():
     """Exit the application cleanly."""
-    icon.stop()
-    root.after(0, root.destroy)
+    tray.stop()
+    if root is None:
+        setup_events.put(("exit", None))
+    else:
+        root.after(0, root.destroy)
 
 def on_closing():
     """Hide the window and show the system tray icon."""
+    global window_shown
+    window_shown = False
     root.withdraw()
-    image = create_image()
-    menu = pystray.Menu(
-        pystray.MenuItem('Show', show_window),
-        pystray.MenuItem('Exit', exit_app)
-    )
-    icon = pystray.Icon("Fan Controller", image, "Fan Controller", menu)
-    threading.Thread(target=icon.run, daemon=True).start()
+    graph.set_visible(False)
+    core.set_visible(False)
+    tray.start(core.snapshot)
     status_label.config(text="Window hidden. Tray icon running.")
 
-def setup_and_select_config():
-    """Setup NBFC and prompt user to select a configuration."""
+def open_debug_panel():
+    """Show live per-stage timings of the control loop and offer a profile run."""
+    panel = tk.Toplevel(root)
+    panel.title("Fan Controller Debug")
+    panel.configure(bg="#1e1e2e")
+    was_enabled = core.instrumented, instrument.enabled()
+    core.instrument(True)
+    # UI timings are taken in this process even when the core runs elsewhere
+    instrument.enable()
+    text = tk.Label(panel, text="Collecting...", font=("Courier", 10), justify="left",
+                    bg="#1e1e2e", fg="#f8f8f2")
+    text.pack(padx=10, pady=10)
+    profile_label = tk.Label(panel, text="", bg="#1e1e2e", fg="#ffb86c", wraplength=500)
+
+    def refresh():
+        if not panel.winfo_exists():
+            return
+        stages = dict(core.stats())
+        if "ui" in instrument.stats():
+            stages["ui"] = instrument.stats()["ui"]
+        text.config(text=instrument.format_stats(stages))
+        panel.after(1000, refresh)
+
+    def profile():
+        try:
+            files = core.profile(30)
+        except Exception as e:
+            profile_label.config(text=f"Profiling failed: {e}")
+            return
+        profile_label.config(text="Recording 30 s to " + " and ".join(files))
+
+    def close():
+        core.instrument(was_enabled[0])
+        instrument.enable(was_enabled[1])
+        panel.destroy()
+
+    tk.Button(panel, text="Profile 30 s", command=profile, bg="#bd93f9", fg="#f8f8f2").pack(pady=5)
+    profile_label.pack(pady=5)
+    panel.protocol("WM_DELETE_WINDOW", close)
+    refresh()
+
+def start_gui():
+    """Close the setup window (if any) and start the fan-control core, once."""
+    global gui_started
+    if gui_started:
+        return
+    gui_started = True
+    if setup_window is not None and setup_window.winfo_exists():
+        setup_window.destroy()
+    core.set_visible(window_shown)
+    core.start()
+
+def begin_setup_task():
+    """Poll for setup events until every background task has reported back."""
+    global setup_pending
+    setup_pending += 1
+    if setup_pending == 1:
+        root.after(50, poll_setup_events)
+
+def handle_setup_event(kind, payload):
+    global setup_pending
+    if kind == "step":
+        setup_window.deiconify()
+        status_label_setup.config(text=payload)
+    elif kind == "warning":
+        print(f"[Warning] {payload}")
+        if gui_started:
+            status_label.config(text=f"Warning: {payload}")
+        else:
+            status_label_setup.config(text=f"Warning: {payload}")
+    elif kind == "done":
+        setup_pending -= 1
+        setup_result.update(payload or {})
+        names = setup_result.get("configs", [])
+        if setup_result.get("selected") or not names:
+            start_gui()
+        else:
+            for child in setup_window.winfo_children():
+                child.destroy()
+            open_config_picker(config_index(), setup_window)
+    elif kind == "applied":
+        setup_pending -= 1
+        ok, message = payload
+        status_label.config(text=message if ok else f"Failed to apply config: {message}")
+        if ok:
+            setup_result["selected"] = True
+            core.reapply()
+        start_gui()
+
+def poll_setup_events():
+    """Drain setup events on the Tk thread; workers never touch widgets."""
+    while True:
+        try:
+            kind, payload = setup_events.get_nowait()
+        except queue.Empty:
+            break
+        handle_setup_event(kind, payload)
+    if setup_pending:
+        root.after(50, poll_setup_events)
+
+def open_config_picker(index, window=None):
+    """Let the user pick a model config, best matches for this machine first.
+
+    Typing filters the list as you go; the choice is applied in the background.
+    """
+    window = window or tk.Toplevel(root)
+    window.title("NBFC Config")
+    window.configure(bg="#1e1e2e")
+    window.geometry("")
+    window.deiconify()
+    recommended = set(index.recommended)
+    if recommended:
+        dmi = setup_result.get("dmi", {})
+        machine = f"{dmi.get('sys_vendor', '')} {dmi.get('product_name', '')}".strip()
+        hint = f"★ = recommended for {machine}" if machine else "★ = recommended for this machine"
+    else:
+        hint = "No recommendation for this machine; search by model name."
+    tk.Label(window, text="Select a configuration:", bg="#1e1e2e", fg="#f8f8f2").pack(pady=(10, 0))
+    tk.Label(window, text=hint, bg="#1e1e2e", fg="#ffb86c").pack(pady=(0, 5))
+
+    search_var = tk.StringVar()
+    entry = tk.Entry(window, textvariable=search_var, width=50, bg="#44475a", fg="#f8f8f2", insertbackground="#f8f8f2")
+    entry.pack(padx=10, pady=5)
+    listbox = tk.Listbox(window, width=50, height=12, bg="#282a36", fg="#f8f8f2",
+                         selectbackground="#bd93f9", exportselection=False)
+    listbox.pack(padx=10, pady=5)
+    shown = []
+
+    def refresh(*args):
+        # Tk slows down with thousands of rows; nobody scrolls past the first few hundred
+        shown[:] = index.search(search_var.get(), limit=200)
+        listbox.delete(0, tk.END)
+        for name in shown:
+            listbox.insert(tk.END, f"★ {name}" if name in recommended else name)
+        if shown:
+            listbox.selection_set(0)
+            listbox.see(0)
+
+    def apply(event=None):
+        selection = listbox.curselection()
+        if not selection:
+            return
+        name = shown[selection[0]]
+        status_label.config(text=f"Applying config {name}...")
+        begin_setup_task()
+        bootstrap.apply_config(name, setup_events)
+        window.destroy()
+
+    def cancel():
+        window.destroy()
+        start_gui()
+
+    search_var.trace_add("write", refresh)
+    entry.bind("<Return>", apply)
+    listbox.bind("<Double-Button-1>", apply)
+    tk.Button(window, text="Apply Config", command=apply, bg="#bd93f9", fg="#f8f8f2").pack(pady=10)
+    window.protocol("WM_DELETE_WINDOW", cancel)
+    refresh()
+    entry.focus_set()
+
+def config_index():
+    """Index from the last setup run, or one over the plain config list."""
+    return setup_result.get("index") or configs.ConfigIndex.from_names(setup_result.get("configs", []))
+
+def change_config():
+    """Re-open the config picker from the main window."""
+    open_config_picker(config_index())
+
+def build_setup_window():
+    """Hidden setup window; it only appears for install steps or the config picker."""
+    global setup_window, status_label_setup
     setup_window = tk.Toplevel(root)
+    setup_window.withdraw()
     setup_window.title("NBFC Setup")
     setup_window.geometry("400x300")
     setup_window.configure(bg="#1e1e2e")
 
     tk.Label(setup_window, text="Setting up NBFC...", font=("Helvetica", 14), bg="#1e1e2e", fg="#f8f8f2").pack(pady=10)
-    status_label_setup = tk.Label(setup_window, text="Checking privileges...", bg="#1e1e2e", fg="#f8f8f2")
+    status_label_setup = tk.Label(setup_window, text="Checking NBFC...", bg="#1e1e2e", fg="#f8f8f2", wraplength=380)
     status_label_setup.pack(pady=10)
 
-    def perform_setup():
-        # Check sudo and proceed even if not present
-        has_sudo = check_sudo()
-        if not has_sudo:
-            status_label_setup.config(text="Running without sudo. Some features may be limited.")
-            time.sleep(2)
-
-        # Attempt NBFC setup
-        nbfc_installed = setup_nbfc(status_label_setup)
-
-        # Proceed to configuration selection
-        status_label_setup.config(text="NBFC setup complete. Select a configuration:")
-        configs = get_nbfc_configs()
-        if not configs:
-            status_label_setup.config(text="No configurations found. Starting GUI...")
-            time.sleep(2)
-            setup_window.destroy()
-            start_nbfc()
-            threading.Thread(target=update_stats, daemon=True).start()
-            threading.Thread(target=auto_mode_loop, daemon=True).start()
-            return
+def setup_and_select_config():
+    """Run the NBFC setup in the background and start the GUI when it is done.
+
+    The setup window only appears when an install step runs or no config is
+    selected yet; a warm start goes straight to the main window.
+    """
+    build_setup_window()
+    has_sudo = check_sudo()
+    begin_setup_task()
+    bootstrap.Bootstrap(setup_events, install=has_sudo).start()
+
+def build_window():
+    """Import tkinter and build the main window."""
+    global tk, messagebox, root, window_shown, current_mode, graph
+    global cpu_temp_label, cpu_usage_label, gpu_n_label, gpu_a_label, ram_label, status_label
+    import tkinter as tk
+    from tkinter import messagebox
+    from fanctl.graph import HistoryGraph
+
+    # Main application window
+    root = tk.Tk()
+    root.title("Fan Controller")
+    root.geometry("350x720")
+    root.configure(bg="#1e1e2e")
+    root.protocol("WM_DELETE_WINDOW", on_closing)
+
+    # UI Elements
+    tk.Label(root, text="Fan Modes", font=("Helvetica", 16), bg="#1e1e2e", fg="#f8f8f2").pack(pady=10)
+
+    mode_frame = tk.Frame(root, bg="#1e1e2e")
+    mode_frame.pack()
+
+    current_mode = tk.StringVar()
+    current_mode.set(core.mode or "Silent")
+
+    for mode in fan_modes:
+        tk.Radiobutton(
+            mode_frame,
+            text=mode,
+            variable=current_mode,
+            value=mode,
+            indicatoron=False,
+            width=20,
+            height=2,
+            command=lambda m=mode: apply_mode(m),
+            bg="#44475a",
+            fg="#f8f8f2",
+            activebackground="#6272a4",
+            selectcolor="#bd93f9"
+        ).pack(pady=4)
+
+    tk.Label(root, text="System Stats", font=("Helvetica", 14), bg="#1e1e2e", fg="#ffb86c").pack(pady=10)
+
+    cpu_temp_label = tk.Label(root, text="CPU Temp: ...", bg="#1e1e2e", fg="#50fa7b", font=("Helvetica", 12))
+    cpu_temp_label.pack()
+
+    cpu_usage_label = tk.Label(root, text="CPU Usage: ...", bg="#1e1e2e", fg="#8be9fd", font=("Helvetica", 12))
+    cpu_usage_label.pack()
+
+    gpu_n_label = tk.Label(root, text="NVIDIA: ...", bg="#1e1e2e", fg="#8be9fd", font=("Helvetica", 12))
+    gpu_n_label.pack()
+
+    gpu_a_label = tk.Label(root, text="AMD: ...", bg="#1e1e2e", fg="#ffb86c", font=("Helvetica", 12))
+    gpu_a_label.pack()
+
+    ram_label = tk.Label(root, text="RAM: ...", bg="#1e1e2e", fg="#f1fa8c", font=("Helvetica", 12))
+    ram_label.pack()
+
+    view = HistoryGraph(root)
+    if hasattr(core, "history"):
+        # A core hosted here has been recording since it started
+        view.load(core.history)
+    view.pack(pady=5)
+    # Published only now, so snapshots are buffered after the recorded past
+    graph = view
+
+    status_label = tk.Label(root, text="Initializing...", bg="#1e1e2e", fg="#f8f8f2", font=("Helvetica", 10))
+    status_label.pack(pady=10)
+
+    tk.Button(root, text="NBFC Config", command=change_config, bg="#44475a", fg="#f8f8f2").pack(pady=2)
+    tk.Button(root, text="Debug", command=open_debug_panel, bg="#44475a", fg="#f8f8f2").pack(pady=2)
+    window_shown = True
+
+def run_tray_only():
+    """Show only the tray icon until the window is needed; False if the user exits first.
+
+    The NBFC setup runs as usual. The window is built when Show is clicked,
+    or when setup needs it (an install step, or no config selected yet).
+    """
+    tray.start(core.snapshot)
+    has_sudo = os.geteuid() == 0
+    if not has_sudo:
+        print("[Warning] Running without sudo; NBFC will not be installed or configured.")
+    begin_setup_task()
+    bootstrap.Bootstrap(setup_events, install=has_sudo).start()
+    waiting = None
+    while True:
+        kind, payload = setup_events.get()
+        if kind == "exit":
+            return False
+        if kind == "show":
+            break
+        if kind == "warning":
+            print(f"[Warning] {payload}")
+        elif kind == "done" and (not payload or payload.get("selected") or not payload.get("configs")):
+            # Nothing to ask the user: start the core with the window still unbuilt
+            handle_setup_event(kind, payload)
+        else:
+            waiting = (kind, payload)
+            break
+    tray.stop()
+    build_window()
+    core.set_visible(True)
+    show_status(core.mode, core.status)
+    if core.snapshot.seq:
+        update_stats(core.snapshot)
+    if setup_pending:
+        build_setup_window()
+        if waiting is not None:
+            handle_setup_event(*waiting)
+        root.after(50, poll_setup_events)
+    return True
+
+def main(argv=None):
+    global core, tray
+    parser = argparse.ArgumentParser(description="NBFC fan controller")
+    parser.add_argument("--tray", action="store_true",
+                        help="start in the system tray; the window is only built when Show is clicked")
+    args = parser.parse_args(argv)
+
+    # Attach to a running fanctl daemon, or host the fan-control core here
+    try:
+        core = open_core(nbfc.CliBackend, interval=5)
+    except PermissionError as e:
+        # A controller we cannot reach still owns the fans; never start a second one
+        print(f"[Error] {e}")
+        return 1
+    tray = Tray("Fan Controller", show_window, exit_app)
+    core.add_status_listener(show_status)
+    core.add_snapshot_listener(on_snapshot)
+
+    if args.tray:
+        core.set_visible(False)
+        if not run_tray_only():
+            core.stop()
+            return 0
+    else:
+        build_window()
+        # Start NBFC setup and configuration selection
+        setup_and_select_config()
+
+    root.mainloop()
+    tray.stop()
+    core.stop()
+    return 0
 
-        config_var = tk.StringVar()
-        config_combobox = ttk.Combobox(setup_window, textvariable=config_var, values=configs, state="readonly", width=50)
-        config_combobox.pack(pady=10)
-        config_combobox.set(configs[0])
-
-        def apply_and_close():
-            selected_config = config_var.get()
-            if apply_nbfc_config(selected_config):
-                status_label_setup.config(text=f"Applied config: {selected_config}")
-            else:
-                status_label_setup.config(text=f"Failed to apply config: {selected_config}. Starting GUI...")
-            time.sleep(2)
-            setup_window.destroy()
-            start_nbfc()
-            threading.Thread(target=update_stats, daemon=True).start()
-            threading.Thread(target=auto_mode_loop, daemon=True).start()
-
-        tk.Button(setup_window, text="Apply Config", command=apply_and_close, bg="#bd93f9", fg="#f8f8f2").pack(pady=10)
-
-    threading.Thread(target=perform_setup, daemon=True).start()
-
-# Main application window
-root = tk.Tk()
-root.title("Fan Controller")
-root.geometry("350x550")
-root.configure(bg="#1e1e2e")
-root.protocol("WM_DELETE_WINDOW", on_closing)
-
-# UI Elements
-tk.Label(root, text="Fan Modes", font=("Helvetica", 16), bg="#1e1e2e", fg="#f8f8f2").pack(pady=10)
-
-mode_frame = tk.Frame(root, bg="#1e1e2e")
-mode_frame.pack()
-
-current_mode = tk.StringVar()
-current_mode.set("Silent")
-
-for mode in fan_modes:
-    tk.Radiobutton(
-        mode_frame,
-        text=mode,
-        variable=current_mode,
-        value=mode,
-        indicatoron=False,
-        width=20,
-        height=2,
-        command=lambda m=mode: apply_mode(m),
-        bg="#44475a",
-        fg="#f8f8f2",
-        activebackground="#6272a4",
-        selectcolor="#bd93f9"
-    ).pack(pady=4)
-
-tk.Label(root, text="System Stats", font=("Helvetica", 14), bg="#1e1e2e", fg="#ffb86c").pack(pady=10)
-
-cpu_temp_label = tk.Label(root, text="CPU Temp: ...", bg="#1e1e2e", fg="#50fa7b", font=("Helvetica", 12))
-cpu_temp_label.pack()
-
-cpu_usage_label = tk.Label(root, text="CPU Usage: ...", bg="#1e1e2e", fg="#8be9fd", font=("Helvetica", 12))
-cpu_usage_label.pack()
-
-gpu_n_label = tk.Label(root, text="NVIDIA: ...", bg="#1e1e2e", fg="#8be9fd", font=("Helvetica", 12))
-gpu_n_label.pack()
-
-gpu_a_label = tk.Label(root, text="AMD: ...", bg="#1e1e2e", fg="#ffb86c", font=("Helvetica", 12))
-gpu_a_label.pack()
-
-ram_label = tk.Label(root, text="RAM: ...", bg="#1e1e2e", fg="#f1fa8c", font=("Helvetica", 12))
-ram_label.pack()
-
-status_label = tk.Label(root, text="Initializing...", bg="#1e1e2e", fg="#f8f8f2", font=("Helvetica", 10))
-status_label.pack(pady=10)
-
-auto_mode_enabled = False
-
-# Start NBFC setup and configuration selection
-setup_and_select_config()
-
-root.mainloop() #rohanshaj_KRs
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main()) #rohanshaj_KRs
@@ -0,0 +1 @@
+"""Shared fan-control core used by all_fan.py and Victus_Fan.py."""
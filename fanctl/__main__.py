@@ -0,0 +1,5 @@
+import sys
+
+from fanctl.daemon import main
+
+sys.exit(main())
@@ -0,0 +1,267 @@
+"""Write-coalescing stage between the controller and NBFC.
+
+Controllers call request() as often as they like; only the latest target
+per fan is kept. A worker turns targets into backend writes no more often
+than `min_interval` per fan, moves each fan at most `max_slew` %/s, and
+skips changes smaller than `deadband` unless the request is exact (manual
+modes, overrides) or asks for full speed. Every fan that is due goes out in
+one set_speeds() call, so NBFC gets one batched command.
+
+Hosted by a core, the worker is a task on the core's event loop
+(fanctl.eventloop) and writes go through Backend.set_speeds_async(); without
+a loop every request() flushes synchronously, which is what the benchmark
+drives on its simulated clock.
+
+Instead of checking every write, the actuator reads the backend status
+(the nbfc_service state file) once, `readback_delay` seconds after a burst
+of writes, and re-sends any fan whose target NBFC does not report, or that
+went back to auto control. Each re-send doubles the delay before the next
+readback. A fan that still disagrees after MAX_RESENDS re-sends (the
+firmware quantises its duty, or NBFC clamps it) is taken to be at what NBFC
+reports; that pairing is remembered, so the same request is not re-sent
+again.
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+from fanctl import nbfc
+
+FULL_SPEED = 100
+MAX_BACKOFF = 60.0
+MAX_RESENDS = 3
+# Marks a requested speed NBFC keeps overriding with auto control
+AUTO = "auto"
+
+
+class Actuator:
+    """Coalesces fan-speed requests and paces them into backend writes."""
+
+    def __init__(self, backend, min_interval=2.0, max_slew=25.0, deadband=2,
+                 readback_delay=5.0, clock=time.monotonic, loop=None):
+        self.backend = backend
+        self.min_interval = min_interval
+        self.max_slew = max_slew
+        self.deadband = deadband
+        self.readback_delay = readback_delay
+        self.clock = clock
+        # fanctl.eventloop.EventLoop hosting the worker task, or None
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.targets = {}
+        self.exact = set()
+        self.last_write = {}
+        self.readback_at = None
+        # Re-sends per fan since NBFC last agreed, and {requested speed: what NBFC reports} per fan
+        self.resends = {}
+        self.settled = {}
+        # Failed writes back off exponentially up to MAX_BACKOFF
+        self.failures = 0
+        self.retry_at = None
+        self.error_listeners = []
+        # Counters for the exporter and the benchmark
+        self.requests = 0
+        self.coalesced = 0
+        self.deadband_skips = 0
+        self.slew_limited = 0
+        self.mismatches = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def add_error_listener(self, callback):
+        """Call callback(message) when a write fails; it runs on the loop thread."""
+        self.error_listeners.append(callback)
+
+    def request(self, speeds, exact=False):
+        """Ask for a speed on every fan (int) or per fan ({fan: speed}); returns at once."""
+        if not isinstance(speeds, dict):
+            speeds = {fan: speeds for fan in range(self.backend.fan_count())}
+        with self.lock:
+            self.requests += 1
+            for fan, speed in speeds.items():
+                pending = self.targets.get(fan)
+                if pending is not None and pending != speed and pending != self.backend.applied.get(fan):
+                    # An earlier target is replaced before it reached NBFC
+                    self.coalesced += 1
+                self.targets[fan] = speed
+                if exact:
+                    self.exact.add(fan)
+                else:
+                    self.exact.discard(fan)
+        if self.loop is None:
+            self.flush()
+            return
+        if self.task is None:
+            self.task = self.loop.submit(self.run())
+        self.loop.call(self.wakeup.set)
+
+    def forget(self):
+        """NBFC lost its state (service restart, resume): re-send every target."""
+        self.backend.forget()
+        with self.lock:
+            self.last_write.clear()
+            self.resends.clear()
+            self.settled.clear()
+            self.failures = 0
+            self.retry_at = None
+        if self.loop is not None:
+            self.loop.call(self.wakeup.set)
+
+    def _plan(self, now):
+        """Fans to write now, and the delay until the next fan becomes due."""
+        due, wait = {}, None
+        applied = self.backend.applied
+        for fan, target in self.targets.items():
+            current = applied.get(fan)
+            if current == target:
+                continue
+            if current is not None and self.settled.get(fan, {}).get(target) == current:
+                # NBFC is known to run this request at `current`
+                continue
+            if current is not None and fan not in self.exact and target != FULL_SPEED \
+                    and abs(target - current) < self.deadband:
+                self.deadband_skips += 1
+                self.targets[fan] = current
+                continue
+            elapsed = now - self.last_write.get(fan, float("-inf"))
+            if elapsed < self.min_interval:
+                remaining = self.min_interval - elapsed
+                wait = remaining if wait is None else min(wait, remaining)
+                continue
+            if current is None:
+                # Nothing known about this fan: write the target as is
+                due[fan] = target
+                continue
+            speed = target
+            if self.max_slew and target != FULL_SPEED:
+                step = self.max_slew * min(elapsed, 60.0)
+                if abs(target - current) > step:
+                    speed = round(current + step if target > current else current - step)
+                    self.slew_limited += 1
+                    wait = self.min_interval if wait is None else min(wait, self.min_interval)
+            due[fan] = speed
+        return due, wait
+
+    def _begin(self, now):
+        """(fans to write now, wait) or (None, wait) while backing off."""
+        if self.retry_at is not None and now < self.retry_at:
+            return None, self.retry_at - now
+        with self.lock:
+            due, wait = self._plan(now)
+            for fan in due:
+                self.last_write[fan] = now
+        return due, wait
+
+    def _finish(self, now, wait, written):
+        """Bookkeeping after a write (written is None when nothing was due)."""
+        if written is False:
+            message = self.backend.last_error or "write failed"
+            for callback in list(self.error_listeners):
+                try:
+                    callback(message)
+                except Exception as e:
+                    print(f"[Error] Actuator listener: {e}")
+            backoff = min(self.min_interval * 2 ** self.failures, MAX_BACKOFF)
+            self.failures += 1
+            self.retry_at = now + backoff
+            return backoff
+        if written:
+            self.failures = 0
+            self.retry_at = None
+            self.readback_at = now + self.readback_delay * 2 ** max(self.resends.values(), default=0)
+        if self.readback_at is not None:
+            if now >= self.readback_at:
+                self.readback_at = None
+                if not self.confirm():
+                    wait = 0.0
+            else:
+                remaining = self.readback_at - now
+                wait = remaining if wait is None else min(wait, remaining)
+        return wait
+
+    def flush(self, now=None):
+        """Write whatever is due; returns seconds until more work is due, or None."""
+        now = self.clock() if now is None else now
+        due, wait = self._begin(now)
+        if due is None:
+            return wait
+        return self._finish(now, wait, self.backend.set_speeds(due) if due else None)
+
+    async def flush_async(self):
+        """flush() on the event loop: the write is awaited, not blocked on."""
+        now = self.clock()
+        due, wait = self._begin(now)
+        if due is None:
+            return wait
+        return self._finish(now, wait, await self.backend.set_speeds_async(due) if due else None)
+
+    def confirm(self):
+        """Compare NBFC's reported targets with what was written; False when a fan is re-sent."""
+        status = nbfc.parse_status(self.backend.status())
+        if status is None or not status.fans:
+            return True
+        ok = True
+        with self.backend.lock:
+            applied = self.backend.applied
+            for fan, info in enumerate(status.fans):
+                written = applied.get(fan)
+                if written is None:
+                    continue
+                reported = info.target_speed
+                settled = self.settled.get(fan, {}).get(written)
+                if info.automode:
+                    if settled == AUTO:
+                        continue
+                # The EC may quantise duty cycles slightly
+                elif reported is not None and abs(reported - written) <= 1.5:
+                    self.resends.pop(fan, None)
+                    continue
+                self.mismatches += 1
+                if self.resends.get(fan, 0) < MAX_RESENDS:
+                    self.resends[fan] = self.resends.get(fan, 0) + 1
+                    applied.pop(fan, None)
+                    ok = False
+                    continue
+                # NBFC keeps reporting something else: take that as where the fan is
+                self.resends.pop(fan, None)
+                requested = self.settled.setdefault(fan, {})
+                if info.automode or reported is None:
+                    requested[written] = AUTO
+                    print(f"[Info] NBFC keeps fan {fan} under auto control; not re-sending {written}%",
+                          flush=True)
+                else:
+                    requested[written] = applied[fan] = int(round(reported))
+                    print(f"[Info] NBFC runs fan {fan} at {requested[written]}% when asked for {written}%",
+                          flush=True)
+        if not ok:
+            print("[Info] NBFC reports different fan targets; re-sending", flush=True)
+        return ok
+
+    async def run(self):
+        """Worker task: flush, then sleep until woken or the next fan is due."""
+        while True:
+            try:
+                delay = await self.flush_async()
+            except Exception as e:
+                print(f"[Error] Actuator: {e}")
+                delay = self.min_interval
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def stop(self):
+        """Stop the worker and write any pending targets; runs on the loop."""
+        task, self.task = self.task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await asyncio.wrap_future(task)
+            except (asyncio.CancelledError, concurrent.futures.CancelledError):
+                pass
+        with self.lock:
+            pending = {fan: s for fan, s in self.targets.items() if self.backend.applied.get(fan) != s}
+        if pending:
+            await self.backend.set_speeds_async(pending)
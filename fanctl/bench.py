@@ -0,0 +1,329 @@
+"""Benchmark the control loop against simulated hardware.
+
+Runs the real sampler, controller and NBFC client against fanctl.sim, in
+simulated time: either closed loop, with a synthetic load scenario driving
+the thermal model, or open loop, replaying temperatures recorded in a
+history log (or a CSV with time and cpu_temp columns). For each run it
+reports
+
+    commands     nbfc processes spawned
+    overshoot    max and mean °C above the band (mean over the time above it)
+    in_band      share of the time CPU and GPU both stayed within the band
+    cpu_us       controller thread CPU time per tick (sampling + control step)
+    throttled_s  seconds the simulated CPU and GPU spent thermally throttled
+    io_calls     read/write syscalls per tick, from /proc/self/io
+
+Usage:
+
+    python3 -m fanctl.bench                       # every scenario
+    python3 -m fanctl.bench burst gaming --json out.json
+    python3 -m fanctl.bench --trace /var/lib/fanctl/history.bin
+    python3 -m fanctl.bench --baseline out.json   # exit 1 on a regression
+"""
+import argparse
+import csv
+import json
+import random
+import sys
+import time
+from collections import namedtuple
+
+from fanctl import curve, fanmap, gpu, history, hwmon, nbfc, sim
+from fanctl.actuator import Actuator
+from fanctl.controller import FAN_MODES, Controller
+from fanctl.cpustate import CpuMonitor
+from fanctl.eventloop import EventLoop
+from fanctl.powercap import PowerLimiter
+from fanctl.sampler import Sampler
+from fanctl.schedule import AdaptiveInterval
+
+# model: ThermalModel keyword arguments, for machines that differ from the default
+Scenario = namedtuple("Scenario", "duration load description model", defaults=(None,))
+
+
+def _bursty(t):
+    return {"cpu": 1.0 if t % 60 < 20 else 0.1, "gpu": 0.0}
+
+
+SCENARIOS = {
+    "idle": Scenario(600, lambda t: {"cpu": 0.05, "gpu": 0.0}, "desktop idle"),
+    "burst": Scenario(600, lambda t: {"cpu": 1.0 if 60 <= t < 180 else 0.05, "gpu": 0.0},
+                      "two minutes of full CPU load"),
+    "bursty": Scenario(600, _bursty, "20 s of full load every minute"),
+    "compile": Scenario(900, lambda t: {"cpu": 0.9, "gpu": 0.0}, "sustained CPU load"),
+    "gaming": Scenario(900, lambda t: {"cpu": 0.5, "gpu": 0.9 if t >= 60 else 0.05},
+                       "moderate CPU, heavy GPU"),
+    "dusty": Scenario(900, lambda t: {"cpu": 0.95, "gpu": 0.0},
+                      "sustained CPU load the fans cannot keep up with", {"fan_gain": 0.25}),
+}
+
+# metric: True when higher is better
+METRICS = {"commands": False, "max_overshoot": False, "mean_overshoot": False,
+           "in_band": True, "cpu_us": False, "io_calls": False, "throttled_s": False}
+
+
+class ThermalPlant:
+    """Closed loop: scenario load through the thermal model."""
+
+    def __init__(self, scenario, seed=1):
+        self.scenario = scenario
+        self.duration = scenario.duration
+        self.model = sim.ThermalModel(**(scenario.model or {}))
+        self.rng = random.Random(seed)
+        self.loads = {}
+        # Package power limit in W per node, as the limiter left it
+        self.limits = {}
+
+    @property
+    def temps(self):
+        return self.model.temps
+
+    @property
+    def throttle_count(self):
+        return self.model.throttle_events["cpu"]
+
+    @property
+    def throttled(self):
+        return sum(self.model.throttled.values())
+
+    def step(self, t, dt, targets):
+        loads = self.scenario.load(t)
+        # A little jitter so the curves see realistic, not perfectly smooth, input
+        self.loads = {n: min(max(v + self.rng.uniform(-0.05, 0.05), 0.0), 1.0) for n, v in loads.items()}
+        self.model.step(dt, self.loads, targets, self.limits)
+
+
+class Replay:
+    """Open loop: recorded temperatures, whatever the fans do."""
+
+    def __init__(self, records):
+        self.records = records
+        self.duration = records[-1][0] if records else 0.0
+        self.index = 0
+        self.temps = {"cpu": records[0][1], "gpu": records[0][2]} if records else {}
+        self.loads = {}
+        # Recorded temperatures say nothing about throttling
+        self.throttle_count = 0
+        self.throttled = None
+        self.limits = {}
+
+    def step(self, t, dt, targets):
+        while self.index + 1 < len(self.records) and self.records[self.index + 1][0] <= t:
+            self.index += 1
+        _, cpu, gpu_temp = self.records[self.index]
+        self.temps = {"cpu": cpu, "gpu": gpu_temp}
+
+
+def load_trace(path):
+    """(seconds from start, cpu temp, gpu temp) from a history log or CSV."""
+    with open(path, "rb") as f:
+        binary = f.read(len(history.MAGIC)) == history.MAGIC
+    rows = []
+    if binary:
+        for rec in history.read_log(path):
+            rows.append((rec["time"], rec["cpu_temp"], rec["nvidia_temp"] or rec["amd_temp"]))
+    else:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                stamp = row["time"]
+                try:
+                    ts = float(stamp)
+                except ValueError:
+                    ts = time.mktime(time.strptime(stamp, "%Y-%m-%d %H:%M:%S"))
+                gpu_temp = row.get("nvidia_temp") or row.get("amd_temp") or row.get("gpu_temp")
+                rows.append((ts, float(row["cpu_temp"]) if row.get("cpu_temp") else None,
+                             float(gpu_temp) if gpu_temp else None))
+    rows = [r for r in rows if r[1] is not None]
+    if not rows:
+        raise ValueError(f"{path} has no CPU temperatures")
+    start = rows[0][0]
+    # Missing GPU readings fall back to a cool idle dGPU
+    return [(ts - start, cpu, 40.0 if g is None else g) for ts, cpu, g in rows]
+
+
+def _io_syscalls():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f)
+    except OSError:
+        return None
+    return int(fields["syscr"]) + int(fields["syscw"])
+
+
+def run(plant, band=(40.0, 75.0), mode="Auto", fans_path=None, interval=5.0,
+        min_interval=1.0, max_interval=30.0, use_gpu=True, step=0.5):
+    """Drive the control loop through one plant; returns a dict of metrics."""
+    low, high = band
+    with sim.Simulation() as s:
+        sensors = hwmon.SensorRegistry(s.hwmon_root, watch=False)
+        backend = nbfc.CliBackend(state_files=(s.state_file,))
+        # The nvidia-smi stream lives on an event loop, as in a hosted core
+        loop = EventLoop("fanctl-bench")
+        loop.start()
+        gpus = gpu.GpuProvider(sensors, "smi" if use_gpu else "sysfs", interval=0.2, pci_root=s.pci_root,
+                               loop=loop)
+        cadence = AdaptiveInterval(base=interval, fast=min_interval, slow=max_interval)
+        sampler = Sampler(sensors, backend, interval=interval, gpus=gpus, schedule=cadence,
+                          cpus=CpuMonitor(s.proc_stat, s.cpu_root))
+        base = curve.ladder(FAN_MODES)
+        clock = [0.0]
+        # Synchronous actuator on the simulated clock; flushed from the loop below
+        actuator = Actuator(backend, clock=lambda: clock[0])
+        limiter = PowerLimiter(s.powercap_root)
+        controller = Controller(backend, fanmap.load(fans_path, base) if fans_path else None,
+                                actuator=actuator, limiter=limiter)
+        controller.attach(sampler)
+        controller.clock = lambda: clock[0]
+        try:
+            s.apply(plant.temps, plant.loads, plant.throttle_count)
+            if gpus.mode == "smi":
+                gpus.read()
+                if gpus.nvidia.task is not None:
+                    s.wait_gpu(gpus.nvidia, plant.temps["gpu"])
+            controller.set_mode(mode)
+            # Syscalls of reading /proc/self/io itself
+            first = _io_syscalls()
+            overhead = None if first is None else _io_syscalls() - first
+
+            t = next_sample = 0.0
+            flush_at = None
+            ticks = 0
+            cost = [0.0, 0]
+
+            def measured(func):
+                io = _io_syscalls()
+                started = time.thread_time()
+                result = func()
+                cost[0] += time.thread_time() - started
+                if io is not None:
+                    cost[1] += _io_syscalls() - io - overhead
+                return result
+
+            above = above_sum = max_over = in_band = 0.0
+            targets = s.fan_targets()
+            while t < plant.duration:
+                clock[0] = t
+                if t >= next_sample:
+                    s.apply(plant.temps, plant.loads, plant.throttle_count)
+                    # Only a running stream can be waited on; a released or paused one restarts in sample()
+                    if gpus.mode == "smi" and gpus.nvidia.task is not None:
+                        s.wait_gpu(gpus.nvidia, plant.temps["gpu"])
+                    snapshot = measured(sampler.sample)
+                    plant.limits = {"cpu": s.power_limit()}
+                    ticks += 1
+                    next_sample = t + cadence.next(snapshot.cpu_temp, now=t)
+                    flush_at = t
+                if flush_at is not None and t >= flush_at:
+                    wait = measured(actuator.flush)
+                    flush_at = None if wait is None else t + wait
+                    targets = s.fan_targets()
+                plant.step(t, step, targets)
+                hottest = max(plant.temps.values())
+                over = max(v - high for v in plant.temps.values())
+                if over > 0:
+                    above += step
+                    above_sum += over * step
+                    max_over = max(max_over, over)
+                if low <= min(plant.temps.values()) and hottest <= high:
+                    in_band += step
+                t += step
+        finally:
+            loop.run(sampler.stop)
+            loop.wait(gpus.wait_closed())
+            loop.stop()
+            sensors.close()
+        cpu, calls = cost
+        duration = max(t, step)
+        return {
+            "duration": round(duration),
+            "ticks": ticks,
+            "commands": len(s.commands()),
+            "writes": backend.writes,
+            "coalesced": actuator.coalesced,
+            "deadband_skips": actuator.deadband_skips,
+            "slew_limited": actuator.slew_limited,
+            "power_limited": limiter.reductions,
+            "max_overshoot": round(max_over, 2),
+            "mean_overshoot": round(above_sum / above, 2) if above else 0.0,
+            "in_band": round(in_band / duration, 3),
+            "cpu_us": round(cpu / max(ticks, 1) * 1e6),
+            "io_calls": round(calls / max(ticks, 1), 1) if overhead is not None else None,
+            "throttled_s": None if plant.throttled is None else round(plant.throttled, 1),
+        }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against a baseline, as printable lines."""
+    problems = []
+    for name, metrics in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for metric, higher_better in METRICS.items():
+            new, was = metrics.get(metric), old.get(metric)
+            if new is None or was is None:
+                continue
+            # Absolute slack keeps near-zero baselines from flagging noise
+            slack = abs(was) * tolerance + (0.01 if higher_better else 0.5)
+            if (was - new if higher_better else new - was) > slack:
+                problems.append(f"{name}: {metric} {was} -> {new}")
+    return problems
+
+
+def main(argv=None):
+    epilog = "scenarios:\n" + "\n".join(f"  {name:<10}{s.description}" for name, s in SCENARIOS.items())
+    parser = argparse.ArgumentParser(prog="fanctl.bench", description="Benchmark the fan control loop",
+                                     epilog=epilog, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help="synthetic scenarios to run (default: all)")
+    parser.add_argument("--trace", action="append", default=[], metavar="PATH",
+                        help="replay recorded temperatures (history log or CSV); repeatable")
+    parser.add_argument("--band", default="40:75", metavar="LOW:HIGH", help="target band in °C")
+    parser.add_argument("--mode", default="Auto", choices=list(FAN_MODES))
+    parser.add_argument("--fans", default="", metavar="PATH", help="per-fan mapping, as for the daemon")
+    parser.add_argument("--interval", type=float, default=5)
+    parser.add_argument("--min-interval", type=float, default=1)
+    parser.add_argument("--max-interval", type=float, default=30)
+    parser.add_argument("--no-gpu", action="store_true", help="skip the fake nvidia-smi stream")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default="", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--baseline", default="", metavar="PATH",
+                        help="compare against an earlier --json file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slack before a baseline comparison fails")
+    args = parser.parse_args(argv)
+
+    low, _, high = args.band.partition(":")
+    plants = {}
+    for name in args.scenarios or ([] if args.trace else list(SCENARIOS)):
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+        plants[name] = lambda name=name: ThermalPlant(SCENARIOS[name], args.seed)
+    for path in args.trace:
+        records = load_trace(path)
+        plants[path] = lambda records=records: Replay(records)
+
+    results = {}
+    columns = ("ticks", "commands", "max_overshoot", "mean_overshoot", "in_band", "cpu_us", "io_calls",
+               "throttled_s")
+    print(f"{'run':<12}" + "".join(f"{c:>15}" for c in columns))
+    for name, make in plants.items():
+        results[name] = run(make(), (float(low), float(high)), args.mode, args.fans or None,
+                            args.interval, args.min_interval, args.max_interval, not args.no_gpu)
+        print(f"{name:<12}" + "".join(f"{str(results[name][c]):>15}" for c in columns), flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for line in problems:
+            print(f"[Regression] {line}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Idempotent NBFC setup run at GUI startup.
+
+Install steps (apt, clone, build) only run when nbfc is missing. The probes
+that follow (nbfc version, model config list and index, DMI, hwmon chips,
+GPUs) run concurrently; the two that fork nbfc are cached in setup.json under a
+fingerprint built from stat() calls alone, so a warm start forks nothing
+when NBFC and its configs are unchanged.
+
+Progress goes to a queue.Queue as (kind, payload) events, for the GUI to
+drain on its own thread:
+
+    ("step", text)      an install step started
+    ("warning", text)   a step or probe failed; setup carries on
+    ("done", result)    the dict returned by Bootstrap.run(), config index included
+    ("applied", (ok, message))  result of apply_config()
+"""
+import importlib.util
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from fanctl import configs, gpu, hwmon, nbfc
+from fanctl.state import StateStore, state_dir
+
+SOURCE_DIR = "/tmp/nbfc-linux"
+REPOSITORY = "https://github.com/nbfc-linux/nbfc-linux.git"
+
+# Each step runs only while `needed()` says so; later steps see earlier results
+Step = namedtuple("Step", "description command needed")
+
+INSTALL_STEPS = (
+    Step("Updating package lists", ["apt-get", "update"],
+         lambda: not all(shutil.which(tool) for tool in ("git", "make", "gcc", "mono"))),
+    Step("Installing dependencies", ["apt-get", "install", "-y", "git", "build-essential", "mono-complete"],
+         lambda: not all(shutil.which(tool) for tool in ("git", "make", "gcc", "mono"))),
+    Step("Cloning NBFC repository", ["git", "clone", REPOSITORY, SOURCE_DIR],
+         lambda: not os.path.isdir(os.path.join(SOURCE_DIR, ".git"))),
+    Step("Building and installing NBFC", ["sh", "-c", f"cd {SOURCE_DIR} && make && make install"],
+         lambda: True),
+    Step("Installing nbfc-linux-probe", ["apt-get", "install", "-y", "nbfc-linux-probe"],
+         lambda: shutil.which("ec_probe") is None),
+)
+
+
+def default_path():
+    return os.path.join(state_dir(), "setup.json")
+
+
+def run_command(command, timeout=None):
+    """(ok, output) of a command; never raises."""
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return False, str(e)
+    if result.returncode != 0:
+        return False, (result.stderr or result.stdout).strip() or f"exit status {result.returncode}"
+    return True, result.stdout.strip()
+
+
+def fingerprint(nbfc_path, config_dirs=nbfc.CONFIG_DIRS):
+    """Changes whenever the nbfc binary or the set of model configs changes."""
+    return configs.fingerprint((nbfc_path,) + tuple(config_dirs))
+
+
+def detect_gpus(pci_root=gpu.PCI_ROOT):
+    return {
+        "nvidia": bool(gpu.nvidia_power_files(pci_root)),
+        "nvml": importlib.util.find_spec("pynvml") is not None,
+        "nvidia_smi": shutil.which("nvidia-smi") is not None,
+    }
+
+
+class Bootstrap:
+    """Runs install steps when needed, then the probes, reporting to `events`."""
+
+    def __init__(self, events=None, install=True, cache_path=None, nbfc_command="nbfc"):
+        self.events = events if events is not None else queue.Queue()
+        self.install = install
+        self.store = StateStore(cache_path or default_path())
+        self.nbfc_command = nbfc_command
+
+    def _emit(self, kind, payload):
+        self.events.put((kind, payload))
+
+    def _install(self):
+        if shutil.which(self.nbfc_command):
+            return
+        if not self.install:
+            self._emit("warning", "NBFC is not installed and setup is running without sudo")
+            return
+        for step in INSTALL_STEPS:
+            if not step.needed():
+                continue
+            self._emit("step", f"{step.description}...")
+            print(f"Executing: {' '.join(step.command)}")
+            ok, output = run_command(step.command)
+            if not ok:
+                self._emit("warning", f"{step.description} failed: {output}")
+        if not shutil.which(self.nbfc_command):
+            self._emit("warning", "NBFC not installed, fan control may not work.")
+
+    def _nbfc_probes(self, executor):
+        """nbfc version and config list, from the cache when the fingerprint matches."""
+        path = shutil.which(self.nbfc_command)
+        if path is None:
+            return None, []
+        key = fingerprint(path)
+        cached = self.store.get("probes")
+        if cached and cached.get("fingerprint") == key:
+            return cached["version"], cached["configs"]
+        version = executor.submit(run_command, [path, "--version"], 10)
+        listing = executor.submit(run_command, [path, "config", "-l"], 10)
+        (version_ok, version_out), (configs_ok, configs_out) = version.result(), listing.result()
+        if not configs_ok:
+            self._emit("warning", f"Failed to retrieve NBFC configs: {configs_out}")
+        result = (version_out if version_ok else None,
+                  configs_out.splitlines() if configs_ok else [])
+        if version_ok and configs_ok:
+            self.store.set("probes", {"fingerprint": key, "version": result[0], "configs": result[1]})
+        return result
+
+    def run(self):
+        """Install if needed, probe, and return what was found."""
+        self._install()
+        with ThreadPoolExecutor(max_workers=6, thread_name_prefix="fanctl-probe") as executor:
+            chips = executor.submit(lambda: sorted(hwmon.registry().chips))
+            gpus = executor.submit(detect_gpus)
+            index = executor.submit(configs.ConfigIndex.load)
+            dmi = executor.submit(configs.read_dmi)
+            version, names = self._nbfc_probes(executor)
+            index = index.result()
+            if not len(index):
+                index = configs.ConfigIndex.from_names(names)
+            result = {
+                "installed": version is not None,
+                "version": version,
+                "configs": names or [name for name, _, _ in index.entries],
+                "index": index,
+                "recommended": index.recommend(dmi.result()),
+                "dmi": dmi.result(),
+                "selected": nbfc.selected_config(),
+                "running": nbfc.read_state() is not None,
+                "chips": chips.result(),
+                "gpus": gpus.result(),
+            }
+        if result["installed"] and not result["running"]:
+            ok, output = run_command([self.nbfc_command, "start"], 10)
+            if not ok:
+                self._emit("warning", f"Failed to start NBFC service: {output}")
+        self.store.close()
+        return result
+
+    def _run(self):
+        try:
+            result = self.run()
+        except Exception as e:
+            self._emit("warning", f"Setup failed: {e}")
+            result = None
+        self._emit("done", result)
+
+    def start(self):
+        threading.Thread(target=self._run, name="fanctl-setup", daemon=True).start()
+        return self.events
+
+
+def apply_config(name, events, nbfc_command="nbfc"):
+    """Select a model config and restart the service in the background."""
+    def run():
+        ok, output = run_command([nbfc_command, "config", "-s", name], 30)
+        if ok:
+            run_command(["systemctl", "restart", "nbfc_service"], 30)
+            output = f"Applied config: {name}"
+        events.put(("applied", (ok, output)))
+
+    threading.Thread(target=run, name="fanctl-apply-config", daemon=True).start()
@@ -0,0 +1,211 @@
+"""Index of NBFC model configs for the config picker.
+
+The index is built from the file names in the NBFC config directories (or,
+when those are missing, from `nbfc config -l`) and cached in configs.json
+under a fingerprint of the directories, so it is rebuilt only when a
+config is added, removed or renamed.
+
+recommend() ranks configs against this machine's DMI data
+(/sys/class/dmi/id); search() does prefix, substring and fuzzy matching
+and narrows the previous result when the query is only extended, which
+keeps filtering-as-you-type cheap.
+"""
+import difflib
+import json
+import os
+import re
+
+from fanctl import nbfc
+from fanctl.state import state_dir
+
+DMI_ROOT = "/sys/class/dmi/id"
+DMI_FIELDS = ("sys_vendor", "product_name", "product_version", "product_family", "board_vendor", "board_name")
+
+# DMI vendor strings -> the vendor word NBFC config names start with
+VENDOR_ALIASES = {
+    "hewlett-packard": "hp", "hp": "hp", "asustek": "asus", "asus": "asus",
+    "micro-star": "msi", "msi": "msi", "lenovo": "lenovo", "dell": "dell", "acer": "acer",
+    "gigabyte": "gigabyte", "medion": "medion", "xiaomi": "xiaomi", "timi": "xiaomi",
+    "huawei": "huawei", "samsung": "samsung", "toshiba": "toshiba", "sony": "sony",
+    "fujitsu": "fujitsu", "razer": "razer", "clevo": "clevo", "tuxedo": "tuxedo",
+    "schenker": "schenker", "apple": "apple", "microsoft": "microsoft", "lg": "lg",
+}
+# Words that say nothing about the model
+STOPWORDS = {"laptop", "notebook", "by", "pc", "series", "inc", "co", "ltd", "computer",
+             "corporation", "corp", "technology", "international", "system", "product", "name",
+             "default", "string", "to", "be", "filled", "o", "e", "m"}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokens(text):
+    return _TOKEN.findall(text.lower())
+
+
+def fingerprint(paths):
+    """stat()-only summary of files or directories; changes when any of them changes."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except (OSError, TypeError):
+            parts.append(f"{path}:-")
+            continue
+        parts.append(f"{path}:{st.st_mtime_ns}:{st.st_size}")
+    return "|".join(parts)
+
+
+def read_dmi(root=DMI_ROOT):
+    """Readable DMI identification strings of this machine."""
+    dmi = {}
+    for field in DMI_FIELDS:
+        try:
+            with open(os.path.join(root, field)) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value:
+            dmi[field] = value
+    return dmi
+
+
+def vendor_of(words):
+    for word in words:
+        if word in VENDOR_ALIASES:
+            return VENDOR_ALIASES[word]
+    return None
+
+
+def _stem(token):
+    # NBFC and DMI both write model ranges like 15-ce0xxx
+    stem = token.rstrip("x")
+    return stem if len(stem) >= 2 and stem != token else None
+
+
+def _token_match(config_token, query_tokens):
+    """3 for an exact match, 2 when one side is a wildcard range covering the other."""
+    if config_token in query_tokens:
+        return 3
+    stem = _stem(config_token)
+    for q in query_tokens:
+        q_stem = _stem(q)
+        if stem and q.startswith(stem) or q_stem and config_token.startswith(q_stem):
+            return 2
+    return 0
+
+
+def list_configs(config_dirs=nbfc.CONFIG_DIRS):
+    names = set()
+    for directory in config_dirs:
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            continue
+        for entry in entries:
+            name, ext = os.path.splitext(entry)
+            if ext in (".json", ".xml"):
+                names.add(name)
+    return sorted(names, key=str.lower)
+
+
+def _subsequence(query, text):
+    it = iter(text)
+    return all(ch in it for ch in query)
+
+
+class ConfigIndex:
+    """Config names with their search tokens, plus the last search for narrowing."""
+
+    def __init__(self, entries):
+        # (name, lowercase name, tokens)
+        self.entries = [(name, name.lower(), tuple(words)) for name, words in entries]
+        self.recommended = []
+        self._last = ("", list(range(len(self.entries))))
+
+    @classmethod
+    def from_names(cls, names):
+        return cls([(name, tokens(name)) for name in names])
+
+    @classmethod
+    def load(cls, config_dirs=nbfc.CONFIG_DIRS, cache_path=None, fallback=()):
+        """Cached index of the config directories; `fallback` names are used if none exist."""
+        cache_path = cache_path or os.path.join(state_dir(), "configs.json")
+        key = fingerprint(config_dirs)
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == key and cached.get("entries"):
+                return cls(cached["entries"])
+        except (OSError, ValueError, AttributeError):
+            pass
+        names = list_configs(config_dirs)
+        if not names:
+            # No readable config directory: index what nbfc listed, but don't cache it
+            return cls.from_names(fallback)
+        index = cls.from_names(names)
+        try:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            with open(cache_path + ".tmp", "w") as f:
+                json.dump({"fingerprint": key, "entries": [[n, list(t)] for n, _, t in index.entries]}, f)
+            os.replace(cache_path + ".tmp", cache_path)
+        except OSError as e:
+            print(f"[Error] Saving config index: {e}")
+        return index
+
+    def __len__(self):
+        return len(self.entries)
+
+    def recommend(self, dmi, limit=5):
+        """Config names ranked by how well they match the DMI data, best first."""
+        words = tokens(" ".join(dmi.get(field, "") for field in DMI_FIELDS))
+        vendor = vendor_of(tokens(dmi.get("sys_vendor", ""))) or vendor_of(words)
+        query = {w for w in words if w not in STOPWORDS}
+        full = " ".join(w for w in words if w not in STOPWORDS)
+        scored = []
+        for name, lower, words_ in self.entries:
+            config_vendor = vendor_of(words_[:1])
+            if vendor and config_vendor and config_vendor != vendor:
+                continue
+            model = [w for w in words_ if w not in STOPWORDS and VENDOR_ALIASES.get(w) != config_vendor]
+            if not model:
+                continue
+            matches = [_token_match(w, query) for w in model]
+            if not any(matches):
+                continue
+            # Unmatched words make a config more specific than this machine
+            score = sum(matches) - 0.5 * matches.count(0)
+            score += difflib.SequenceMatcher(None, " ".join(model), full).ratio()
+            if score >= 3:
+                scored.append((-score, name))
+        scored.sort()
+        self.recommended = [name for _, name in scored[:limit]]
+        return self.recommended
+
+    def search(self, query, limit=None):
+        """Names matching `query`: recommendations first, then prefix, substring and fuzzy matches."""
+        query = query.strip().lower()
+        last_query, last_hits = self._last
+        # Every match condition only gets stricter as the query grows
+        pool = last_hits if last_query and query.startswith(last_query) else range(len(self.entries))
+        words = tokens(query)
+        ranked = []
+        hits = []
+        for i in pool:
+            name, lower, name_words = self.entries[i]
+            if not query:
+                rank = 0
+            elif all(any(t.startswith(w) for t in name_words) for w in words):
+                rank = 0
+            elif query in lower:
+                rank = 1
+            elif _subsequence(query.replace(" ", ""), lower):
+                rank = 2
+            else:
+                continue
+            hits.append(i)
+            ranked.append((rank, lower, name))
+        self._last = (query, hits)
+        preferred = {name: n for n, name in enumerate(self.recommended)}
+        ranked.sort(key=lambda r: (preferred.get(r[2], len(preferred)), r[0], r[1]))
+        names = [name for _, _, name in ranked]
+        return names[:limit] if limit else names
@@ -0,0 +1,224 @@
+import threading
+import time
+
+from fanctl import curve, fanmap, instrument, schedule
+from fanctl.actuator import FULL_SPEED, Actuator
+
+# Fan modes with corresponding speed percentages
+FAN_MODES = {
+    "Silent": 25,
+    "Balanced": 50,
+    "Performance": 75,
+    "Turbo": 100,
+    "Auto": -1
+}
+
+# Seconds Auto mode keeps the fans at full duty after the CPU last throttled
+THROTTLE_HOLD = 15.0
+
+
+def log_changes():
+    """Status listener (mode, status) that prints the status whenever it changes."""
+    last = [None]
+
+    def listener(mode, status):
+        if status != last[0]:
+            last[0] = status
+            print(f"[Info] {status}", flush=True)
+    return listener
+
+
+class Controller:
+    """Owns the fans: applies manual modes and runs the per-fan auto-mode curves.
+
+    Has no GUI dependencies. Once attached to a Sampler it runs one control
+    step per sample. Front-ends call set_mode() and register a listener to be
+    told when mode, temperature, speed or status change.
+    """
+
+    def __init__(self, backend, fans=None, fan_curve=None, modes=FAN_MODES, actuator=None, loop=None,
+                 workloads=None, limiter=None):
+        self.backend = backend
+        # Every write goes through the actuator, which paces and batches them
+        self.actuator = actuator or Actuator(backend)
+        self.actuator.add_error_listener(self._write_failed)
+        self.curve = fan_curve or curve.ladder(modes)
+        # One fanmap.FanConfig per fan; by default every NBFC fan gets the ladder curve
+        self.fans = fans or fanmap.default_fans(backend, self.curve)
+        self.modes = modes
+        self.sampler = None
+        self.mode = None
+        self.temp = None
+        self.speeds = {}
+        self.status = "Initializing..."
+        self.decisions = 0
+        self.listeners = []
+        self.lock = threading.RLock()
+        # Time source for control steps; the benchmark substitutes simulated time
+        self.clock = time.monotonic
+        # fanctl.eventloop.EventLoop for the override timer; without one, tick() ends overrides
+        self.loop = loop
+        # fanctl.workload.WorkloadWatcher raising the Auto-mode floor ahead of the heat
+        self.workloads = workloads
+        # fanctl.powercap.PowerLimiter, the lever left once every fan is at full duty
+        self.limiter = limiter
+        self.override_speed = None
+        self.override_until = None
+        # Full duty until then, after a thermal throttle event (controller clock)
+        self.throttle_until = None
+        self.throttle_boosts = 0
+        self._override_timer = None
+        self._states = {}
+        self._last = None
+
+    def add_listener(self, callback):
+        """Call callback(controller) after every change; it runs on the loop thread when hosted."""
+        self.listeners.append(callback)
+
+    def _notify(self):
+        for callback in list(self.listeners):
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"[Error] Controller listener: {e}")
+
+    def _apply(self, speeds, exact=False):
+        self.actuator.request(speeds, exact)
+        self.speeds.update(speeds)
+
+    def _write_failed(self, message):
+        with self.lock:
+            self.status = "Failed to set fan speed. NBFC may not be configured."
+        print(f"[Error] Setting fan speed: {message}")
+        self._notify()
+
+    def set_mode(self, mode):
+        """Switch mode; manual speeds are applied to every fan immediately."""
+        if mode not in self.modes:
+            raise ValueError(f"Unknown fan mode: {mode}")
+        with self.lock:
+            self._cancel_override()
+            self.mode = mode
+            self._states = {}
+            if mode == "Auto":
+                self.status = "Auto Mode Enabled"
+            else:
+                if self.limiter is not None:
+                    # Power limits are an Auto-mode lever only
+                    self.limiter.restore()
+                speed = self.modes[mode]
+                self._apply({cfg.fan: speed for cfg in self.fans}, exact=True)
+                self.status = f"Manual Mode: Set fan speed to {speed}%"
+        self._notify()
+        if self.sampler is not None:
+            self.sampler.poke()
+
+    def tick(self, snapshot, now=None):
+        """Run one control step on a sampler snapshot; only does work in Auto mode."""
+        now = self.clock() if now is None else now
+        if self.loop is None and self.override_until is not None and time.time() >= self.override_until:
+            # Without a loop there is no timer: the override ends at the first step after it expired
+            self.clear_override()
+        with self.lock:
+            dt = 0.0 if self._last is None else now - self._last
+            self._last = now
+            if self.mode != "Auto" or self.override_speed is not None:
+                return
+            self.temp = snapshot.cpu_temp
+            speeds = {}
+            with instrument.stage("control"):
+                for cfg in self.fans:
+                    temp = fanmap.input_temp(cfg.input, snapshot)
+                    speed, self._states[cfg.fan] = curve.step(cfg.curve, self._states.get(cfg.fan), temp, dt)
+                    if speed is not None:
+                        speeds[cfg.fan] = speed
+            if snapshot.throttling:
+                # The counters move before the temperature reading catches up
+                if self.throttle_until is None or now >= self.throttle_until:
+                    self.throttle_boosts += 1
+                self.throttle_until = now + THROTTLE_HOLD
+            throttled = self.throttle_until is not None and now < self.throttle_until
+            if throttled:
+                speeds = {cfg.fan: FULL_SPEED for cfg in self.fans}
+            elif self.workloads is not None:
+                with instrument.stage("workload"):
+                    floor = round(self.workloads.update(snapshot, now))
+                if floor > 0:
+                    speeds = {cfg.fan: max(speeds.get(cfg.fan, 0), floor) for cfg in self.fans}
+            limiter = self.limiter
+            if limiter is not None and limiter.active:
+                if limiter.scale < 1.0 or (self.temp is not None and self.temp >= limiter.limit_temp):
+                    # Fans first: every fan is at full duty before the CPU gives up power
+                    speeds = {cfg.fan: FULL_SPEED for cfg in self.fans}
+                applied = self.backend.applied
+                saturated = bool(speeds) and all(applied.get(fan) == FULL_SPEED for fan in speeds)
+                with instrument.stage("powercap"):
+                    self.limiter.step(self.temp, saturated, dt)
+            if not speeds:
+                self.status = "Auto Mode: temperatures unavailable"
+            else:
+                self.decisions += 1
+                fans = "/".join(f"{speeds[fan]}%" for fan in sorted(speeds))
+                self._apply(speeds)
+                if throttled:
+                    self.status = f"Auto Mode: CPU throttling, fans {fans}"
+                elif self.temp is None:
+                    self.status = f"Auto Mode: fans {fans}"
+                else:
+                    self.status = f"Auto Mode: CPU Temp {self.temp:.1f}°C, fans {fans}"
+                if not throttled and self.workloads is not None and self.workloads.active:
+                    self.status += f" ({', '.join(self.workloads.active)})"
+                if self.limiter is not None and self.limiter.active and self.limiter.scale < 1.0:
+                    self.status += f", CPU power limit {self.limiter.scale:.0%}"
+        self._notify()
+
+    def _cancel_override(self):
+        if self._override_timer is not None:
+            self._override_timer.cancel()
+        self._override_timer = None
+        self.override_speed = self.override_until = None
+
+    def override(self, speed, ttl):
+        """Hold every fan at `speed` for `ttl` seconds, then return to the current mode."""
+        speed = int(speed)
+        if not 0 <= speed <= 100:
+            raise ValueError(f"Fan speed out of range: {speed}")
+        with self.lock:
+            self._cancel_override()
+            self.override_speed = speed
+            self.override_until = time.time() + ttl
+            if self.loop is not None:
+                self._override_timer = self.loop.call_later(ttl, self.clear_override)
+            self._apply({cfg.fan: speed for cfg in self.fans}, exact=True)
+            self.status = f"Override: fans {speed}% for {ttl:.0f}s"
+        self._notify()
+
+    def clear_override(self):
+        """End a temporary override early (or on expiry) and restore the mode."""
+        with self.lock:
+            if self.override_speed is None:
+                return
+            self._cancel_override()
+            mode = self.mode
+        if mode is not None:
+            self.set_mode(mode)
+
+    def reapply(self):
+        """Re-send the current mode, e.g. after a resume reset the embedded controller."""
+        self.actuator.forget()
+        if self.limiter is not None:
+            self.limiter.reapply()
+        if self.mode is not None:
+            self.set_mode(self.mode)
+
+    def attach(self, sampler):
+        """Run a control step after every sample and re-apply the mode on resume."""
+        self.sampler = sampler
+        sampler.watch(fanmap.hwmon_chips(self.fans))
+        sampler.add_listener(self.tick)
+        sampler.add_resume_listener(self.reapply)
+        # Sample fast around the curve breakpoints
+        points = set()
+        for cfg in self.fans:
+            points.update(schedule.breakpoints(cfg.curve))
+        sampler.schedule.points = sorted(points)
@@ -0,0 +1,241 @@
+"""The fan-control core and the two ways a front-end can use it.
+
+Core owns the hardware (sensors, GPU readers, NBFC) and runs the sampler,
+controller, actuator and control socket in-process, all on one
+fanctl.eventloop.EventLoop thread; its methods may be called from any thread
+(Tk, the tray) and are carried out on that loop. The daemon and a GUI with
+no daemon around host one.
+RemoteCore exposes the same interface on top of the control socket of a core
+hosted elsewhere. open_core() picks whichever applies, so two front-ends
+never end up driving the fans at the same time.
+"""
+import os
+import threading
+import time
+
+from fanctl import gpu, hwmon, instrument, ipc, nbfc
+from fanctl.actuator import Actuator
+from fanctl.controller import FAN_MODES, Controller
+from fanctl.cpustate import CpuMonitor
+from fanctl.eventloop import EventLoop
+from fanctl.history import History, default_path as history_path
+from fanctl.powercap import PowerLimiter
+from fanctl.sampler import Sampler, Snapshot
+from fanctl.state import StateStore, default_path as state_path, state_dir
+from fanctl.workload import WorkloadWatcher
+
+
+class Core:
+    """Sampler, controller, history and persisted settings wired together."""
+
+    def __init__(self, backend, sensors=None, gpu_mode="auto", interval=5.0, schedule=None,
+                 fans=None, modes=FAN_MODES, history=True, state=True, default_mode="Silent",
+                 workloads=True, power_limits=True):
+        self.backend = backend
+        self.loop = EventLoop()
+        self.sensors = sensors or hwmon.registry()
+        self.gpus = gpu.GpuProvider(self.sensors, gpu_mode, interval=interval, loop=self.loop)
+        self.sampler = Sampler(self.sensors, backend, interval=interval, gpus=self.gpus, schedule=schedule,
+                               cpus=CpuMonitor())
+        self.store = StateStore(state_path() if state is True else state or None, loop=self.loop)
+        # True: the default pre-ramp rules; False/None: none; or a WorkloadWatcher
+        self.workloads = WorkloadWatcher() if workloads is True else workloads or None
+        # Limits a previous run lowered and did not get to restore are restored first
+        self.limiter = PowerLimiter(saved=self.store.get("power_limits")) if power_limits is True \
+            else power_limits or None
+        if self.limiter is not None and not self.limiter.originals:
+            self.limiter = None
+        self.controller = Controller(backend, fans, modes=modes, actuator=Actuator(backend, loop=self.loop),
+                                     loop=self.loop, workloads=self.workloads, limiter=self.limiter)
+        self.controller.attach(self.sampler)
+        self.history = History(path=history_path() if history is True else history or None)
+        self.history.attach(self.sampler, self.controller)
+        self.default_mode = default_mode
+        self.server = None
+        self.controller.add_listener(lambda c: c.mode and self.store.set("mode", c.mode))
+        if self.limiter is not None:
+            self.controller.add_listener(lambda c: self.store.set("power_limits", self.limiter.saved()))
+
+    # The interface shared with RemoteCore
+    @property
+    def snapshot(self):
+        return self.sampler.snapshot
+
+    @property
+    def mode(self):
+        return self.controller.mode
+
+    @property
+    def status(self):
+        return self.controller.status
+
+    def add_snapshot_listener(self, callback):
+        """callback(snapshot) after every sample, on the loop thread (GUIs hop over with root.after)."""
+        self.sampler.add_listener(callback)
+
+    def add_status_listener(self, callback):
+        """callback(mode, status) after every controller change, on the loop thread."""
+        self.controller.add_listener(lambda c: callback(c.mode, c.status))
+
+    def set_mode(self, mode):
+        self.loop.run(self.controller.set_mode, mode)
+
+    def override(self, speed, ttl):
+        self.loop.run(self.controller.override, speed, ttl)
+
+    def clear_override(self):
+        self.loop.run(self.controller.clear_override)
+
+    def reapply(self):
+        self.loop.run(self.controller.reapply)
+
+    def set_visible(self, visible):
+        self.loop.call(self.sampler.set_visible, visible)
+
+    def nbfc_status(self):
+        """nbfc.ServiceStatus from the service's state file (no `nbfc status` process), or None."""
+        return nbfc.parse_status(self.backend.status())
+
+    @property
+    def instrumented(self):
+        return instrument.enabled()
+
+    def instrument(self, enabled):
+        instrument.enable(enabled)
+
+    def stats(self):
+        return instrument.stats()
+
+    def profile(self, seconds):
+        """Record a profile for `seconds`; returns the files it will write."""
+        prefix = os.path.join(state_dir(), time.strftime("profile-%Y%m%d-%H%M%S"))
+        return self.loop.run(instrument.Profiler(self.sampler, seconds, prefix).start)
+
+    async def _start(self, serve, socket_path):
+        if self.limiter is not None:
+            self.limiter.restore()
+        self.sampler.start(self.loop)
+        if self.workloads is not None:
+            self.workloads.start(self.loop, self.sampler.poke)
+        mode = self.store.get("mode", self.default_mode)
+        self.controller.set_mode(mode if mode in self.controller.modes else self.default_mode)
+        if serve:
+            self.server = ipc.Server(self, socket_path)
+            try:
+                await self.server.start()
+            except OSError as e:
+                print(f"[Error] Control socket unavailable: {e}")
+                self.server = None
+
+    async def _stop(self):
+        if self.server is not None:
+            await self.server.close()
+        if self.workloads is not None:
+            self.workloads.close()
+        self.sampler.stop()
+        # Reap nvidia-smi before the loop cancels what is left and closes
+        await self.gpus.wait_closed()
+        await self.controller.actuator.stop()
+        if self.limiter is not None:
+            self.limiter.restore()
+            self.store.set("power_limits", self.limiter.saved())
+
+    def start(self, serve=True, socket_path=None):
+        """Start the loop and sampling, restore the saved mode and (optionally) serve the control socket."""
+        self.loop.start()
+        self.loop.wait(self._start(serve, socket_path))
+
+    def stop(self):
+        if self.loop.running():
+            self.loop.wait(self._stop(), timeout=30)
+        self.loop.stop()
+        self.store.close()
+        self.history.flush()
+
+
+class RemoteCore:
+    """Front-end side of a core hosted by another process."""
+
+    def __init__(self, client, socket_path=None):
+        self.client = client
+        self.socket_path = socket_path
+        self.snapshot = Snapshot(seq=0, fan_speeds=())
+        reply = client.call("get_mode")
+        self.mode = reply["mode"]
+        self.status = reply["status"]
+        self.snapshot_listeners = []
+        self.status_listeners = []
+        self.thread = None
+
+    def add_snapshot_listener(self, callback):
+        self.snapshot_listeners.append(callback)
+
+    def add_status_listener(self, callback):
+        self.status_listeners.append(callback)
+
+    def set_mode(self, mode):
+        self.client.call("set_mode", mode=mode)
+
+    def override(self, speed, ttl):
+        self.client.call("override", speed=speed, ttl=ttl)
+
+    def clear_override(self):
+        self.client.call("clear_override")
+
+    def reapply(self):
+        self.client.call("reapply")
+
+    def set_visible(self, visible):
+        # Sampling cadence belongs to the hosting process
+        pass
+
+    def nbfc_status(self):
+        return nbfc.parse_status(self.client.call("nbfc_status")["state"])
+
+    @property
+    def instrumented(self):
+        return self.client.call("stats")["enabled"]
+
+    def instrument(self, enabled):
+        self.client.call("instrument", enabled=enabled)
+
+    def stats(self):
+        return self.client.call("stats")["stages"]
+
+    def profile(self, seconds):
+        return self.client.call("profile", seconds=seconds)["files"]
+
+    def _follow(self):
+        try:
+            for event in ipc.Client(self.socket_path or self.client.path).subscribe():
+                if event["event"] == "snapshot":
+                    self.snapshot = Snapshot(**event["snapshot"])
+                    for callback in list(self.snapshot_listeners):
+                        callback(self.snapshot)
+                elif event["event"] == "status":
+                    self.mode, self.status = event["mode"], event["status"]
+                    for callback in list(self.status_listeners):
+                        callback(self.mode, self.status)
+        except (OSError, ValueError) as e:
+            print(f"[Error] Lost connection to fan controller: {e}")
+
+    def start(self, serve=False, socket_path=None):
+        self.thread = threading.Thread(target=self._follow, name="fanctl-remote", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.client.close()
+
+
+def open_core(backend_factory, **kwargs):
+    """Attach to a running core if there is one, otherwise host a new one.
+
+    backend_factory is only called when hosting, so no NBFC backend exists in
+    a process that merely attaches. Raises PermissionError (from ipc.connect)
+    when a core is running but this user may not attach to it.
+    """
+    client = ipc.connect()
+    if client is not None:
+        print(f"[Info] Attached to fan controller at {client.path}")
+        return RemoteCore(client)
+    return Core(backend_factory(), **kwargs)
@@ -0,0 +1,168 @@
+"""Per-core CPU load, clocks and thermal throttling, read without blocking.
+
+CpuMonitor keeps /proc/stat and the per-CPU sysfs files open and re-reads
+them with pread, like the hwmon sensors. Utilization is the busy share of
+the jiffies that passed since the previous read, so nothing sleeps to
+measure it. Clocks come from cpufreq's scaling_cur_freq, throttling from the
+thermal_throttle core and package counters, which the kernel bumps every
+time the CPU throttles itself for heat. A counter that moved since the
+previous read means the CPU is throttling now, usually before the package
+temperature reading shows it.
+"""
+import os
+
+PROC_STAT = "/proc/stat"
+CPU_ROOT = "/sys/devices/system/cpu"
+# /proc/stat grows with the core count; this covers a few hundred cores
+STAT_SIZE = 1 << 16
+
+
+def _open(path):
+    try:
+        return os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+
+
+def _read_int(fd):
+    try:
+        return int(os.pread(fd, 32, 0))
+    except (OSError, ValueError):
+        return None
+
+
+def _read_file_int(path):
+    fd = _open(path)
+    if fd is None:
+        return None
+    try:
+        return _read_int(fd)
+    finally:
+        os.close(fd)
+
+
+def parse_stat(text):
+    """{cpu: (busy, total)} jiffies from /proc/stat; the aggregate line is cpu None."""
+    times = {}
+    for line in text.splitlines():
+        if not line.startswith("cpu"):
+            break
+        name, *fields = line.split()
+        values = [int(v) for v in fields[:8]]
+        # idle and iowait are the only not-busy columns; guest time is already in user
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        total = sum(values)
+        times[int(name[3:]) if name != "cpu" else None] = (total - idle, total)
+    return times
+
+
+class CpuMonitor:
+    """Reads utilization, clocks and throttle counters of every online CPU."""
+
+    def __init__(self, proc_stat=PROC_STAT, cpu_root=CPU_ROOT):
+        self.stat_fd = _open(proc_stat)
+        self.cpus = []
+        try:
+            entries = os.listdir(cpu_root)
+        except OSError:
+            entries = []
+        for entry in entries:
+            if entry.startswith("cpu") and entry[3:].isdigit():
+                self.cpus.append(int(entry[3:]))
+        self.cpus.sort()
+        self.freq_fds = [_open(os.path.join(cpu_root, f"cpu{cpu}", "cpufreq", "scaling_cur_freq"))
+                         for cpu in self.cpus]
+        # SMT siblings report their core's counter and every CPU its package's, so
+        # each is read from the first CPU of its core or package only
+        self.core_fds = []
+        self.package_fds = []
+        cores = set()
+        packages = set()
+        for cpu in self.cpus:
+            base = os.path.join(cpu_root, f"cpu{cpu}")
+            package = _read_file_int(os.path.join(base, "topology", "physical_package_id"))
+            core = _read_file_int(os.path.join(base, "topology", "core_id"))
+            # core_id is only unique within a package; without it every CPU counts
+            if core is None or (package, core) not in cores:
+                cores.add((package, core))
+                fd = _open(os.path.join(base, "thermal_throttle", "core_throttle_count"))
+                if fd is not None:
+                    self.core_fds.append(fd)
+            if package not in packages:
+                packages.add(package)
+                fd = _open(os.path.join(base, "thermal_throttle", "package_throttle_count"))
+                if fd is not None:
+                    self.package_fds.append(fd)
+        self.last_times = {}
+        # Previous counter sums: {"package": n, "core": n}
+        self.last_throttle = {}
+        # Throttle events seen since this monitor started
+        self.throttle_events = 0
+
+    def utilization(self):
+        """(overall %, per-core % tuple) since the previous call; None before there is one."""
+        if self.stat_fd is None:
+            return None, ()
+        try:
+            times = parse_stat(os.pread(self.stat_fd, STAT_SIZE, 0).decode())
+        except (OSError, ValueError):
+            return None, ()
+        last, self.last_times = self.last_times, times
+        usage = {}
+        for cpu, (busy, total) in times.items():
+            previous = last.get(cpu)
+            if previous is None or total <= previous[1]:
+                continue
+            usage[cpu] = round(100.0 * (busy - previous[0]) / (total - previous[1]), 1)
+        return usage.pop(None, None), tuple(usage.get(cpu) for cpu in sorted(usage))
+
+    def frequencies(self):
+        """Current clock of each CPU in MHz (None where cpufreq is missing)."""
+        freqs = []
+        for fd in self.freq_fds:
+            khz = None if fd is None else _read_int(fd)
+            freqs.append(None if khz is None else khz // 1000)
+        return tuple(freqs)
+
+    def throttle_count(self, fds):
+        """Sum of these thermal_throttle counters, or None on CPUs without them."""
+        counts = [_read_int(fd) for fd in fds]
+        counts = [c for c in counts if c is not None]
+        return sum(counts) if counts else None
+
+    def _throttled(self, kind, fds):
+        count = self.throttle_count(fds)
+        last = self.last_throttle.get(kind)
+        self.last_throttle[kind] = count
+        if count is None or last is None or count <= last:
+            return False
+        self.throttle_events += count - last
+        return True
+
+    def read(self, detail=True):
+        """Snapshot fields: cpu_usage, cpu_cores, throttling and, with detail, cpu_freqs.
+
+        Package counters are always read. Per-core counters and clocks cost
+        one read per CPU, so they are skipped while nobody looks at them.
+        """
+        values = {}
+        values["cpu_usage"], values["cpu_cores"] = self.utilization()
+        throttling = self._throttled("package", self.package_fds)
+        if detail:
+            values["cpu_freqs"] = self.frequencies()
+            throttling = self._throttled("core", self.core_fds) or throttling
+        else:
+            self.last_throttle.pop("core", None)
+        values["throttling"] = throttling
+        values["throttle_events"] = self.throttle_events
+        return values
+
+    def close(self):
+        fds = [self.stat_fd] + self.freq_fds + self.core_fds + self.package_fds
+        self.stat_fd, self.freq_fds, self.core_fds, self.package_fds = None, [], [], []
+        for fd in fds:
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
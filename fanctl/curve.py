@@ -0,0 +1,137 @@
+"""Fan-curve engine.
+
+step() is a pure function: it takes the curve, the previous State and a new
+temperature reading and returns the fan speed plus the next State. Replaying
+a recorded temperature trace through it therefore gives the exact speeds the
+controller would have applied.
+"""
+import math
+from collections import namedtuple
+
+# A curve breakpoint: at `temp` °C the fan runs at `speed` %. While cooling
+# down the point only releases once the temperature is `hysteresis` below it.
+Point = namedtuple("Point", "temp speed hysteresis", defaults=(3.0,))
+
+# Target-temperature mode; the curve points act as feed-forward.
+Pid = namedtuple("Pid", "target kp ki kd", defaults=(4.0, 0.2, 0.0))
+
+Curve = namedtuple(
+    "Curve",
+    "points smoothing ramp_up ramp_down pid min_speed max_speed",
+    # smoothing: EMA time constant in seconds (0 disables)
+    # ramp_up / ramp_down: max change in %/s (None for unlimited)
+    defaults=(0.0, None, None, None, 0, 100),
+)
+
+# Smoothed temperature, unrounded output speed and PID memory
+State = namedtuple("State", "temp speed integral error")
+
+DEFAULT_CURVE = Curve(
+    points=(Point(45, 25), Point(60, 50), Point(75, 75), Point(85, 100)),
+    smoothing=8.0,
+    ramp_up=10.0,
+    ramp_down=2.0,
+    min_speed=25,
+)
+
+
+def ladder(fan_modes):
+    """Default curve passing through the Silent/Balanced/Performance/Turbo speeds."""
+    return DEFAULT_CURVE._replace(points=(
+        Point(45, fan_modes["Silent"]),
+        Point(60, fan_modes["Balanced"]),
+        Point(75, fan_modes["Performance"]),
+        Point(85, fan_modes["Turbo"]),
+    ), min_speed=fan_modes["Silent"])
+
+
+def interpolate(points, temp, cooling=False):
+    """Piecewise-linear lookup, clamped to the first and last point."""
+    if cooling:
+        xs = [p.temp - p.hysteresis for p in points]
+    else:
+        xs = [p.temp for p in points]
+    if temp <= xs[0]:
+        return float(points[0].speed)
+    for i in range(1, len(points)):
+        if temp <= xs[i]:
+            x0, x1 = xs[i - 1], xs[i]
+            y0, y1 = points[i - 1].speed, points[i].speed
+            if x1 <= x0:
+                return float(y1)
+            return y0 + (y1 - y0) * (temp - x0) / (x1 - x0)
+    return float(points[-1].speed)
+
+
+def _clamp(value, lo, hi):
+    return max(lo, min(hi, value))
+
+
+def step(curve, state, temp, dt):
+    """Advance the curve by one reading taken `dt` seconds after the last.
+
+    Returns (speed, state) where speed is an integer percentage. A temp of
+    None holds the previous output.
+    """
+    if temp is None:
+        if state is None:
+            return None, None
+        return int(round(state.speed)), state
+
+    if state is None or curve.smoothing <= 0:
+        smoothed = temp
+    elif dt <= 0:
+        smoothed = state.temp
+    else:
+        alpha = 1 - math.exp(-dt / curve.smoothing)
+        smoothed = state.temp + alpha * (temp - state.temp)
+
+    integral = error = 0.0
+    if curve.pid is not None:
+        pid = curve.pid
+        base = interpolate(curve.points, smoothed) if curve.points else curve.min_speed
+        error = smoothed - pid.target
+        integral = state.integral if state else 0.0
+        derivative = (error - state.error) / dt if state and dt > 0 else 0.0
+        candidate = integral + error * dt
+        rest = base + pid.kp * error + pid.kd * derivative
+        target = rest + pid.ki * candidate
+        if curve.min_speed < target < curve.max_speed:
+            integral = candidate
+        elif pid.ki:
+            # Anti-windup: integrate only as far as it takes to reach the limit, never past it
+            limit = _clamp(target, curve.min_speed, curve.max_speed)
+            integral = _clamp((limit - rest) / pid.ki, min(integral, candidate), max(integral, candidate))
+            target = rest + pid.ki * integral
+    else:
+        rising = interpolate(curve.points, smoothed)
+        falling = interpolate(curve.points, smoothed, cooling=True)
+        if state is None:
+            target = rising
+        else:
+            # Inside the hysteresis band the previous output is kept
+            target = _clamp(state.speed, rising, falling)
+
+    target = _clamp(target, curve.min_speed, curve.max_speed)
+    if state is not None and dt > 0:
+        delta = target - state.speed
+        if curve.ramp_up is not None and delta > 0:
+            target = state.speed + min(delta, curve.ramp_up * dt)
+        elif curve.ramp_down is not None and delta < 0:
+            target = state.speed - min(-delta, curve.ramp_down * dt)
+
+    new_state = State(smoothed, target, integral, error)
+    return int(round(target)), new_state
+
+
+def run(curve, trace):
+    """Replay [(timestamp, temp), ...] and return the list of speeds applied."""
+    state = None
+    last = None
+    speeds = []
+    for ts, temp in trace:
+        dt = 0.0 if last is None else ts - last
+        last = ts
+        speed, state = step(curve, state, temp, dt)
+        speeds.append(speed)
+    return speeds
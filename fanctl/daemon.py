@@ -0,0 +1,99 @@
+"""Headless fan-control daemon: sampling and control loop only, no GUI imports."""
+import argparse
+import signal
+import sys
+import threading
+
+from fanctl import curve, fanmap, instrument, nbfc, workload
+from fanctl.controller import FAN_MODES, log_changes
+from fanctl.core import Core
+from fanctl.history import default_path
+from fanctl.schedule import AdaptiveInterval
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="fanctl", description="Headless NBFC fan controller")
+    parser.add_argument("--mode", default="Auto", choices=list(FAN_MODES),
+                        help="fan mode when no saved mode exists")
+    parser.add_argument("--interval", type=float, default=5, help="base sampling/control interval in seconds")
+    parser.add_argument("--min-interval", type=float, default=1,
+                        help="interval while temperatures move fast or sit near a curve breakpoint")
+    parser.add_argument("--max-interval", type=float, default=30, help="back-off limit while readings are stable")
+    parser.add_argument("--fans", default="", metavar="PATH",
+                        help="per-fan input/curve mapping (JSON, see fanctl/fanmap.py)")
+    parser.add_argument("--workloads", default="", metavar="PATH",
+                        help="pre-ramp rules for known workloads (JSON, see fanctl/workload.py)")
+    parser.add_argument("--no-workloads", action="store_true",
+                        help="follow the temperature curve only, without pre-ramping for workloads")
+    parser.add_argument("--no-power-limit", action="store_true",
+                        help="never lower the CPU package power limits when the fans are at full duty")
+    parser.add_argument("--gpu", default="auto", choices=["auto", "nvml", "smi", "sysfs"],
+                        help="NVIDIA reader: NVML, a streaming nvidia-smi, or none (sysfs only)")
+    parser.add_argument("--history", default=default_path(), metavar="PATH",
+                        help="telemetry log file ('' keeps history in memory only)")
+    parser.add_argument("--socket", default=None, metavar="PATH", help="control socket path")
+    parser.add_argument("--metrics", default="", metavar="[HOST]:PORT",
+                        help="serve Prometheus metrics on this address (e.g. :9101)")
+    parser.add_argument("--metrics-host", default="127.0.0.1", metavar="HOST",
+                        help="address the metrics server binds to when --metrics names none "
+                             "(0.0.0.0 for every interface)")
+    parser.add_argument("--instrument", action="store_true",
+                        help="time every stage of the loop (see `python3 -m fanctl.ipc stats`)")
+    parser.add_argument("--profile", type=float, default=0, metavar="SECONDS",
+                        help="record a cProfile and collapsed-stack profile for the first SECONDS")
+    parser.add_argument("--nbfc", default="nbfc", help="path to the nbfc client")
+    parser.add_argument("--sudo", action="store_true", help="run the nbfc client through sudo")
+    parser.add_argument("--dry-run", action="store_true", help="log fan writes instead of calling nbfc")
+    return parser.parse_args(argv)
+
+
+def build(args):
+    """Create the core (sampler, controller, history, settings) from the arguments."""
+    if args.instrument:
+        instrument.enable()
+    if args.dry_run:
+        backend = nbfc.StubBackend()
+    else:
+        backend = nbfc.CliBackend(nbfc=args.nbfc, sudo=args.sudo)
+    fans = fanmap.load(args.fans, curve.ladder(FAN_MODES)) if args.fans else None
+    if args.no_workloads:
+        workloads = False
+    elif args.workloads:
+        workloads = workload.WorkloadWatcher(*workload.load(args.workloads, FAN_MODES))
+    else:
+        workloads = True
+    cadence = AdaptiveInterval(base=args.interval, fast=args.min_interval, slow=args.max_interval)
+    core = Core(backend, gpu_mode=args.gpu, interval=args.interval, schedule=cadence, fans=fans,
+                history=args.history, default_mode=args.mode, workloads=workloads,
+                power_limits=not args.no_power_limit)
+    if args.metrics:
+        # The exporter pulls in http.server; only pay for it when metrics are served
+        from fanctl.metrics import Exporter
+        host, _, port = args.metrics.rpartition(":")
+        Exporter(core.sampler, core.controller, backend, core.sensors).serve(host or args.metrics_host, int(port))
+    return core
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    core = build(args)
+    core.add_status_listener(log_changes())
+    stopping = threading.Event()
+
+    def shutdown(signum, frame):
+        print(f"[Info] Received signal {signum}, stopping", flush=True)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    core.start(socket_path=args.socket)
+    if args.profile:
+        core.profile(args.profile)
+    stopping.wait()
+    core.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""The core's event loop.
+
+A hosted core does all of its work on one asyncio loop in one thread
+("fanctl-core"): sampling on loop timers, control steps, NBFC writes, the
+nvidia-smi stream, power_supply uevents and the control socket. Other threads
+(Tk, the tray icon, the metrics server) hand work to it with call(), run() and
+wait(), and schedule timers on it with call_later(); none of them ever blocks
+on hardware or a child process.
+
+run_command() is how the core forks a tool: asyncio.create_subprocess_exec
+with a timeout, and the process is killed when the timeout expires or the
+caller is cancelled. reap() is how every child is ended: it keeps waiting
+for the process when the waiting task is cancelled again meanwhile (as
+EventLoop.stop() does), so no child outlives the loop that watches it.
+"""
+import asyncio
+import concurrent.futures
+import threading
+
+# Seconds an external command may take before it is killed
+COMMAND_TIMEOUT = 10.0
+
+
+async def reap(proc):
+    """Kill a child process if it still runs and wait until it is gone.
+
+    A cancellation that arrives while waiting is held back until the child
+    has been reaped, then raised.
+    """
+    if proc.returncode is None:
+        proc.kill()
+    cancelled = False
+    while True:
+        try:
+            await proc.wait()
+            break
+        except asyncio.CancelledError:
+            cancelled = True
+    if cancelled:
+        raise asyncio.CancelledError
+
+
+async def run_command(args, timeout=COMMAND_TIMEOUT):
+    """stdout of a command; RuntimeError with its stderr on failure or timeout."""
+    try:
+        proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+    except OSError as e:
+        raise RuntimeError(str(e)) from None
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        raise RuntimeError(f"{args[0]} timed out after {timeout:g}s") from None
+    finally:
+        await reap(proc)
+    if proc.returncode != 0:
+        raise RuntimeError(err.decode(errors="replace").strip() or f"exit status {proc.returncode}")
+    return out.decode(errors="replace")
+
+
+class Later:
+    """Handle of an EventLoop.call_later(); cancel() may be called from any thread."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.handle = None
+        self.cancelled = False
+
+    def _arm(self, delay, func, args):
+        if not self.cancelled:
+            self.handle = self.loop.aio.call_later(delay, func, *args)
+
+    def _cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+
+    def cancel(self):
+        self.cancelled = True
+        self.loop.call(self._cancel)
+
+
+class EventLoop:
+    """An asyncio loop running in its own thread, with thread-safe entry points."""
+
+    def __init__(self, name="fanctl-core"):
+        self.name = name
+        self.aio = asyncio.new_event_loop()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.aio.run_forever, name=self.name, daemon=True)
+        self.thread.start()
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def in_loop(self):
+        return self.thread is not None and threading.current_thread() is self.thread
+
+    def call(self, func, *args):
+        """Run func(*args) on the loop without waiting; immediately when already on it."""
+        if self.in_loop() or not self.running():
+            func(*args)
+        else:
+            self.aio.call_soon_threadsafe(func, *args)
+
+    def call_later(self, delay, func, *args):
+        """Run func(*args) on the loop after `delay` seconds; returns a Later to cancel it."""
+        later = Later(self)
+        self.call(later._arm, delay, func, args)
+        return later
+
+    def run(self, func, *args, timeout=10.0):
+        """Run func(*args) on the loop and return its result (or raise its exception)."""
+        if self.in_loop() or not self.running():
+            return func(*args)
+        future = concurrent.futures.Future()
+
+        def call():
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+        self.aio.call_soon_threadsafe(call)
+        return future.result(timeout)
+
+    def submit(self, coro):
+        """Schedule a coroutine from any thread; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.aio)
+
+    def wait(self, coro, timeout=None):
+        """Run a coroutine on the loop from another thread and return its result."""
+        return self.submit(coro).result(timeout)
+
+    async def _cancel_all(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        # Lets tasks reap the processes they started while the loop still runs
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        """Cancel whatever is left, stop the loop thread and close the loop."""
+        if self.running():
+            self.wait(self._cancel_all(), timeout=10)
+            self.aio.call_soon_threadsafe(self.aio.stop)
+            self.thread.join()
+        tasks = asyncio.all_tasks(self.aio)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self.aio.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.aio.run_until_complete(self.aio.shutdown_asyncgens())
+        self.aio.close()
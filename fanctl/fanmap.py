@@ -0,0 +1,108 @@
+"""Per-fan control mapping.
+
+Each fan reported by NBFC follows its own input (one sensor, the hottest of
+several, or a weighted blend) through its own curve. Inputs are named:
+
+    cpu      CPU package temperature
+    gpu      hottest GPU (NVIDIA or AMD)
+    nvidia   NVIDIA dGPU temperature
+    amd      AMD GPU temperature
+    <chip>   any other hwmon chip by name, e.g. nvme, acpitz (hottest input)
+
+A mapping file looks like:
+
+    {"fans": [
+        {"fan": 0, "inputs": {"cpu": 1}},
+        {"fan": 1, "inputs": {"cpu": 0.3, "gpu": 0.7}, "combine": "blend",
+         "curve": [[50, 25], [65, 50], [80, 100, 4]], "ramp_down": 1.5}
+    ]}
+
+Curve points are [temp, speed] or [temp, speed, hysteresis]; omitted curve
+settings come from the default ladder curve built from FAN_MODES.
+"""
+import json
+from collections import namedtuple
+
+from fanctl import curve
+
+SNAPSHOT_INPUTS = ("cpu", "gpu", "nvidia", "amd")
+
+FanInput = namedtuple("FanInput", "sources combine", defaults=("max",))
+FanConfig = namedtuple("FanConfig", "fan input curve")
+
+
+def snapshot_temp(snapshot, name):
+    """Temperature of one named input in a sampler snapshot, or None."""
+    if name == "cpu":
+        return snapshot.cpu_temp
+    if name == "nvidia":
+        return snapshot.nvidia["temp"] if snapshot.nvidia else None
+    if name == "amd":
+        return snapshot.amd["temp"] if snapshot.amd else None
+    if name == "gpu":
+        temps = [t for t in (snapshot_temp(snapshot, "nvidia"), snapshot_temp(snapshot, "amd")) if t is not None]
+        return max(temps) if temps else None
+    return (snapshot.temps or {}).get(name)
+
+
+def input_temp(fan_input, snapshot):
+    """Combine a fan's sources; missing sensors are left out of max and blend."""
+    readings = [(snapshot_temp(snapshot, name), weight) for name, weight in fan_input.sources.items()]
+    readings = [(t, w) for t, w in readings if t is not None and w > 0]
+    if not readings:
+        return None
+    if fan_input.combine == "blend":
+        total = sum(w for _, w in readings)
+        return sum(t * w for t, w in readings) / total
+    return max(t for t, _ in readings)
+
+
+def hwmon_chips(fans):
+    """hwmon chip names the sampler must read for these fans."""
+    return sorted({name for f in fans for name in f.input.sources if name not in SNAPSHOT_INPUTS})
+
+
+def default_fans(backend, base_curve):
+    """One config per NBFC fan; fans NBFC names after the GPU lean on the GPU temperature."""
+    state = backend.status() or {}
+    names = [f.get("name", "") for f in state.get("fans") or []]
+    count = len(names) or backend.fan_count()
+    fans = []
+    for fan in range(count):
+        name = names[fan].lower() if fan < len(names) else ""
+        if "gpu" in name:
+            fan_input = FanInput({"cpu": 0.3, "gpu": 0.7}, "blend")
+        else:
+            fan_input = FanInput({"cpu": 1.0})
+        fans.append(FanConfig(fan, fan_input, base_curve))
+    return fans
+
+
+def _curve(spec, base_curve):
+    fields = {}
+    if "curve" in spec:
+        fields["points"] = tuple(curve.Point(*p) for p in spec["curve"])
+    for key in ("smoothing", "ramp_up", "ramp_down", "min_speed", "max_speed"):
+        if key in spec:
+            fields[key] = spec[key]
+    if "pid" in spec:
+        fields["pid"] = curve.Pid(**spec["pid"])
+    return base_curve._replace(**fields)
+
+
+def load(path, base_curve):
+    """Read a mapping file; raises ValueError on malformed content."""
+    with open(path) as f:
+        data = json.load(f)
+    fans = []
+    for spec in data.get("fans", []):
+        try:
+            fan_input = FanInput(dict(spec["inputs"]), spec.get("combine", "max"))
+            if fan_input.combine not in ("max", "blend"):
+                raise ValueError(f"unknown combine {fan_input.combine!r}")
+            fans.append(FanConfig(int(spec["fan"]), fan_input, _curve(spec, base_curve)))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid fan entry {spec!r}: {e}") from None
+    if not fans:
+        raise ValueError(f"{path} defines no fans")
+    return fans
@@ -0,0 +1,359 @@
+"""GPU metrics without forking nvidia-smi on every poll.
+
+NVIDIA readings come from, in order of preference, the NVML library
+(pynvml), one long-running `nvidia-smi --loop-ms` process whose CSV output is
+parsed as it arrives on the core's event loop, or nothing at all ("sysfs"
+mode). AMD readings come
+from the amdgpu hwmon chip. While an NVIDIA dGPU is runtime-suspended it is
+not queried, so monitoring never wakes it up. A running nvidia-smi or an
+open NVML handle keeps the GPU from suspending in the first place, so after
+IDLE_RELEASE readings at 0 % utilisation the reader lets go of it (the stream
+is stopped, NVML shut down) and is only reopened once the GPU has suspended
+and something else woke it, or after RELEASE_GRACE seconds if it never
+suspends.
+"""
+import asyncio
+import glob
+import os
+import shutil
+import time
+
+from fanctl.eventloop import reap
+
+NVIDIA_QUERY = "index,name,utilization.gpu,temperature.gpu,memory.used,memory.total"
+NVIDIA_VENDOR = "0x10de"
+PCI_ROOT = "/sys/bus/pci/devices"
+# Consecutive idle (0 %) NVIDIA readings after which the reader releases the GPU
+IDLE_RELEASE = 3
+# Seconds a released GPU that stays active is left alone before reading it again
+RELEASE_GRACE = 60.0
+
+
+def parse_nvidia_csv(line):
+    """Turn one nvidia-smi CSV line (NVIDIA_QUERY fields) into a dict."""
+    index, name, usage, temp, mem_used, mem_total = [field.strip() for field in line.split(",")]
+    return {
+        "index": int(index),
+        "name": name,
+        "usage": int(usage),
+        "temp": int(temp),
+        "mem_used": int(mem_used),
+        "mem_total": int(mem_total)
+    }
+
+
+def read_amd(sensors):
+    """AMD GPU temperature from the amdgpu hwmon chip; None if absent."""
+    temp = sensors.temp("amdgpu")
+    if temp is None:
+        return None
+    return {
+        "name": "AMD iGPU",
+        "temp": round(temp, 1),
+        "usage": None
+    }
+
+
+def nvidia_power_files(pci_root=PCI_ROOT):
+    """runtime_status files of NVIDIA display controllers."""
+    paths = []
+    for dev in sorted(glob.glob(os.path.join(pci_root, "*"))):
+        try:
+            with open(os.path.join(dev, "vendor")) as f:
+                vendor = f.read().strip()
+            with open(os.path.join(dev, "class")) as f:
+                pci_class = f.read().strip()
+        except OSError:
+            continue
+        # 0x03xxxx is the display controller class
+        if vendor == NVIDIA_VENDOR and pci_class.startswith("0x03"):
+            paths.append(os.path.join(dev, "power", "runtime_status"))
+    return paths
+
+
+class NvmlReader:
+    """In-process NVML queries through pynvml."""
+
+    def __init__(self):
+        import pynvml
+        self.nvml = pynvml
+        self.handle = None
+        self._open()
+        name = pynvml.nvmlDeviceGetName(self.handle)
+        self.name = name.decode() if isinstance(name, bytes) else name
+
+    def _open(self):
+        self.nvml.nvmlInit()
+        self.handle = self.nvml.nvmlDeviceGetHandleByIndex(0)
+
+    def read(self):
+        nvml = self.nvml
+        try:
+            if self.handle is None:
+                self._open()
+            util = nvml.nvmlDeviceGetUtilizationRates(self.handle)
+            mem = nvml.nvmlDeviceGetMemoryInfo(self.handle)
+            temp = nvml.nvmlDeviceGetTemperature(self.handle, nvml.NVML_TEMPERATURE_GPU)
+        except nvml.NVMLError:
+            return None
+        return {
+            "index": 0,
+            "name": self.name,
+            "usage": util.gpu,
+            "temp": temp,
+            "mem_used": mem.used // (1024 ** 2),
+            "mem_total": mem.total // (1024 ** 2)
+        }
+
+    def pause(self):
+        """Shut NVML down so the driver lets the GPU suspend; the next read() reopens it."""
+        if self.handle is None:
+            return
+        self.handle = None
+        try:
+            self.nvml.nvmlShutdown()
+        except self.nvml.NVMLError:
+            pass
+
+    close = pause
+
+
+class SmiStreamReader:
+    """One `nvidia-smi --loop-ms` process on the core's event loop; lines are parsed as they arrive.
+
+    A stream that stays silent for `max_age` seconds is killed, so a hung
+    nvidia-smi costs a missing reading, never a blocked loop. A stream that
+    ends is logged with its exit status and the tail of its stderr, and
+    restarted by a later read() after a backoff that doubles with every
+    consecutive run that produced no reading (from `interval` up to
+    MAX_RESTART_DELAY). After MAX_FAILURES such runs the reader gives up and
+    sets `failed`.
+    """
+
+    MAX_FAILURES = 5
+    MAX_RESTART_DELAY = 300.0
+    # Bytes of stderr kept for the log
+    STDERR_TAIL = 512
+
+    def __init__(self, loop, interval=5.0, nvidia_smi="nvidia-smi"):
+        self.loop = loop
+        self.interval = interval
+        self.command = [nvidia_smi, f"--query-gpu={NVIDIA_QUERY}",
+                        "--format=csv,noheader,nounits", f"--loop-ms={int(interval * 1000)}"]
+        # Readings older than this are treated as missing (stalled stream)
+        self.max_age = max(3 * interval, 5.0)
+        self.task = None
+        # The stream's asyncio task while its process runs
+        self.running = None
+        self.latest = None
+        self.latest_at = 0.0
+        # Consecutive runs without a reading, and when the next run may start
+        self.failures = 0
+        self.retry_at = 0.0
+        self.failed = False
+
+    @staticmethod
+    async def _drain(stream, tail):
+        # Keeps the pipe from filling up while holding on to the last bytes only
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                return
+            tail[:] = (tail + chunk)[-SmiStreamReader.STDERR_TAIL:]
+
+    async def _stream(self):
+        self.running = asyncio.current_task()
+        try:
+            proc = await asyncio.create_subprocess_exec(*self.command, stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+        except OSError as e:
+            self.running = None
+            self._ended(f"could not be started: {e}", False)
+            return
+        stderr = bytearray()
+        drain = asyncio.ensure_future(self._drain(proc.stderr, stderr))
+        reported = False
+        stalled = False
+        try:
+            while True:
+                line = await asyncio.wait_for(proc.stdout.readline(), self.max_age)
+                if not line:
+                    # Let it exit on its own: kill() polls the child and can reap it before the child watcher
+                    await asyncio.wait_for(proc.wait(), self.max_age)
+                    break
+                try:
+                    reading = parse_nvidia_csv(line.decode(errors="replace"))
+                except ValueError:
+                    continue
+                if reading["index"] == 0:
+                    self.latest = reading
+                    self.latest_at = time.monotonic()
+                    reported = True
+        except asyncio.TimeoutError:
+            stalled = True
+        finally:
+            try:
+                await reap(proc)
+            finally:
+                self.running = None
+                drain.cancel()
+        try:
+            await drain
+        except asyncio.CancelledError:
+            pass
+        if stalled:
+            reason = f"stopped reporting for {self.max_age:g}s and was killed"
+        else:
+            reason = f"exited with status {proc.returncode}"
+        tail = stderr.decode(errors="replace").strip().splitlines()
+        if tail:
+            reason += ": " + " / ".join(tail[-3:])
+        self._ended(reason, reported)
+
+    def _ended(self, reason, reported):
+        """Count a finished run and schedule the next one, or give up."""
+        self.failures = 1 if reported else self.failures + 1
+        if self.failures >= self.MAX_FAILURES:
+            self.failed = True
+            print(f"[Error] nvidia-smi {reason}; giving up after {self.failures} runs without a reading",
+                  flush=True)
+            return
+        delay = min(self.interval * 2 ** (self.failures - 1), self.MAX_RESTART_DELAY)
+        self.retry_at = time.monotonic() + delay
+        print(f"[Error] nvidia-smi {reason}; restarting in {delay:g}s", flush=True)
+
+    def read(self):
+        if self.failed:
+            return None
+        if (self.task is None or self.task.done()) and time.monotonic() >= self.retry_at:
+            self.task = self.loop.submit(self._stream())
+        if self.latest is None or time.monotonic() - self.latest_at > self.max_age:
+            return None
+        return self.latest
+
+    def pause(self):
+        """Stop the stream; it is restarted by the next read()."""
+        task, self.task = self.task, None
+        if task is not None:
+            task.cancel()
+        self.latest = None
+
+    close = pause
+
+    async def wait_closed(self):
+        """On the loop: stop the stream and wait until its process has been reaped."""
+        self.close()
+        task = self.running
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+class GpuProvider:
+    """Picks the cheapest available NVIDIA reader and adds AMD hwmon readings."""
+
+    def __init__(self, sensors, mode="auto", interval=5.0, nvidia_smi="nvidia-smi", pci_root=PCI_ROOT,
+                 loop=None):
+        self.sensors = sensors
+        self.power_files = nvidia_power_files(pci_root)
+        self.nvidia = None
+        self.mode = "sysfs"
+        self.requested = mode
+        # Idle readings in a row; while released, when that happened and whether the GPU suspended since
+        self.idle = 0
+        self.released_at = None
+        self.slept = False
+        if mode in ("auto", "nvml"):
+            try:
+                self.nvidia = NvmlReader()
+                self.mode = "nvml"
+            except Exception as e:
+                if mode == "nvml":
+                    print(f"[Error] NVML unavailable: {e}")
+        # The nvidia-smi stream needs an event loop (fanctl.eventloop.EventLoop) to run on
+        if self.nvidia is None and mode in ("auto", "smi") and loop is not None and shutil.which(nvidia_smi):
+            self.nvidia = SmiStreamReader(loop, interval, nvidia_smi)
+            self.mode = "smi"
+
+    def runtime_status(self):
+        """"suspended" when every NVIDIA GPU is, "active" when any is, None when unknown."""
+        states = set()
+        for path in self.power_files:
+            try:
+                with open(path) as f:
+                    states.add(f.read().strip())
+            except OSError:
+                return None
+        if not states:
+            return None
+        if states == {"suspended"}:
+            return "suspended"
+        # "suspending" and "resuming" are neither
+        return "active" if "active" in states else states.pop()
+
+    def suspended(self):
+        """True when every NVIDIA GPU is runtime-suspended."""
+        return self.runtime_status() == "suspended"
+
+    def _release(self):
+        """Stop reading an idle GPU so it can runtime-suspend."""
+        self.nvidia.pause()
+        self.idle = 0
+        self.released_at = time.monotonic()
+        self.slept = False
+
+    def _released(self, status):
+        """True while a released GPU should be left alone."""
+        if status == "suspended":
+            self.slept = True
+            return True
+        if status == "active" and (self.slept or time.monotonic() - self.released_at >= RELEASE_GRACE):
+            self.released_at = None
+            return False
+        return True
+
+    def _give_up_smi(self):
+        """Replace an nvidia-smi stream that keeps failing with NVML (auto mode) or nothing."""
+        self.nvidia.close()
+        self.nvidia = None
+        self.mode = "sysfs"
+        if self.requested == "auto":
+            try:
+                self.nvidia = NvmlReader()
+                self.mode = "nvml"
+            except Exception:
+                pass
+        print("[Info] NVIDIA readings now come from NVML" if self.nvidia else "[Info] NVIDIA readings disabled",
+              flush=True)
+
+    def read(self):
+        values = {"nvidia": None, "amd": read_amd(self.sensors)}
+        if self.mode == "smi" and self.nvidia.failed:
+            self._give_up_smi()
+        if self.nvidia is None:
+            return values
+        status = self.runtime_status()
+        if self.released_at is not None and self._released(status):
+            return values
+        if status == "suspended":
+            self.nvidia.pause()
+            return values
+        reading = self.nvidia.read()
+        values["nvidia"] = reading
+        if reading is not None and status is not None:
+            # Without runtime_status there is no telling when to read again, so never release
+            self.idle = self.idle + 1 if reading.get("usage") == 0 else 0
+            if self.idle >= IDLE_RELEASE:
+                self._release()
+        return values
+
+    def close(self):
+        if self.nvidia is not None:
+            self.nvidia.close()
+
+    async def wait_closed(self):
+        """On the loop: close, and wait for an nvidia-smi stream to be reaped."""
+        if self.mode == "smi":
+            await self.nvidia.wait_closed()
+        else:
+            self.close()
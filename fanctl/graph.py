@@ -0,0 +1,179 @@
+"""Scrolling history graph for the Tk window.
+
+HistoryGraph plots CPU temperature, GPU temperature, fan duty and CPU load
+on one fixed 0-100 scale (°C and %), so nothing is ever rescaled. Samples go
+into a bounded buffer from any thread. While the graph is shown, each new
+sample scrolls what is drawn with one Canvas.move() and appends one line
+segment per series; segments that scroll out of the window are deleted.
+A segment is only added once the line has advanced a whole pixel, so a long
+window never holds more than about one item per pixel column and series.
+The whole plot is only redrawn when the window is shown again, the time
+window changes or the graph is first filled.
+"""
+import threading
+from collections import deque
+
+import tkinter as tk
+
+from fanctl import instrument
+from fanctl.history import MAX_FANS
+
+# (label, colour) in the order of the values of a sample
+SERIES = (("CPU °C", "#50fa7b"), ("GPU °C", "#8be9fd"), ("Fan %", "#bd93f9"), ("Load %", "#f1fa8c"))
+# Selectable time windows in seconds
+WINDOWS = {"5 min": 300, "15 min": 900, "60 min": 3600}
+# One hour of samples at the fastest (1 s) sampling rate
+CAPACITY = 3600
+PAD = 4
+BG = "#282a36"
+GRID = "#44475a"
+
+
+def _known(value):
+    # History rings store missing values as NaN
+    return None if value != value else value
+
+
+def values(snapshot):
+    """(cpu temp, gpu temp, fan duty, cpu load) of a snapshot; None where unknown."""
+    gpu = snapshot.nvidia or snapshot.amd
+    duties = [d for _, d in snapshot.fan_speeds or () if d is not None]
+    return (snapshot.cpu_temp, gpu.get("temp") if gpu else None,
+            max(duties) if duties else None, snapshot.cpu_usage)
+
+
+class HistoryGraph:
+    """A Canvas with a legend and a window selector, fed with sampler snapshots."""
+
+    def __init__(self, parent, width=330, height=130, window=300, capacity=CAPACITY):
+        self.frame = tk.Frame(parent, bg="#1e1e2e")
+        self.width = width
+        self.height = height
+        self.window = window
+        self.samples = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.visible = True
+        # Time at the right edge, and the last drawn point of each series (time, value) or None
+        self.right = None
+        self.anchors = [None] * len(SERIES)
+        # (end time, canvas item) of every segment, oldest first
+        self.segments = deque()
+
+        legend = tk.Frame(self.frame, bg="#1e1e2e")
+        legend.pack(fill="x")
+        for label, colour in SERIES:
+            tk.Label(legend, text=label, bg="#1e1e2e", fg=colour, font=("Helvetica", 9)).pack(side="left", padx=3)
+        self.choice = tk.StringVar(value=next(name for name, s in WINDOWS.items() if s == window))
+        tk.OptionMenu(legend, self.choice, *WINDOWS, command=lambda name: self.set_window(WINDOWS[name])) \
+            .pack(side="right")
+        self.canvas = tk.Canvas(self.frame, width=width, height=height, bg=BG, highlightthickness=0)
+        self.canvas.pack()
+        for level in (25, 50, 75):
+            y = self._y(level)
+            self.canvas.create_line(0, y, width, y, fill=GRID, dash=(2, 4))
+            self.canvas.create_text(2, y, text=str(level), anchor="w", fill=GRID, font=("Helvetica", 7))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def _y(self, value):
+        value = min(max(value, 0.0), 100.0)
+        return self.height - PAD - value / 100.0 * (self.height - 2 * PAD)
+
+    def add(self, snapshot):
+        """Buffer a snapshot; safe from any thread, draws nothing."""
+        if snapshot.time is None:
+            return
+        with self.lock:
+            if self.samples and snapshot.time <= self.samples[-1][0]:
+                return
+            self.samples.append((snapshot.time, values(snapshot)))
+
+    def load(self, history):
+        """Fill an empty buffer from fanctl.history.History rings (a hosted core's recent past)."""
+        rings = history.rings
+        with history.lock:
+            columns = [rings[name].items() for name in ("cpu_temp", "nvidia_temp", "amd_temp", "cpu_usage")]
+            columns += [rings[f"fan{fan}"].items() for fan in range(MAX_FANS)]
+        with self.lock:
+            if self.samples:
+                return
+            for row in zip(*columns):
+                cpu, nvidia, amd, usage, *fans = (_known(value) for _, value in row)
+                fans = [f for f in fans if f is not None]
+                self.samples.append((row[0][0], (cpu, nvidia if nvidia is not None else amd,
+                                                 max(fans) if fans else None, usage)))
+
+    def set_visible(self, visible):
+        """Pause drawing while the window is withdrawn; catch up in one redraw when shown."""
+        self.visible = visible
+        if visible:
+            self.redraw()
+
+    def set_window(self, seconds):
+        self.window = seconds
+        self.redraw()
+
+    def redraw(self):
+        """Draw every buffered sample in the window from scratch."""
+        with instrument.stage("ui"):
+            self.canvas.delete("data")
+            self.segments.clear()
+            self.anchors = [None] * len(SERIES)
+            self.right = None
+            with self.lock:
+                samples = list(self.samples)
+            if samples:
+                start = samples[-1][0] - self.window
+                self.right = samples[-1][0]
+                for ts, sample in samples:
+                    if ts >= start:
+                        self._extend(ts, sample)
+
+    def refresh(self):
+        """Scroll in the samples that arrived since the last call; call on the Tk thread."""
+        if not self.visible:
+            return
+        if self.right is None:
+            self.redraw()
+            return
+        with instrument.stage("ui"):
+            new = []
+            with self.lock:
+                for sample in reversed(self.samples):
+                    if sample[0] <= self.right:
+                        break
+                    new.append(sample)
+            if not new:
+                return
+            new.reverse()
+            latest = new[-1][0]
+            self.canvas.move("data", -(latest - self.right) * self.width / self.window, 0)
+            self.right = latest
+            for ts, sample in new:
+                self._extend(ts, sample)
+            # Drop segments that scrolled out on the left
+            start = latest - self.window
+            while self.segments and self.segments[0][0] < start:
+                self.canvas.delete(self.segments.popleft()[1])
+
+    def _extend(self, ts, sample):
+        """Connect each series to the point (ts, value), at x relative to the right edge."""
+        scale = self.width / self.window
+        x = self.width - (self.right - ts) * scale
+        for i, value in enumerate(sample):
+            anchor = self.anchors[i]
+            if value is None:
+                self.anchors[i] = None
+                continue
+            if anchor is None:
+                self.anchors[i] = (ts, value)
+                continue
+            # Less than a pixel on: keep the anchor, the next point connects to it
+            if (ts - anchor[0]) * scale < 1.0:
+                continue
+            x0 = self.width - (self.right - anchor[0]) * scale
+            item = self.canvas.create_line(x0, self._y(anchor[1]), x, self._y(value),
+                                           fill=SERIES[i][1], width=2, tags="data")
+            self.segments.append((ts, item))
+            self.anchors[i] = (ts, value)
@@ -0,0 +1,205 @@
+"""Bounded telemetry history.
+
+Every sample lands in fixed-size array-backed ring buffers (one per channel)
+and in a pending buffer that is periodically appended to a compact binary
+log. The log rotates by size, so neither memory nor disk use grows with
+uptime. Inspect a log with:
+
+    python3 -m fanctl.history /var/lib/fanctl/history.bin
+"""
+import atexit
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from fanctl import instrument
+from fanctl.controller import FAN_MODES
+from fanctl.state import state_dir
+
+MAGIC = b"FANLOG1\n"
+MAX_FANS = 4
+# time, cpu temp, cpu usage, ram %, nvidia temp, amd temp, mode, fan speeds
+RECORD = struct.Struct(f"<d5fB{MAX_FANS}B")
+CHANNELS = ("cpu_temp", "cpu_usage", "ram_percent", "nvidia_temp", "amd_temp") + \
+    tuple(f"fan{fan}" for fan in range(MAX_FANS))
+MODES = tuple(FAN_MODES)
+UNKNOWN = 255
+NAN = float("nan")
+
+
+def default_path():
+    return os.path.join(state_dir(), "history.bin")
+
+
+class Ring:
+    """Fixed-capacity (time, value) ring buffer backed by two arrays."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("f", bytes(4 * capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, ts, value):
+        self.times[self.head] = ts
+        self.values[self.head] = NAN if value is None else value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def items(self, since=None):
+        """(time, value) pairs oldest first, optionally only newer than `since`."""
+        start = (self.head - self.count) % self.capacity
+        out = []
+        for i in range(self.count):
+            j = (start + i) % self.capacity
+            if since is None or self.times[j] > since:
+                out.append((self.times[j], self.values[j]))
+        return out
+
+    def last(self):
+        if not self.count:
+            return None
+        j = (self.head - 1) % self.capacity
+        return self.times[j], self.values[j]
+
+
+def _f(value):
+    return NAN if value is None else float(value)
+
+
+def _b(value):
+    return UNKNOWN if value is None else max(0, min(254, int(round(value))))
+
+
+class History:
+    """Ring buffers per channel plus an append-only, size-rotated log file."""
+
+    def __init__(self, capacity=3600, path=None, flush_interval=60.0, max_bytes=4 << 20, keep=3):
+        self.rings = {name: Ring(capacity) for name in CHANNELS}
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.pending = bytearray()
+        # Never hold more unflushed data than the rings themselves cover
+        self.max_pending = capacity * RECORD.size
+        self.last_flush = time.monotonic()
+        self.mode = None
+        self.lock = threading.Lock()
+
+    def _pack(self, ts, values, mode, fans):
+        fans = list(fans)[:MAX_FANS]
+        fans += [None] * (MAX_FANS - len(fans))
+        code = MODES.index(mode) if mode in MODES else UNKNOWN
+        return RECORD.pack(ts, *[_f(v) for v in values], code, *[_b(f) for f in fans])
+
+    def record(self, snapshot, mode=None):
+        """Store one sampler snapshot."""
+        ts = snapshot.time or time.time()
+        nvidia = snapshot.nvidia["temp"] if snapshot.nvidia else None
+        amd = snapshot.amd["temp"] if snapshot.amd else None
+        values = (snapshot.cpu_temp, snapshot.cpu_usage, snapshot.ram_percent, nvidia, amd)
+        # Slot n of the record is NBFC fan n
+        speeds = dict(snapshot.fan_speeds or ())
+        fans = [speeds.get(fan) for fan in range(MAX_FANS)]
+        with instrument.stage("history"), self.lock:
+            if mode is not None:
+                self.mode = mode
+            for name, value in zip(CHANNELS, values):
+                self.rings[name].append(ts, value)
+            for fan in range(MAX_FANS):
+                self.rings[f"fan{fan}"].append(ts, fans[fan])
+            self._queue(self._pack(ts, values, self.mode, fans))
+
+    def mark_mode(self, mode):
+        """Log a mode change as its own record, with no sensor values."""
+        with self.lock:
+            if mode == self.mode:
+                return
+            self.mode = mode
+            self._queue(self._pack(time.time(), (None,) * 5, mode, ()))
+
+    def _queue(self, data):
+        if self.path is None:
+            return
+        self.pending += data
+        if len(self.pending) > self.max_pending:
+            del self.pending[:len(self.pending) - self.max_pending]
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending or self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                f.write(self.pending)
+            self.pending.clear()
+        except OSError as e:
+            print(f"[Error] Writing history: {e}")
+
+    def _rotate(self):
+        """history.bin -> history.bin.1 -> ... -> history.bin.<keep> (dropped)."""
+        if self.keep < 1:
+            os.remove(self.path)
+            return
+        for i in range(self.keep - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def attach(self, sampler, controller):
+        """Record every snapshot and mode change; flush what is pending at exit."""
+        sampler.add_listener(lambda snapshot: self.record(snapshot, controller.mode))
+        controller.add_listener(lambda c: self.mark_mode(c.mode))
+        atexit.register(self.flush)
+
+
+def read_log(path):
+    """Yield records of a history log as dicts; missing values are None."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a fanctl history log")
+        while True:
+            chunk = f.read(RECORD.size)
+            if len(chunk) < RECORD.size:
+                return
+            ts, *rest = RECORD.unpack(chunk)
+            values, code, fans = rest[:5], rest[5], rest[6:]
+            rec = {"time": ts}
+            for name, value in zip(CHANNELS, values):
+                rec[name] = None if math.isnan(value) else round(value, 1)
+            rec["mode"] = MODES[code] if code < len(MODES) else None
+            rec["fans"] = [f for f in fans if f != UNKNOWN]
+            yield rec
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else default_path()
+    print("time,mode," + ",".join(CHANNELS[:5]) + ",fans")
+    for rec in read_log(path):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(rec["time"]))
+        values = ",".join("" if rec[name] is None else str(rec[name]) for name in CHANNELS[:5])
+        print(f"{stamp},{rec['mode'] or ''},{values},{'/'.join(map(str, rec['fans']))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import os
+import socket
+import threading
+import time
+
+HWMON_ROOT = "/sys/class/hwmon"
+
+# Chip names (contents of hwmonN/name) that report the CPU package temperature
+CPU_CHIPS = ("coretemp", "k10temp", "zenpower", "cpu_thermal")
+
+# Netlink protocol number for kernel uevents (NETLINK_KOBJECT_UEVENT)
+_NETLINK_KOBJECT_UEVENT = 15
+
+# Consecutive failed reads after which an input counts as dead, and seconds
+# before a dead input is tried again
+DEAD_AFTER = 3
+DEAD_RETRY = 60.0
+
+
+class Sensor:
+    """A single temp*_input file kept open for repeated reads."""
+
+    __slots__ = ("chip", "index", "label", "path", "fd", "failures", "retry_at")
+
+    def __init__(self, chip, index, label, path, fd):
+        self.chip = chip
+        self.index = index
+        self.label = label
+        self.path = path
+        self.fd = fd
+        # Consecutive failed reads, and when a dead input may be read again
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def __repr__(self):
+        return f"Sensor({self.chip!r}, temp{self.index}, {self.label!r})"
+
+
+class UeventMonitor:
+    """Non-blocking listener for kernel hotplug events of one subsystem."""
+
+    def __init__(self, subsystem="hwmon"):
+        self.marker = f"SUBSYSTEM={subsystem}".encode()
+        self.sock = None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, _NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, 1))
+            sock.setblocking(False)
+            self.sock = sock
+        except (AttributeError, OSError) as e:
+            print(f"[Info] Hotplug events unavailable, rescanning only when the chip list changes: {e}")
+
+    def changed(self):
+        """Drain pending events and report whether any touched our subsystem."""
+        if self.sock is None:
+            return False
+        hit = False
+        while True:
+            try:
+                msg = self.sock.recv(8192)
+            except (BlockingIOError, InterruptedError):
+                return hit
+            except OSError:
+                return True
+            if self.marker in msg:
+                hit = True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class SensorRegistry:
+    """Discovers hwmon chips once and reads their temperatures via pread.
+
+    Chips are rediscovered on a hwmon uevent, or when a read fails and the
+    entries of the hwmon directory differ from the last scan. An input that
+    fails DEAD_AFTER times in a row is skipped and only retried every
+    DEAD_RETRY seconds, so a broken sensor costs neither a rescan nor a
+    syscall per sample.
+    """
+
+    def __init__(self, root=HWMON_ROOT, watch=True):
+        self.root = root
+        self.monitor = UeventMonitor("hwmon") if watch else None
+        self.lock = threading.Lock()
+        self.chips = {}
+        # hwmonN entries seen by the last scan
+        self.entries = ()
+        self.scans = 0
+        self.read_errors = 0
+        self.scan()
+
+    def scan(self):
+        """(Re)discover all chips and reopen their temperature inputs."""
+        chips = {}
+        try:
+            entries = sorted(os.listdir(self.root))
+        except OSError:
+            entries = []
+        for entry in entries:
+            base = os.path.join(self.root, entry)
+            name = _read_text(os.path.join(base, "name"))
+            if not name:
+                continue
+            try:
+                files = os.listdir(base)
+            except OSError:
+                continue
+            sensors = []
+            for fname in files:
+                if not (fname.startswith("temp") and fname.endswith("_input")):
+                    continue
+                try:
+                    index = int(fname[4:-6])
+                except ValueError:
+                    continue
+                path = os.path.join(base, fname)
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except OSError:
+                    continue
+                label = _read_text(os.path.join(base, f"temp{index}_label"))
+                sensors.append(Sensor(name, index, label, path, fd))
+            if sensors:
+                sensors.sort(key=lambda s: s.index)
+                # Several chips can share a name (e.g. one nvme per drive)
+                chips.setdefault(name, []).extend(sensors)
+
+        with self.lock:
+            old, self.chips = self.chips, chips
+            self.entries = tuple(entries)
+            self.scans += 1
+        for sensors in old.values():
+            for s in sensors:
+                try:
+                    os.close(s.fd)
+                except OSError:
+                    pass
+
+    def _check_hotplug(self):
+        if self.monitor is not None and self.monitor.changed():
+            self.scan()
+
+    def _rescan_if_changed(self):
+        """After a failed read: rescan if chips came or went; True when it did."""
+        try:
+            entries = tuple(sorted(os.listdir(self.root)))
+        except OSError:
+            entries = ()
+        if entries == self.entries:
+            return False
+        self.scan()
+        return True
+
+    def sensors(self, chip=None):
+        """Return all sensors, or only those of the given chip name."""
+        self._check_hotplug()
+        chips = self.chips
+        if chip is not None:
+            return list(chips.get(chip, ()))
+        return [s for sensors in chips.values() for s in sensors]
+
+    def read(self, sensor):
+        """Read a sensor in degrees Celsius; raises OSError if it vanished."""
+        return int(os.pread(sensor.fd, 32, 0)) / 1000
+
+    def _read_live(self, sensor):
+        """Read a sensor, or None when the read fails or the input is dead."""
+        if sensor.failures >= DEAD_AFTER and time.monotonic() < sensor.retry_at:
+            return None
+        try:
+            value = self.read(sensor)
+        except (OSError, ValueError):
+            self.read_errors += 1
+            sensor.failures += 1
+            if sensor.failures >= DEAD_AFTER:
+                if sensor.failures == DEAD_AFTER:
+                    print(f"[Info] Ignoring {sensor.chip} temp{sensor.index} after {DEAD_AFTER} failed reads")
+                sensor.retry_at = time.monotonic() + DEAD_RETRY
+            return None
+        sensor.failures = 0
+        return value
+
+    def temp(self, chip, index=None):
+        """Temperature of a chip's first (or given) input, or None."""
+        for attempt in (0, 1):
+            self._check_hotplug()
+            sensors = self.chips.get(chip)
+            if not sensors:
+                return None
+            sensor = sensors[0]
+            if index is not None:
+                sensor = next((s for s in sensors if s.index == index), None)
+                if sensor is None:
+                    return None
+            errors = self.read_errors
+            value = self._read_live(sensor)
+            if value is not None or attempt or self.read_errors == errors or not self._rescan_if_changed():
+                return value
+        return None
+
+    def hottest(self, chip):
+        """Highest reading across every live input of every chip with this name, or None."""
+        sensors = self.sensors(chip)
+        errors = self.read_errors
+        temps = [t for t in map(self._read_live, sensors) if t is not None]
+        if self.read_errors != errors:
+            self._rescan_if_changed()
+        return max(temps) if temps else None
+
+    def cpu_temp(self):
+        """CPU package temperature from the first known CPU chip present."""
+        self._check_hotplug()
+        for chip in CPU_CHIPS:
+            if chip in self.chips:
+                return self.temp(chip)
+        return None
+
+    def close(self):
+        with self.lock:
+            old, self.chips = self.chips, {}
+        for sensors in old.values():
+            for s in sensors:
+                os.close(s.fd)
+        if self.monitor is not None:
+            self.monitor.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def registry():
+    """Process-wide registry shared by every reader."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SensorRegistry()
+        return _default
@@ -0,0 +1,206 @@
+"""Hot-path timers and an on-demand profiler.
+
+Code wraps each stage of the loop in `with instrument.stage("gpu"):`. While
+instrumentation is off (the default) stage() hands back one shared no-op
+context manager, so the cost is a function call. Switched on (FANCTL_INSTRUMENT=1,
+`fanctl --instrument`, the control socket or the GUI debug panel), every
+stage keeps a call count, an error count and its last WINDOW durations for
+percentiles.
+
+Profiler records, for a fixed number of seconds, a cProfile of every sample
+and the control step it triggers (.pstats, for pstats/snakeviz) and
+wall-clock stack samples of every thread in collapsed-stack format (.folded,
+for flamegraph.pl or speedscope).
+
+Histogram keeps always-on latency buckets (NBFC commands) for the Prometheus
+exporter; it lives here so that recording latencies never imports the
+exporter's HTTP server.
+"""
+import bisect
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+import time
+from array import array
+
+# Durations kept per stage for percentiles
+WINDOW = 1024
+
+# Stages in display order; others are listed after these
+STAGES = ("sample", "sensors", "cpu", "psutil", "gpu", "control", "workload", "powercap", "nbfc", "history", "ipc", "ui")
+
+# Latency buckets in seconds, tuned for subprocess-sized operations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_NULL = contextlib.nullcontext()
+_enabled = os.environ.get("FANCTL_INSTRUMENT", "") not in ("", "0")
+_stages = {}
+_lock = threading.Lock()
+
+
+class Stage:
+    """Counters and a ring of recent durations for one stage."""
+
+    __slots__ = ("name", "count", "errors", "total", "durations", "head")
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.durations = array("d", bytes(8 * WINDOW))
+        self.head = 0
+
+    def observe(self, seconds, failed=False):
+        with _lock:
+            self.count += 1
+            self.errors += failed
+            self.total += seconds
+            self.durations[self.head] = seconds
+            self.head = (self.head + 1) % WINDOW
+
+    def summary(self):
+        """Count, errors and mean/percentile/max latency in milliseconds."""
+        with _lock:
+            recent = sorted(self.durations[:min(self.count, WINDOW)])
+            count, errors, total = self.count, self.errors, self.total
+        if not recent:
+            return {"count": 0, "errors": 0}
+
+        def pct(q):
+            return round(recent[min(int(q * len(recent)), len(recent) - 1)] * 1000, 3)
+        return {"count": count, "errors": errors, "mean_ms": round(total / count * 1000, 3),
+                "p50_ms": pct(0.5), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+                "max_ms": round(recent[-1] * 1000, 3)}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels=""):
+        sep = "," if labels else ""
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            yield f'{name}_bucket{{{labels}{sep}le="{bound}"}} {total}'
+        yield f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}'
+        suffix = f"{{{labels}}}" if labels else ""
+        yield f"{name}_sum{suffix} {self.sum}"
+        yield f"{name}_count{suffix} {self.count}"
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stage.observe(time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+def stage(name):
+    """Context manager timing one stage; a no-op while instrumentation is off."""
+    if not _enabled:
+        return _NULL
+    entry = _stages.get(name)
+    if entry is None:
+        entry = _stages.setdefault(name, Stage(name))
+    return _Timer(entry)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def reset():
+    _stages.clear()
+
+
+def stats():
+    """{stage: summary} for every stage seen so far, in display order."""
+    names = [n for n in STAGES if n in _stages] + sorted(n for n in _stages if n not in STAGES)
+    return {name: _stages[name].summary() for name in names}
+
+
+def format_stats(stages):
+    """Plain-text table of stats() output."""
+    columns = ("count", "errors", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    lines = [f"{'stage':<9}" + "".join(f"{c:>9}" for c in columns)]
+    for name, summary in stages.items():
+        lines.append(f"{name:<9}" + "".join(f"{summary.get(c, '-'):>9}" for c in columns))
+    return "\n".join(lines)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Profiler:
+    """cProfile of sampling plus stack samples of all threads for `seconds`."""
+
+    def __init__(self, sampler, seconds, prefix, period=0.005):
+        self.sampler = sampler
+        self.seconds = seconds
+        self.prefix = prefix
+        self.period = period
+        self.stacks = {}
+        self.files = (prefix + ".pstats", prefix + ".folded")
+
+    def start(self):
+        """Begin recording; the files are written once `seconds` have passed."""
+        if self.sampler.profiler is not None:
+            raise RuntimeError("a profile is already being recorded")
+        self.sampler.profiler = cProfile.Profile()
+        threading.Thread(target=self._run, name="fanctl-profiler", daemon=True).start()
+        return self.files
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            time.sleep(self.period)
+        profile, self.sampler.profiler = self.sampler.profiler, None
+        os.makedirs(os.path.dirname(self.prefix) or ".", exist_ok=True)
+        profile.dump_stats(self.files[0])
+        with open(self.files[1], "w") as f:
+            for key, count in sorted(self.stacks.items()):
+                f.write(f"{key} {count}\n")
+        print(f"[Info] Profile written to {self.files[0]} and {self.files[1]}", flush=True)
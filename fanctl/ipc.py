@@ -0,0 +1,316 @@
+"""Local control socket.
+
+One JSON object per line in each direction. Requests carry a "cmd":
+
+    get_mode                      -> {"ok": true, "mode": ..., "status": ...}
+    set_mode {"mode": "Auto"}     -> {"ok": true}
+    snapshot                      -> {"ok": true, "snapshot": {...}}
+    nbfc_status                   -> {"ok": true, "state": {...}} as nbfc_service publishes it
+    override {"speed": 80, "ttl": 60}
+    clear_override
+    reapply                       re-send the mode after NBFC was restarted
+    stats                         -> {"ok": true, "enabled": ..., "stages": {...}}
+    instrument {"enabled": true}  switch the hot-path timers on or off
+    profile {"seconds": 30}       -> {"ok": true, "files": [pstats, folded]}
+    subscribe                     -> {"ok": true}, then a stream of
+                                     {"event": "snapshot", "snapshot": {...}} and
+                                     {"event": "status", "mode": ..., "status": ...}
+
+Errors come back as {"ok": false, "error": "..."}. From a shell:
+
+    python3 -m fanctl.ipc get | set MODE | snapshot | nbfc | watch | override SPEED TTL
+    python3 -m fanctl.ipc stats [on|off] | profile SECONDS
+"""
+import asyncio
+import grp
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+from fanctl import instrument, nbfc
+
+SYSTEM_SOCKET = "/run/fanctl.sock"
+# A root daemon hands its socket to this group; members may attach without root
+SOCKET_GROUP = "fanctl"
+
+
+def user_socket():
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime, "fanctl.sock")
+
+
+def socket_path():
+    """Where a core hosted by this process listens."""
+    if "FANCTL_SOCKET" in os.environ:
+        return os.environ["FANCTL_SOCKET"]
+    return SYSTEM_SOCKET if os.geteuid() == 0 else user_socket()
+
+
+def candidate_paths():
+    if "FANCTL_SOCKET" in os.environ:
+        return [os.environ["FANCTL_SOCKET"]]
+    return [SYSTEM_SOCKET, user_socket()]
+
+
+class IpcError(Exception):
+    """The controller rejected a request."""
+
+
+class Client:
+    """Persistent connection to a control socket."""
+
+    def __init__(self, path=None, timeout=2.0):
+        self.path = path or socket_path()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.path)
+        self.rfile = self.sock.makefile("r", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def _send(self, request):
+        self.sock.sendall((json.dumps(request) + "\n").encode())
+
+    def _receive(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("control socket closed")
+        return json.loads(line)
+
+    def call(self, cmd, **args):
+        with self.lock:
+            self._send(dict(args, cmd=cmd))
+            reply = self._receive()
+        if not reply.get("ok"):
+            raise IpcError(reply.get("error", "request failed"))
+        return reply
+
+    def subscribe(self):
+        """Yield events forever; the connection is dedicated to the subscription."""
+        self.call("subscribe")
+        self.sock.settimeout(None)
+        while True:
+            yield self._receive()
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def connect(paths=None):
+    """Client for the first reachable controller, or None when none is running.
+
+    Raises PermissionError when a controller's socket exists but this user
+    may not use it: hosting a second controller would fight it over NBFC.
+    """
+    denied = None
+    for path in paths or candidate_paths():
+        try:
+            return Client(path)
+        except PermissionError:
+            denied = denied or path
+        except OSError:
+            continue
+    if denied is not None:
+        raise PermissionError(f"A fan controller is running at {denied}, but this user may not use it; "
+                              f"add the user to the '{SOCKET_GROUP}' group or run as root")
+    return None
+
+
+# Bytes a subscriber may fall behind by before it is dropped
+MAX_BACKLOG = 256 * 1024
+
+
+class Server:
+    """Serves a Core (anything with its interface) on a Unix socket, from the core's event loop."""
+
+    def __init__(self, core, path=None, mode=0o660):
+        self.core = core
+        self.path = path or socket_path()
+        self.mode = mode
+        self.subscribers = []
+        self.writers = set()
+        self.server = None
+        core.add_snapshot_listener(self._on_snapshot)
+        core.add_status_listener(self._on_status)
+
+    async def start(self):
+        if os.path.exists(self.path):
+            try:
+                Client(self.path, timeout=0.5).close()
+            except OSError:
+                os.unlink(self.path)  # left behind by a dead process
+            else:
+                raise OSError(f"another controller is already listening on {self.path}")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, self.mode)
+        if os.geteuid() == 0:
+            try:
+                os.chown(self.path, -1, grp.getgrnam(SOCKET_GROUP).gr_gid)
+            except KeyError:
+                print(f"[Info] No '{SOCKET_GROUP}' group; only root can use the control socket", flush=True)
+        print(f"[Info] Control socket listening on {self.path}", flush=True)
+
+    async def _handle(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.dispatch(json.loads(line), writer)
+                except IpcError as e:
+                    reply = {"ok": False, "error": str(e)}
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {"ok": False, "error": f"bad request: {e}"}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.unsubscribe(writer)
+            self.writers.discard(writer)
+            writer.close()
+
+    def dispatch(self, request, writer):
+        cmd = request["cmd"]
+        core = self.core
+        if cmd == "get_mode":
+            return {"ok": True, "mode": core.mode, "status": core.status}
+        if cmd == "set_mode":
+            try:
+                core.set_mode(request["mode"])
+            except ValueError as e:
+                raise IpcError(str(e)) from None
+            return {"ok": True}
+        if cmd == "snapshot":
+            return {"ok": True, "snapshot": core.snapshot.as_dict()}
+        if cmd == "nbfc_status":
+            return {"ok": True, "state": core.backend.status()}
+        if cmd == "override":
+            try:
+                core.override(request["speed"], float(request["ttl"]))
+            except ValueError as e:
+                raise IpcError(str(e)) from None
+            return {"ok": True}
+        if cmd == "clear_override":
+            core.clear_override()
+            return {"ok": True}
+        if cmd == "reapply":
+            core.reapply()
+            return {"ok": True}
+        if cmd == "stats":
+            return {"ok": True, "enabled": core.instrumented, "stages": core.stats()}
+        if cmd == "instrument":
+            core.instrument(bool(request["enabled"]))
+            return {"ok": True}
+        if cmd == "profile":
+            try:
+                files = core.profile(float(request["seconds"]))
+            except RuntimeError as e:
+                raise IpcError(str(e)) from None
+            return {"ok": True, "files": list(files)}
+        if cmd == "subscribe":
+            self.subscribers.append(writer)
+            return {"ok": True}
+        raise IpcError(f"unknown command {cmd!r}")
+
+    def unsubscribe(self, writer):
+        if writer in self.subscribers:
+            self.subscribers.remove(writer)
+
+    def _broadcast(self, message):
+        with instrument.stage("ipc"):
+            self._send_all((json.dumps(message) + "\n").encode())
+
+    def _send_all(self, data):
+        for writer in list(self.subscribers):
+            # Never let a stalled client pile up events; writes themselves never block
+            if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                self.unsubscribe(writer)
+                writer.close()
+                continue
+            writer.write(data)
+
+    def _on_snapshot(self, snapshot):
+        if self.subscribers:
+            self._broadcast({"event": "snapshot", "snapshot": snapshot.as_dict()})
+
+    def _on_status(self, mode, status):
+        if self.subscribers:
+            self._broadcast({"event": "status", "mode": mode, "status": status})
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        client = connect()
+    except PermissionError as e:
+        print(f"[Error] {e}")
+        return 1
+    if client is None:
+        print("[Error] No fan controller is running")
+        return 1
+    cmd = argv[0] if argv else "get"
+    try:
+        if cmd == "get":
+            reply = client.call("get_mode")
+            print(f"{reply['mode']}: {reply['status']}")
+        elif cmd == "set":
+            client.call("set_mode", mode=argv[1])
+        elif cmd == "snapshot":
+            print(json.dumps(client.call("snapshot")["snapshot"], indent=2))
+        elif cmd == "nbfc":
+            status = nbfc.parse_status(client.call("nbfc_status")["state"])
+            if status is None:
+                print("[Error] NBFC service state unavailable")
+                return 1
+            print(f"Config: {status.config or 'N/A'}" + (" (read-only)" if status.read_only else ""))
+            for fan in status.fans:
+                mode = "auto" if fan.automode else "manual"
+                temp = "N/A" if fan.temperature is None else f"{fan.temperature:g}°C"
+                print(f"{fan.name}: {mode}, {temp}, {fan.current_speed}% (target {fan.target_speed}%)")
+        elif cmd == "watch":
+            for event in client.subscribe():
+                print(json.dumps(event), flush=True)
+        elif cmd == "override":
+            client.call("override", speed=int(argv[1]), ttl=float(argv[2]))
+        elif cmd == "stats":
+            if len(argv) > 1:
+                client.call("instrument", enabled=argv[1] == "on")
+            reply = client.call("stats")
+            if not reply["enabled"]:
+                print("[Info] Instrumentation is off; enable it with: stats on")
+            print(instrument.format_stats(reply["stages"]))
+        elif cmd == "profile":
+            files = client.call("profile", seconds=float(argv[1] if len(argv) > 1 else 30))["files"]
+            print("Recording; results will be written to " + " and ".join(files))
+        else:
+            print(f"[Error] Unknown command: {cmd}")
+            return 2
+    except IpcError as e:
+        print(f"[Error] {e}")
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Prometheus text-format exporter.
+
+Scrapes are served purely from values already in memory (the latest sampler
+snapshot, controller and backend counters), so a scrape never touches
+sensors, nvidia-smi or nbfc no matter how often it happens.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fanctl import instrument
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Exporter:
+    """Renders controller state as Prometheus metrics and serves /metrics."""
+
+    def __init__(self, sampler, controller, backend, sensors=None):
+        self.sampler = sampler
+        self.controller = controller
+        self.backend = backend
+        self.sensors = sensors
+        self.server = None
+
+    def render(self):
+        out = []
+
+        def metric(name, kind, help_text, samples):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                out.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+        snap = self.sampler.snapshot
+        gib = 1024 ** 3
+        metric("fanctl_cpu_temperature_celsius", "gauge", "CPU package temperature.",
+               [("", snap.cpu_temp)])
+        metric("fanctl_cpu_usage_percent", "gauge", "CPU utilization.", [("", snap.cpu_usage)])
+        metric("fanctl_cpu_core_usage_percent", "gauge", "Per-core utilization.",
+               [(f'core="{core}"', usage) for core, usage in enumerate(snap.cpu_cores or ())])
+        metric("fanctl_cpu_frequency_hertz", "gauge", "Per-core clock from cpufreq.",
+               [(f'core="{core}"', None if mhz is None else mhz * 1000000)
+                for core, mhz in enumerate(snap.cpu_freqs or ())])
+        metric("fanctl_cpu_throttling", "gauge", "1 while thermal throttle counters are moving.",
+               [("", None if snap.throttling is None else int(snap.throttling))])
+        metric("fanctl_cpu_throttle_events_total", "counter",
+               "Thermal throttle events counted since the controller started.", [("", snap.throttle_events)])
+        metric("fanctl_ram_used_bytes", "gauge", "Used memory.",
+               [("", None if snap.ram_used is None else int(snap.ram_used * gib))])
+        metric("fanctl_ram_total_bytes", "gauge", "Total memory.",
+               [("", None if snap.ram_total is None else int(snap.ram_total * gib))])
+        gpus = [(name, info) for name, info in (("nvidia", snap.nvidia), ("amd", snap.amd)) if info]
+        metric("fanctl_gpu_temperature_celsius", "gauge", "GPU temperature.",
+               [(f'gpu="{name}"', info.get("temp")) for name, info in gpus])
+        metric("fanctl_gpu_usage_percent", "gauge", "GPU utilization.",
+               [(f'gpu="{name}"', info.get("usage")) for name, info in gpus])
+        metric("fanctl_fan_duty_percent", "gauge", "Fan speed last applied through NBFC.",
+               [(f'fan="{fan}"', speed) for fan, speed in snap.fan_speeds or ()])
+        if snap.time:
+            metric("fanctl_snapshot_age_seconds", "gauge", "Age of the sampled values.",
+                   [("", round(time.time() - snap.time, 3))])
+
+        ctrl = self.controller
+        metric("fanctl_mode", "gauge", "Active fan mode (1 for the current mode).",
+               [(f'mode="{_escape(mode)}"', int(mode == ctrl.mode)) for mode in ctrl.modes])
+        metric("fanctl_control_decisions_total", "counter",
+               "Auto-mode control decisions; rate() gives decisions per second.",
+               [("", ctrl.decisions)])
+        metric("fanctl_throttle_boosts_total", "counter",
+               "Times Auto mode went to full duty because the CPU throttled.", [("", ctrl.throttle_boosts)])
+        workloads = ctrl.workloads
+        if workloads is not None:
+            metric("fanctl_workload_floor_percent", "gauge", "Fan duty floor set by recognised workloads.",
+                   [("", round(workloads.floor, 1))])
+            metric("fanctl_workload_active", "gauge", "Workload rules currently raising the floor.",
+                   [(f'rule="{_escape(rule.name)}"', int(rule.name in workloads.active))
+                    for rule in workloads.rules])
+
+        limiter = ctrl.limiter
+        if limiter is not None:
+            metric("fanctl_cpu_power_limit_watts", "gauge", "CPU package power limits as last written.",
+                   [(f'zone="{zone}",constraint="{constraint}"', None if limiter.written.get(path) is None else limiter.written[path] / 1e6)
+                    for path, (zone, constraint) in limiter.labels.items()])
+            metric("fanctl_power_limit_reductions_total", "counter",
+                   "Times Auto mode lowered the CPU power limits because the fans were at full duty.",
+                   [("", limiter.reductions)])
+
+        backend = self.backend
+        metric("fanctl_nbfc_writes_total", "counter", "Fan-speed changes sent to NBFC.",
+               [("", backend.writes)])
+        metric("fanctl_nbfc_skipped_writes_total", "counter",
+               "Requests skipped because the fans were already at that speed.",
+               [("", backend.skipped)])
+        metric("fanctl_nbfc_write_errors_total", "counter", "Failed NBFC writes.",
+               [("", backend.errors)])
+        out.append("# HELP fanctl_nbfc_command_seconds Latency of NBFC write commands.")
+        out.append("# TYPE fanctl_nbfc_command_seconds histogram")
+        out.extend(backend.latency.lines("fanctl_nbfc_command_seconds"))
+
+        act = ctrl.actuator
+        metric("fanctl_actuator_requests_total", "counter", "Fan-speed requests from the controller.",
+               [("", act.requests)])
+        metric("fanctl_actuator_coalesced_total", "counter",
+               "Targets replaced by a newer request before being written.", [("", act.coalesced)])
+        metric("fanctl_actuator_deadband_skips_total", "counter",
+               "Changes dropped as smaller than the deadband.", [("", act.deadband_skips)])
+        metric("fanctl_actuator_slew_limited_total", "counter",
+               "Writes shortened by the slew-rate limit.", [("", act.slew_limited)])
+        metric("fanctl_actuator_readback_mismatches_total", "counter",
+               "Fans NBFC reported at a different target than written.", [("", act.mismatches)])
+
+        stages = instrument.stats()
+        if stages:
+            quantiles = (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms"))
+            metric("fanctl_stage_seconds", "summary",
+                   "Time spent per loop stage (only while instrumentation is on).",
+                   [(f'stage="{name}",quantile="{q}"', st[key] / 1000)
+                    for name, st in stages.items() if st["count"] for q, key in quantiles])
+            for name, st in stages.items():
+                if st["count"]:
+                    out.append(f'fanctl_stage_seconds_sum{{stage="{name}"}} {st["mean_ms"] * st["count"] / 1000}')
+                    out.append(f'fanctl_stage_seconds_count{{stage="{name}"}} {st["count"]}')
+
+        if self.sensors is not None:
+            metric("fanctl_sensor_read_errors_total", "counter", "Failed hwmon reads.",
+                   [("", self.sensors.read_errors)])
+            metric("fanctl_sensor_rescans_total", "counter", "hwmon rediscoveries.",
+                   [("", self.sensors.scans)])
+        return "\n".join(out) + "\n"
+
+    def serve(self, host="127.0.0.1", port=9101):
+        """Serve /metrics from a background thread."""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fanctl-metrics", daemon=True).start()
+        print(f"[Info] Serving metrics on http://{host}:{port}/metrics", flush=True)
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
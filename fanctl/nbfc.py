@@ -0,0 +1,245 @@
+import json
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+from fanctl import eventloop, instrument
+
+# nbfc_service publishes its live state here (path differs between releases)
+STATE_FILES = ("/run/nbfc_service.state.json", "/var/run/nbfc_service.state.json")
+
+DEFAULT_FAN_COUNT = 2
+
+# nbfc-linux service settings (selected model config) and model config directories
+SETTINGS_FILE = "/etc/nbfc/nbfc.json"
+CONFIG_DIRS = ("/usr/share/nbfc/configs", "/etc/nbfc/configs")
+
+
+def read_state(paths=STATE_FILES):
+    """Parsed nbfc_service state file, or None if no service state is published."""
+    for path in paths:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+# Parsed service state: what `nbfc status` prints, without running it
+FanStatus = namedtuple("FanStatus", "name automode critical temperature current_speed target_speed")
+ServiceStatus = namedtuple("ServiceStatus", "config read_only temperature fans")
+
+
+def _number(value):
+    try:
+        return None if value is None else round(float(value), 1)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_status(state):
+    """ServiceStatus from a state dict (read_state(), Backend.status()), or None without one.
+
+    nbfc-linux's nbfc_service writes "selected_config_id", "read_only" and,
+    per fan, "auto_mode"; the spellings of older releases ("config",
+    "selected_config", "read-only", "automode") are accepted too.
+    """
+    if not state or not isinstance(state, dict):
+        return None
+    fans = []
+    for n, fan in enumerate(state.get("fans") or ()):
+        automode = fan.get("automode", fan.get("auto_mode"))
+        fans.append(FanStatus(
+            name=str(fan.get("name") or f"Fan {n}"),
+            automode=None if automode is None else bool(automode),
+            critical=bool(fan.get("critical", False)),
+            temperature=_number(fan.get("temperature")),
+            current_speed=_number(fan.get("current_speed")),
+            target_speed=_number(fan.get("target_speed")),
+        ))
+    temps = [f.temperature for f in fans if f.temperature is not None]
+    temperature = _number(state.get("temperature"))
+    read_only = state.get("read_only", state.get("read-only"))
+    return ServiceStatus(
+        config=state.get("selected_config_id") or state.get("config") or state.get("selected_config"),
+        read_only=None if read_only is None else bool(read_only),
+        temperature=temperature if temperature is not None else (max(temps) if temps else None),
+        fans=tuple(fans),
+    )
+
+
+def selected_config(path=SETTINGS_FILE):
+    """Name of the model config the service is set up with, or None."""
+    try:
+        with open(path) as f:
+            return json.load(f).get("SelectedConfigId") or None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Backend:
+    """Fan-control backend that remembers what it last applied to each fan.
+
+    Subclasses implement _write() (and _write_async() when writing means
+    waiting on a process); set_speeds() filters out fans already at the
+    requested speed so repeated identical requests cost nothing.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.applied = {}
+        self.writes = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_error = None
+        self.latency = instrument.Histogram()
+
+    def fan_count(self):
+        return DEFAULT_FAN_COUNT
+
+    def status(self):
+        return None
+
+    def forget(self):
+        """Drop the applied-speed cache, e.g. after the service was restarted."""
+        with self.lock:
+            self.applied.clear()
+
+    def _pending(self, speeds):
+        if not isinstance(speeds, dict):
+            speeds = {fan: speeds for fan in range(self.fan_count())}
+        with self.lock:
+            pending = {fan: s for fan, s in speeds.items() if self.applied.get(fan) != s}
+            if not pending:
+                self.skipped += 1
+        return pending
+
+    def _record(self, pending, start, error=None):
+        self.latency.observe(time.monotonic() - start)
+        with self.lock:
+            if error is not None:
+                self.errors += 1
+                self.last_error = str(error)
+                for fan in pending:
+                    self.applied.pop(fan, None)
+                return False
+            self.writes += 1
+            self.last_error = None
+            self.applied.update(pending)
+            return True
+
+    def set_speeds(self, speeds):
+        """Apply a speed to every fan (int) or per fan ({fan: speed}).
+
+        Returns True when the fans are at the requested speeds afterwards.
+        """
+        pending = self._pending(speeds)
+        if not pending:
+            return True
+        start = time.monotonic()
+        try:
+            with instrument.stage("nbfc"):
+                self._write(pending)
+        except Exception as e:
+            return self._record(pending, start, e)
+        return self._record(pending, start)
+
+    async def set_speeds_async(self, speeds):
+        """set_speeds() for the core's event loop; the write never blocks the loop."""
+        pending = self._pending(speeds)
+        if not pending:
+            return True
+        start = time.monotonic()
+        try:
+            with instrument.stage("nbfc"):
+                await self._write_async(pending)
+        except Exception as e:
+            return self._record(pending, start, e)
+        return self._record(pending, start)
+
+    def _write(self, pending):
+        raise NotImplementedError
+
+    async def _write_async(self, pending):
+        # In-memory backends have nothing to wait for
+        self._write(pending)
+
+
+class CliBackend(Backend):
+    """Drives nbfc-linux through its client, batching fans into one call when possible."""
+
+    def __init__(self, nbfc="nbfc", sudo=False, state_files=STATE_FILES, timeout=eventloop.COMMAND_TIMEOUT):
+        super().__init__()
+        self.prefix = (["sudo"] if sudo else []) + [nbfc]
+        self.timeout = timeout
+        self.state_files = state_files
+        self._fan_count = None
+
+    def status(self):
+        return read_state(self.state_files)
+
+    def fan_count(self):
+        # Read once: the fan count only changes with the config, which restarts the service
+        if self._fan_count is None:
+            state = self.status()
+            if not state or not state.get("fans"):
+                return DEFAULT_FAN_COUNT
+            self._fan_count = len(state["fans"])
+        return self._fan_count
+
+    def forget(self):
+        super().forget()
+        self._fan_count = None
+
+    def _commands(self, pending):
+        speeds = set(pending.values())
+        if len(speeds) == 1 and len(pending) >= self.fan_count():
+            # Without --fan nbfc applies the speed to every fan in one go
+            return [["set", "--speed", str(speeds.pop())]]
+        return [["set", "--fan", str(fan), "--speed", str(speed)] for fan, speed in sorted(pending.items())]
+
+    def _run(self, *args):
+        try:
+            return subprocess.run(self.prefix + list(args), capture_output=True, text=True, check=True,
+                                  timeout=self.timeout)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(e.stderr.strip() if e.stderr else "Unknown error") from None
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"nbfc timed out after {self.timeout:g}s") from None
+
+    def _write(self, pending):
+        for args in self._commands(pending):
+            self._run(*args)
+
+    async def _write_async(self, pending):
+        for args in self._commands(pending):
+            await eventloop.run_command(self.prefix + args, self.timeout)
+
+
+class StubBackend(Backend):
+    """In-memory backend for tests and dry runs; records every write."""
+
+    def __init__(self, fans=DEFAULT_FAN_COUNT, fail=False):
+        super().__init__()
+        self.fans = fans
+        self.fail = fail
+        self.calls = []
+
+    def fan_count(self):
+        return self.fans
+
+    def status(self):
+        return {
+            "selected_config_id": "stub",
+            "read_only": False,
+            "fans": [{"name": f"Fan {fan}", "auto_mode": False,
+                      "current_speed": self.applied.get(fan, 0.0),
+                      "target_speed": self.applied.get(fan, 0.0)} for fan in range(self.fans)],
+        }
+
+    def _write(self, pending):
+        if self.fail:
+            raise RuntimeError("stub backend failure")
+        self.calls.append(dict(pending))
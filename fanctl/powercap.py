@@ -0,0 +1,155 @@
+"""CPU package power limits as a second cooling lever.
+
+Once Auto mode has every fan at full duty, the only way left to keep the
+CPU off its firmware throttle point is to make less heat. PowerLimiter
+scales the package's long- and short-term power limits (PL1 and PL2, the
+powercap constraints "long_term" and "short_term") below the values that
+were in place when it started:
+
+- while the fans are saturated and the CPU is at or above `limit_temp`,
+  the limits fall by `down_rate` of their original value per second, down
+  to `min_scale`;
+- between `release_temp` and `limit_temp` they hold (hysteresis);
+- at or below `release_temp` they climb back by `up_rate` per second.
+
+A steady, slightly lower clock beats the sawtooth of thermal throttling.
+Intel and AMD CPUs both register their package zones with powercap
+(intel-rapl:N, plus intel-rapl-mmio:N on newer Intel laptops); every zone
+whose name starts with "package" is driven. Limits are only written when
+they move by at least `quantum` microwatts.
+"""
+import os
+
+POWERCAP_ROOT = "/sys/class/powercap"
+CONSTRAINTS = ("long_term", "short_term")
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class PowerLimiter:
+    """Lowers and restores package power limits around the fans' ceiling."""
+
+    def __init__(self, root=POWERCAP_ROOT, limit_temp=90.0, release_temp=82.0, min_scale=0.5,
+                 down_rate=0.02, up_rate=0.01, quantum=1000000, saved=None):
+        self.root = root
+        self.limit_temp = limit_temp
+        self.release_temp = release_temp
+        self.min_scale = min_scale
+        self.down_rate = down_rate
+        self.up_rate = up_rate
+        self.quantum = quantum
+        # {power_limit_uw path: limit to restore}, {path: (zone, constraint)} and what each holds now
+        self.originals = {}
+        self.labels = {}
+        self.written = {}
+        self.scale = 1.0
+        self.reductions = 0
+        self.failed = False
+        self._scan(saved or {})
+
+    def _scan(self, saved):
+        try:
+            entries = sorted(os.listdir(self.root))
+        except OSError:
+            return
+        for entry in entries:
+            # Subzones (intel-rapl:0:0, the cores or uncore of a package) have a second colon
+            if entry.count(":") != 1:
+                continue
+            zone = os.path.join(self.root, entry)
+            name = _read(os.path.join(zone, "name"))
+            if name is None or not name.startswith("package"):
+                continue
+            for n in range(8):
+                constraint = _read(os.path.join(zone, f"constraint_{n}_name"))
+                if constraint is None:
+                    break
+                path = os.path.join(zone, f"constraint_{n}_power_limit_uw")
+                value = _read(path)
+                if constraint not in CONSTRAINTS or not value or not value.isdigit() \
+                        or not os.access(path, os.W_OK):
+                    continue
+                current = int(value)
+                # Limits saved by a run that did not get to restore them win over what is set now
+                self.originals[path] = int(saved.get(path, current))
+                self.labels[path] = (entry, constraint)
+                self.written[path] = current
+
+    def saved(self):
+        """Limits to restore while any is lowered (for the state store), else None."""
+        lowered = any(self.written.get(path) != original for path, original in self.originals.items())
+        return dict(self.originals) if lowered else None
+
+    def _write(self):
+        for path, original in self.originals.items():
+            target = original if self.scale >= 1.0 else \
+                int(round(original * self.scale / self.quantum) * self.quantum)
+            if target == self.written.get(path):
+                continue
+            try:
+                with open(path, "w") as f:
+                    f.write(f"{target}\n")
+            except OSError as e:
+                # Locked by the firmware, or not root after all: undo what was changed and stop
+                print(f"[Error] Setting CPU power limit: {e}; power limiting disabled")
+                self.failed = True
+                self.scale = 1.0
+                self._put_back()
+                return
+            self.written[path] = target
+
+    def _put_back(self):
+        """Write the original limit to every path this limiter changed."""
+        for path, original in self.originals.items():
+            written = self.written.get(path)
+            if written is None or written == original:
+                continue
+            try:
+                with open(path, "w") as f:
+                    f.write(f"{original}\n")
+            except OSError as e:
+                print(f"[Error] Restoring CPU power limit {path}: {e}")
+                continue
+            self.written[path] = original
+
+    @property
+    def active(self):
+        """False once disabled after a write error (or without any writable limit)."""
+        return bool(self.originals) and not self.failed
+
+    def step(self, temp, saturated, dt):
+        """One control step; returns the current scale of the original limits."""
+        if not self.active or temp is None:
+            return self.scale
+        scale = self.scale
+        if saturated and temp >= self.limit_temp:
+            if scale >= 1.0:
+                self.reductions += 1
+            scale = max(scale - self.down_rate * dt, self.min_scale)
+        elif temp <= self.release_temp:
+            scale = min(scale + self.up_rate * dt, 1.0)
+        if scale != self.scale:
+            self.scale = scale
+            self._write()
+        return self.scale
+
+    def restore(self):
+        """Put the original limits back (mode change, shutdown, stale limits of a crashed run)."""
+        self.scale = 1.0
+        if self.failed:
+            self._put_back()
+        else:
+            self._write()
+
+    def reapply(self):
+        """Write the current limits again; firmware may reset them on resume."""
+        if self.failed:
+            return
+        self.written = {}
+        self._write()
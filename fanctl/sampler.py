@@ -0,0 +1,203 @@
+"""Sampler publishing immutable snapshots from timers on the core's event loop.
+
+Only the sampler touches hardware. Everyone else (GUIs, tray, control loop,
+exporters) reads `sampler.snapshot`, which is replaced in one reference
+assignment so readers never see a half-updated sample. The delay between
+samples comes from fanctl.schedule.AdaptiveInterval; each sample re-arms a
+CLOCK_BOOTTIME timer on the loop, and poke() pulls it in to now. Because that
+timer keeps counting through suspend, the first sample after a resume is
+taken right away, and resume listeners run before it.
+"""
+import time
+
+from fanctl import instrument
+from fanctl.schedule import AdaptiveInterval, BoottimeTimer, PowerWatcher, suspended_seconds
+
+# psutil is only imported once a sample needs it (GUI shown, exporter running),
+# so a tray-only GUI never loads it; the headless daemon can run without it
+_UNLOADED = object()
+psutil = _UNLOADED
+
+
+def _psutil():
+    """The psutil module, its CPU counters primed on first use; None when missing."""
+    global psutil
+    if psutil is _UNLOADED:
+        try:
+            import psutil as module
+        except ImportError:
+            module = None
+        else:
+            # Prime the counters so the next non-blocking reading is meaningful
+            module.cpu_percent(interval=None)
+        psutil = module
+    return psutil
+
+
+class Snapshot:
+    """One immutable set of readings; fan_speeds holds (NBFC fan id, speed) pairs."""
+
+    __slots__ = ("seq", "time", "cpu_temp", "cpu_usage", "ram_used", "ram_total",
+                 "ram_percent", "nvidia", "amd", "temps", "fan_speeds",
+                 "cpu_cores", "cpu_freqs", "throttling", "throttle_events")
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is immutable")
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+EMPTY = Snapshot(seq=0, fan_speeds=())
+
+
+class Sampler:
+    """Collects every metric on an adaptive cadence into a Snapshot."""
+
+    def __init__(self, sensors, backend=None, interval=5.0, gpus=None, schedule=None, cpus=None):
+        self.sensors = sensors
+        self.backend = backend
+        self.gpus = gpus
+        # fanctl.cpustate.CpuMonitor: per-core load, clocks and throttling
+        self.cpus = cpus
+        self.chips = ()
+        self.schedule = schedule or AdaptiveInterval(base=interval)
+        # CPU usage and RAM only feed the GUI labels and exporters
+        self.detail = True
+        self.snapshot = EMPTY
+        self.listeners = []
+        self.resume_listeners = []
+        self.power = PowerWatcher(self.poke)
+        # fanctl.eventloop.EventLoop once started; the BoottimeTimer, or the pending
+        # call_later() handle where timerfd is unavailable, and the suspend time when armed
+        self.loop = None
+        self.wake = None
+        self.timer = None
+        self.asleep = 0.0
+        # cProfile.Profile while fanctl.instrument.Profiler is recording
+        self.profiler = None
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) after each sample; it runs on the loop thread."""
+        self.listeners.append(callback)
+
+    def watch(self, chips):
+        """Also read these hwmon chips (by name) into snapshot.temps."""
+        self.chips = tuple(chips)
+
+    def add_resume_listener(self, callback):
+        """Call callback() after the system resumed from suspend."""
+        self.resume_listeners.append(callback)
+
+    def poke(self):
+        """Sample right away and poll fast for a while."""
+        self.schedule.reset()
+        if self.loop is not None:
+            self.loop.call(self._arm, 0)
+
+    def set_visible(self, visible):
+        """GUI shown: refresh at the base rate. Hidden: skip GUI-only metrics and back off."""
+        self.detail = visible
+        self.schedule.cap = self.schedule.base if visible else self.schedule.slow
+        if visible:
+            self.poke()
+
+    def sample(self):
+        """Read all sources once and publish the result."""
+        with instrument.stage("sample"):
+            return self._sample()
+
+    def _sample(self):
+        values = {"seq": self.snapshot.seq + 1, "time": time.time()}
+        with instrument.stage("sensors"):
+            values["cpu_temp"] = self.sensors.cpu_temp()
+            if self.chips:
+                values["temps"] = {chip: self.sensors.hottest(chip) for chip in self.chips}
+        if self.cpus is not None:
+            with instrument.stage("cpu"):
+                # Throttle counters feed the control loop, so they are read even while hidden
+                values.update(self.cpus.read(self.detail))
+        ps = _psutil() if self.detail else None
+        if ps is not None:
+            with instrument.stage("psutil"):
+                if self.cpus is None:
+                    # interval=None compares against the previous call instead of sleeping
+                    values["cpu_usage"] = ps.cpu_percent(interval=None)
+                mem = ps.virtual_memory()
+                values["ram_used"] = mem.used / (1024 ** 3)
+                values["ram_total"] = mem.total / (1024 ** 3)
+                values["ram_percent"] = mem.percent
+        if self.gpus is not None:
+            with instrument.stage("gpu"):
+                values.update(self.gpus.read())
+        if self.backend is not None:
+            values["fan_speeds"] = tuple(sorted(dict(self.backend.applied).items()))
+        else:
+            values["fan_speeds"] = ()
+        snapshot = Snapshot(**values)
+        self.snapshot = snapshot
+        for callback in list(self.listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"[Error] Sampler listener: {e}")
+        return snapshot
+
+    def _resumed(self):
+        print("[Info] Resumed from suspend", flush=True)
+        self.schedule.reset()
+        for callback in list(self.resume_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Error] Resume listener: {e}")
+
+    def _arm(self, delay):
+        self.asleep = suspended_seconds()
+        if self.wake is not None:
+            self.wake.arm(delay)
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.loop.aio.call_later(delay, self._tick)
+
+    def _tick(self):
+        self.timer = None
+        if suspended_seconds() - self.asleep > 1.0:
+            self._resumed()
+        try:
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.runcall(self.sample)
+            else:
+                self.sample()
+        except Exception as e:
+            print(f"[Error] Sampling: {e}")
+        self._arm(self.schedule.next(self.snapshot.cpu_temp))
+
+    def start(self, loop):
+        """Take the first sample now and keep sampling on `loop`; call it on the loop thread."""
+        self.loop = loop
+        self.power.start(loop)
+        wake = BoottimeTimer(self._tick)
+        if wake.fd is not None:
+            wake.start(loop)
+            self.wake = wake
+        self._tick()
+
+    def stop(self):
+        if self.wake is not None:
+            self.wake.close()
+            self.wake = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.gpus is not None:
+            self.gpus.close()
+        if self.cpus is not None:
+            self.cpus.close()
+        self.power.close()
@@ -0,0 +1,189 @@
+"""Adaptive polling cadence.
+
+AdaptiveInterval decides how long the sampler sleeps: it polls at `fast`
+while the temperature is moving quickly or sits near a fan-curve breakpoint
+and doubles the delay up to `cap` while readings are stable. PowerWatcher
+wakes the sampler as soon as the power source changes. The sampler's timer,
+BoottimeTimer, runs on CLOCK_BOOTTIME so it also fires right after a resume,
+and Sampler then notices the suspend from the gap between CLOCK_BOOTTIME and
+the monotonic clock.
+"""
+import os
+import time
+
+from fanctl.hwmon import UeventMonitor
+
+_BOOTTIME = getattr(time, "CLOCK_BOOTTIME", None)
+
+
+def suspended_seconds():
+    """Total time spent in system suspend since boot (0 where unsupported)."""
+    if _BOOTTIME is None:
+        return 0.0
+    return time.clock_gettime(_BOOTTIME) - time.monotonic()
+
+
+def breakpoints(fan_curve):
+    """Temperatures at which the curve changes behaviour, hysteresis edges included."""
+    points = set()
+    for p in fan_curve.points:
+        points.add(p.temp)
+        points.add(p.temp - p.hysteresis)
+    if fan_curve.pid is not None:
+        points.add(fan_curve.pid.target)
+    return sorted(points)
+
+
+class AdaptiveInterval:
+    """Exponential back-off between `fast` and `cap` seconds, reset by movement."""
+
+    def __init__(self, base=5.0, fast=1.0, slow=30.0, slope=0.5, margin=2.0, points=()):
+        self.base = base
+        self.fast = fast
+        self.slow = slow
+        self.cap = slow
+        # °C per second considered "changing quickly"
+        self.slope = slope
+        # Distance in °C from a breakpoint that counts as "near"
+        self.margin = margin
+        self.points = tuple(points)
+        self.current = base
+        self.last = None
+
+    def reset(self):
+        """Poll fast again, e.g. after a mode change or a power event."""
+        self.current = self.fast
+        self.last = None
+
+    def next(self, temp, now=None):
+        """Delay before the next sample, given the temperature just read."""
+        now = time.monotonic() if now is None else now
+        last, self.last = self.last, (now, temp)
+        if temp is None or last is None or last[1] is None:
+            self.current = min(self.base, self.cap)
+            return self.current
+        dt = now - last[0]
+        delta = abs(temp - last[1])
+        # A large step after a long sleep counts as movement even at a low average slope
+        moving = delta >= self.margin or (dt > 0 and delta / dt >= self.slope)
+        near = any(abs(temp - p) <= self.margin for p in self.points)
+        if moving or near:
+            self.current = self.fast
+        else:
+            self.current = min(self.current * 2, self.cap)
+        return self.current
+
+
+class PowerWatcher:
+    """Calls `callback` whenever a power_supply uevent (AC plug/unplug) arrives."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.monitor = UeventMonitor("power_supply")
+        self.loop = None
+
+    def start(self, loop):
+        """Watch the uevent socket from `loop` (a fanctl.eventloop.EventLoop)."""
+        if self.monitor.sock is None:
+            return
+        self.loop = loop
+        # No timeout and no thread: the loop only wakes when something happens
+        loop.aio.add_reader(self.monitor.sock.fileno(), self._readable)
+
+    def _readable(self):
+        if self.monitor.changed():
+            self.callback()
+
+    def close(self):
+        if self.loop is not None and self.monitor.sock is not None:
+            self.loop.aio.remove_reader(self.monitor.sock.fileno())
+            self.loop = None
+        self.monitor.close()
+
+
+def _timerfd():
+    """(fd, settime(fd, seconds)) of a non-blocking CLOCK_BOOTTIME timerfd, or (None, None)."""
+    if _BOOTTIME is None:
+        return None, None
+    if hasattr(os, "timerfd_create"):
+        # Python 3.13+
+        try:
+            fd = os.timerfd_create(_BOOTTIME, flags=os.TFD_NONBLOCK | os.TFD_CLOEXEC)
+        except OSError:
+            return None, None
+        return fd, lambda fd, seconds: os.timerfd_settime(fd, initial=seconds)
+    import ctypes
+    import ctypes.util
+
+    class Timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    class Itimerspec(ctypes.Structure):
+        _fields_ = [("it_interval", Timespec), ("it_value", Timespec)]
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        create, settime = libc.timerfd_create, libc.timerfd_settime
+    except (OSError, AttributeError):
+        return None, None
+    # TFD_NONBLOCK and TFD_CLOEXEC share the values of O_NONBLOCK and O_CLOEXEC
+    fd = create(_BOOTTIME, os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        return None, None
+
+    def set_time(fd, seconds):
+        whole = int(seconds)
+        spec = Itimerspec(Timespec(0, 0), Timespec(whole, int((seconds - whole) * 1e9)))
+        if settime(fd, 0, ctypes.byref(spec), None) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+    return fd, set_time
+
+
+class BoottimeTimer:
+    """A one-shot loop timer that keeps counting while the system is suspended.
+
+    loop.call_later() runs on CLOCK_MONOTONIC, which stops during suspend, so
+    a sample due 30 s after going to sleep would only come 30 s after the
+    resume. A CLOCK_BOOTTIME timerfd has expired by then and fires as soon as
+    the loop runs again. `fd` is None where timerfd is unavailable; callers
+    fall back to call_later().
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.fd, self._settime = _timerfd()
+        self.loop = None
+
+    def start(self, loop):
+        """Watch the timer from `loop` (a fanctl.eventloop.EventLoop)."""
+        if self.fd is None:
+            return
+        self.loop = loop
+        loop.aio.add_reader(self.fd, self._readable)
+
+    def arm(self, delay):
+        """Fire once after `delay` seconds, replacing any pending expiry."""
+        # An expiry of zero would disarm the timer instead
+        self._settime(self.fd, max(delay, 1e-6))
+
+    def cancel(self):
+        if self.fd is not None:
+            self._settime(self.fd, 0)
+
+    def _readable(self):
+        try:
+            os.read(self.fd, 8)
+        except BlockingIOError:
+            # Re-armed after it expired but before the loop got here
+            return
+        self.callback()
+
+    def close(self):
+        if self.fd is None:
+            return
+        if self.loop is not None:
+            self.loop.aio.remove_reader(self.fd)
+            self.loop = None
+        os.close(self.fd)
+        self.fd = None
@@ -0,0 +1,320 @@
+"""Simulated laptop for exercising the control loop without hardware.
+
+Simulation builds, in a temporary directory, everything the real code reads
+or runs: a hwmon tree (coretemp, nvme, acpitz), a PCI device tree with an
+NVIDIA dGPU, a CPU tree with cpufreq and thermal_throttle counters plus a
+matching /proc/stat, a powercap tree with one RAPL package zone, and fake `nbfc` and `nvidia-smi` executables that are put first
+on PATH. A two-node ThermalModel (CPU and GPU, each cooled by both fans)
+turns load, the package power limit and the fan speeds the fake nbfc was
+last told to apply into temperatures, which are written back into the fake
+tree.
+
+The fakes keep their state in plain files inside the directory:
+
+    nbfc.log        one line per nbfc invocation (its arguments)
+    nbfc.state.json what nbfc_service would publish, in nbfc-linux's schema
+    nvidia.csv      the line the fake nvidia-smi prints
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+FAN_NAMES = ("CPU Fan", "GPU Fan")
+CPU_COUNT = 4
+# Hardware threads per core: cpu0 and cpu1 share core 0, as with SMT
+SMT = 2
+# Clock range of the fake CPUs in kHz (idle, full load)
+CPU_KHZ = (800000, 4200000)
+GPU_NAME = "NVIDIA GeForce RTX 3050 Laptop GPU"
+# GPU load at which the fake dGPU leaves runtime suspend
+GPU_WAKE_LOAD = 0.1
+# Package power limits of the fake RAPL zone in µW: constraint name -> limit
+POWER_LIMITS = {"long_term": 60000000, "short_term": 80000000, "peak_power": 120000000}
+
+# hwmon chips of the fake tree: name -> ((index, label), ...)
+CHIPS = {
+    "coretemp": ((1, "Package id 0"), (2, "Core 0"), (3, "Core 1")),
+    "nvme": ((1, "Composite"),),
+    "acpitz": ((1, ""),),
+}
+
+_NBFC = '''#!{python}
+import json, os, sys
+STATE, LOG = {state!r}, {log!r}
+args = sys.argv[1:]
+with open(LOG, "a") as f:
+    f.write(" ".join(args) + "\\n")
+with open(STATE) as f:
+    state = json.load(f)
+fans = state["fans"]
+if args[:1] == ["set"]:
+    opts = dict(zip(args[1::2], args[2::2]))
+    targets = fans if "--fan" not in opts else [fans[int(opts["--fan"])]]
+    for fan in targets:
+        if "--auto" in args:
+            fan["auto_mode"] = True
+        else:
+            fan["auto_mode"] = False
+            # The EC only has speed_steps duty levels
+            steps = fan["speed_steps"]
+            fan["target_speed"] = round(round(float(opts["--speed"]) * steps / 100) * 100 / steps, 2)
+elif args[:1] == ["--version"]:
+    print("nbfc 0.0.0 (simulated)")
+    sys.exit(0)
+elif args[:2] == ["config", "-l"]:
+    print(state["selected_config_id"])
+    sys.exit(0)
+elif args[:1] == ["status"]:
+    print("Read-only                     : false")
+    print("Selected Config Name          : " + state["selected_config_id"])
+    for i, fan in enumerate(fans):
+        print()
+        print("Fan Display Name              : " + fan["name"])
+        print("Auto Control Enabled          : " + str(fan["auto_mode"]).lower())
+        print("Current Fan Speed             : %.2f" % fan["current_speed"])
+        print("Target Fan Speed              : %.2f" % fan["target_speed"])
+    sys.exit(0)
+with open(STATE + ".tmp", "w") as f:
+    json.dump(state, f)
+os.replace(STATE + ".tmp", STATE)
+'''
+
+# Prints the current line whenever it changes, and at least every --loop-ms
+_NVIDIA_SMI = '''#!{python}
+import sys, time
+CSV = {csv!r}
+loop = [a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--loop-ms=")]
+period = int(loop[0]) / 1000 if loop else None
+last, last_at = None, 0.0
+while True:
+    try:
+        with open(CSV) as f:
+            line = f.read().strip()
+    except OSError:
+        line = last
+    now = time.monotonic()
+    if line and (line != last or period is None or now - last_at >= period):
+        print(line, flush=True)
+        last, last_at = line, now
+    if period is None:
+        break
+    time.sleep(0.002)
+'''
+
+
+class ThermalModel:
+    """Lumped CPU and GPU heat capacities cooled through the fans.
+
+    Each node obeys C dT/dt = P(load) - G(fans) (T - ambient) + k (T_other - T).
+    G is the passive conductance plus the fans' share, and the fans spin up
+    towards their target speed with a short lag. Above tjmax a node
+    throttles, which caps its power; a power limit passed to step() caps it
+    as well, like RAPL's PL1.
+    """
+
+    # name: (capacity J/K, idle W, full-load W, tjmax °C, fan weights)
+    NODES = {
+        "cpu": (30.0, 5.0, 55.0, 100.0, (0.7, 0.3)),
+        "gpu": (45.0, 3.0, 65.0, 87.0, (0.3, 0.7)),
+    }
+
+    def __init__(self, ambient=35.0, passive=0.35, fan_gain=1.3, coupling=0.2, fan_lag=3.0):
+        self.ambient = ambient
+        self.passive = passive
+        self.fan_gain = fan_gain
+        self.coupling = coupling
+        self.fan_lag = fan_lag
+        self.temps = {name: ambient + 5.0 for name in self.NODES}
+        self.fans = [0.0] * len(FAN_NAMES)
+        self.throttled = {name: 0.0 for name in self.NODES}
+        # Steps spent throttling, as the thermal_throttle counters would count them
+        self.throttle_events = {name: 0 for name in self.NODES}
+
+    def step(self, dt, loads, targets, limits=None):
+        """Advance by dt seconds; loads are 0..1 per node, targets fan speeds in %, limits W per node."""
+        alpha = min(dt / self.fan_lag, 1.0)
+        for i, target in enumerate(targets):
+            self.fans[i] += alpha * (target - self.fans[i])
+        temps = dict(self.temps)
+        for name, (capacity, idle, full, tjmax, weights) in self.NODES.items():
+            temp = temps[name]
+            airflow = sum(w * f / 100.0 for w, f in zip(weights, self.fans))
+            conductance = self.passive + self.fan_gain * airflow
+            power = idle + (full - idle) * loads.get(name, 0.0)
+            if limits and limits.get(name) is not None:
+                power = min(power, limits[name])
+            if temp >= tjmax:
+                # Throttling holds the node at tjmax
+                power = min(power, conductance * (tjmax - self.ambient))
+                self.throttled[name] += dt
+                self.throttle_events[name] += 1
+            other = sum(t for n, t in temps.items() if n != name) / (len(temps) - 1)
+            flow = power - conductance * (temp - self.ambient) + self.coupling * (other - temp)
+            self.temps[name] = temp + flow * dt / capacity
+        return self.temps
+
+
+class Simulation:
+    """Temporary fake hardware; use as a context manager.
+
+    `speed_steps` is how many duty levels the fake EC has; the fake nbfc
+    rounds every target to the nearest one, as nbfc_service reports it.
+    """
+
+    def __init__(self, root=None, fans=len(FAN_NAMES), speed_steps=100):
+        self.owned = root is None
+        self.root = root or tempfile.mkdtemp(prefix="fanctl-sim-")
+        self.hwmon_root = os.path.join(self.root, "hwmon")
+        self.pci_root = os.path.join(self.root, "pci")
+        self.bin = os.path.join(self.root, "bin")
+        self.state_file = os.path.join(self.root, "nbfc.state.json")
+        self.log_file = os.path.join(self.root, "nbfc.log")
+        self.nvidia_file = os.path.join(self.root, "nvidia.csv")
+        self.cpu_root = os.path.join(self.root, "cpu")
+        self.proc_stat = os.path.join(self.root, "stat")
+        self.powercap_root = os.path.join(self.root, "powercap")
+        self.inputs = {}
+        # Cumulative (busy, idle) jiffies per CPU, as /proc/stat reports them
+        self.jiffies = [[0, 0] for _ in range(CPU_COUNT)]
+        self.saved_path = None
+        self._build(fans, speed_steps)
+
+    def _write(self, path, text, mode=None):
+        with open(path, "w") as f:
+            f.write(text)
+        if mode is not None:
+            os.chmod(path, mode)
+
+    def _build(self, fans, speed_steps):
+        for n, (chip, inputs) in enumerate(CHIPS.items()):
+            chip_dir = os.path.join(self.hwmon_root, f"hwmon{n}")
+            os.makedirs(chip_dir)
+            self._write(os.path.join(chip_dir, "name"), chip + "\n")
+            for index, label in inputs:
+                if label:
+                    self._write(os.path.join(chip_dir, f"temp{index}_label"), label + "\n")
+                path = os.path.join(chip_dir, f"temp{index}_input")
+                self._write(path, "40000\n")
+                self.inputs.setdefault(chip, []).append(path)
+        gpu_dir = os.path.join(self.pci_root, "0000:01:00.0")
+        os.makedirs(os.path.join(gpu_dir, "power"))
+        self._write(os.path.join(gpu_dir, "vendor"), "0x10de\n")
+        self._write(os.path.join(gpu_dir, "class"), "0x030200\n")
+        self.set_gpu_power("active")
+        os.makedirs(self.bin)
+        python = sys.executable
+        self._write(os.path.join(self.bin, "nbfc"),
+                    _NBFC.format(python=python, state=self.state_file, log=self.log_file), 0o755)
+        self._write(os.path.join(self.bin, "nvidia-smi"),
+                    _NVIDIA_SMI.format(python=python, csv=self.nvidia_file), 0o755)
+        names = FAN_NAMES[:fans] + tuple(f"Fan {i}" for i in range(len(FAN_NAMES), fans))
+        self._write(self.state_file, json.dumps({
+            "pid": os.getpid(),
+            "selected_config_id": "Simulated Laptop",
+            "read_only": False,
+            "fans": [{"name": name, "temperature": 40.0, "auto_mode": True, "critical": False,
+                      "current_speed": 0.0, "target_speed": 0.0, "speed_steps": speed_steps}
+                     for name in names],
+        }))
+        self._write(self.log_file, "")
+        for cpu in range(CPU_COUNT):
+            base = os.path.join(self.cpu_root, f"cpu{cpu}")
+            for sub in ("cpufreq", "thermal_throttle", "topology"):
+                os.makedirs(os.path.join(base, sub))
+            self._write(os.path.join(base, "topology", "physical_package_id"), "0\n")
+            self._write(os.path.join(base, "topology", "core_id"), f"{cpu // SMT}\n")
+        package = os.path.join(self.powercap_root, "intel-rapl:0")
+        # As in sysfs, the core subzone sits inside its package and is linked next to it
+        os.makedirs(os.path.join(package, "intel-rapl:0:0"))
+        self._write(os.path.join(package, "intel-rapl:0:0", "name"), "core\n")
+        os.symlink(os.path.join(package, "intel-rapl:0:0"), os.path.join(self.powercap_root, "intel-rapl:0:0"))
+        self._write(os.path.join(package, "name"), "package-0\n")
+        for n, (constraint, limit) in enumerate(POWER_LIMITS.items()):
+            self._write(os.path.join(package, f"constraint_{n}_name"), constraint + "\n")
+            self._write(os.path.join(package, f"constraint_{n}_power_limit_uw"), f"{limit}\n")
+        self.set_gpu(40.0, 0)
+        self.set_cpu(0.0)
+
+    def set_temp(self, chip, temp):
+        """Set every input of a chip; rewritten in place so open descriptors stay valid."""
+        data = f"{int(round(temp * 1000))}\n".encode()
+        for path in self.inputs[chip]:
+            with open(path, "r+b") as f:
+                f.write(data)
+                f.truncate()
+
+    def set_gpu(self, temp, usage):
+        self._write(self.nvidia_file, f"0, {GPU_NAME}, {int(usage)}, {int(round(temp))}, 1024, 4096\n")
+
+    def set_gpu_power(self, status):
+        """Set the dGPU's runtime PM state ("active" or "suspended")."""
+        self._write(os.path.join(self.pci_root, "0000:01:00.0", "power", "runtime_status"), status + "\n")
+
+    def set_cpu(self, load, throttle_count=0, ticks=100):
+        """Advance /proc/stat by `ticks` jiffies per CPU at this load and set clocks and counters."""
+        busy = int(round(ticks * min(max(load, 0.0), 1.0)))
+        low, high = CPU_KHZ
+        lines = []
+        for cpu, counts in enumerate(self.jiffies):
+            counts[0] += busy
+            counts[1] += ticks - busy
+            base = os.path.join(self.cpu_root, f"cpu{cpu}")
+            self._write(os.path.join(base, "cpufreq", "scaling_cur_freq"), f"{int(low + (high - low) * load)}\n")
+            self._write(os.path.join(base, "thermal_throttle", "core_throttle_count"), f"{throttle_count}\n")
+            self._write(os.path.join(base, "thermal_throttle", "package_throttle_count"), f"{throttle_count}\n")
+            lines.append(f"cpu{cpu} {counts[0]} 0 0 {counts[1]} 0 0 0 0 0 0")
+        total_busy = sum(c[0] for c in self.jiffies)
+        total_idle = sum(c[1] for c in self.jiffies)
+        lines.insert(0, f"cpu  {total_busy} 0 0 {total_idle} 0 0 0 0 0 0")
+        self._write(self.proc_stat, "\n".join(lines) + "\nintr 0\n")
+
+    def apply(self, temps, loads, throttle_count=0):
+        """Publish model temperatures, loads and throttle events to the fake hardware."""
+        cpu = temps["cpu"]
+        self.set_temp("coretemp", cpu)
+        # The SSD and the board sensor trail the CPU
+        self.set_temp("nvme", 30.0 + (cpu - 30.0) * 0.4)
+        self.set_temp("acpitz", 30.0 + (cpu - 30.0) * 0.6)
+        self.set_gpu(temps["gpu"], loads.get("gpu", 0.0) * 100)
+        # An idle dGPU runtime-suspends; real work (not a desktop's few percent) wakes it up
+        self.set_gpu_power("active" if loads.get("gpu", 0.0) >= GPU_WAKE_LOAD else "suspended")
+        self.set_cpu(loads.get("cpu", 0.0), throttle_count)
+
+    def power_limit(self):
+        """The package's long-term limit (PL1) in W, as the limiter last set it."""
+        with open(os.path.join(self.powercap_root, "intel-rapl:0", "constraint_0_power_limit_uw")) as f:
+            return int(f.read()) / 1e6
+
+    def fan_targets(self):
+        """Speeds the fake nbfc was last told to apply; auto-mode fans run at 50%."""
+        with open(self.state_file) as f:
+            fans = json.load(f)["fans"]
+        return [50.0 if fan["auto_mode"] else fan["target_speed"] for fan in fans]
+
+    def commands(self):
+        """Argument lists of every nbfc invocation so far."""
+        with open(self.log_file) as f:
+            return [line.split() for line in f if line.strip()]
+
+    def wait_gpu(self, reader, temp, timeout=2.0):
+        """Block until a streaming nvidia-smi reader has seen this temperature."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            latest = reader.latest
+            if latest is not None and latest["temp"] == int(round(temp)):
+                return True
+            time.sleep(0.001)
+        return False
+
+    def __enter__(self):
+        self.saved_path = os.environ.get("PATH", "")
+        os.environ["PATH"] = self.bin + os.pathsep + self.saved_path
+        return self
+
+    def __exit__(self, *exc):
+        os.environ["PATH"] = self.saved_path
+        if self.owned:
+            shutil.rmtree(self.root, ignore_errors=True)
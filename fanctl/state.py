@@ -0,0 +1,90 @@
+"""Persistent settings owned by one in-memory store.
+
+Writers only update memory; the file is rewritten on the core's event loop
+at most once per `delay` seconds, via write-to-temp, fsync and rename, so
+readers never see a truncated file and UI threads never wait on the disk.
+A store without a loop writes its changes when it is closed.
+"""
+import json
+import os
+import threading
+
+
+def state_dir():
+    """/var/lib/fanctl for root, the XDG state directory otherwise."""
+    if os.geteuid() == 0:
+        return "/var/lib/fanctl"
+    state = os.environ.get("XDG_STATE_HOME", os.path.expanduser("~/.local/state"))
+    return os.path.join(state, "fanctl")
+
+
+def default_path():
+    return os.path.join(state_dir(), "state.json")
+
+
+class StateStore:
+    """Dict-like settings with debounced, atomic persistence."""
+
+    def __init__(self, path=None, delay=1.0, loop=None):
+        self.path = path
+        self.delay = delay
+        # fanctl.eventloop.EventLoop for the debounced write, and its pending Later
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.timer = None
+        self.dirty = False
+        self.data = self._load()
+
+    def _load(self):
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"[Error] Loading state: {e}")
+            return {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            if self.data.get(key) == value:
+                return
+            self.data[key] = value
+            self.dirty = True
+            if self.path is not None and self.loop is not None and self.timer is None:
+                self.timer = self.loop.call_later(self.delay, self.flush)
+
+    def flush(self):
+        """Write the current settings now."""
+        with self.lock:
+            self.timer = None
+            self.dirty = False
+            if self.path is None:
+                return
+            payload = json.dumps(self.data, indent=2)
+        tmp = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[Error] Saving state: {e}")
+
+    def close(self):
+        with self.lock:
+            timer, self.timer = self.timer, None
+            dirty = self.dirty
+        if timer is not None:
+            timer.cancel()
+        if dirty:
+            self.flush()
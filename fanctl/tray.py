@@ -0,0 +1,115 @@
+"""System tray icon showing temperature and fan duty at a glance.
+
+The icon is a ring coloured by the hottest temperature (CPU or NVIDIA GPU)
+around a bar filled to the current fan duty. Temperatures and duties are
+bucketed into TEMP_BANDS x DUTY_LEVELS images, each rendered once and
+cached, so an update only swaps the image when a bucket changes. PIL and
+pystray are imported on first use.
+"""
+import functools
+import threading
+
+# (upper bound in °C, ring colour); the last band catches everything hotter
+TEMP_BANDS = ((50, "#50fa7b"), (65, "#f1fa8c"), (80, "#ffb86c"), (None, "#ff5555"))
+# Fan duty is shown in this many steps (0 = stopped)
+DUTY_LEVELS = 5
+IDLE_COLOUR = "#bd93f9"
+SIZE = 64
+
+
+def temp_band(temp):
+    """Index into TEMP_BANDS, or None when no temperature is known."""
+    if temp is None:
+        return None
+    for band, (limit, _) in enumerate(TEMP_BANDS):
+        if limit is None or temp < limit:
+            return band
+    return len(TEMP_BANDS) - 1
+
+
+def duty_level(duty):
+    if duty is None:
+        return 0
+    return min(max(round(duty / 100 * (DUTY_LEVELS - 1)), 0), DUTY_LEVELS - 1)
+
+
+def readings(snapshot):
+    """(hottest temperature, highest fan duty) of a snapshot; either may be None."""
+    temps = [snapshot.cpu_temp]
+    if snapshot.nvidia:
+        temps.append(snapshot.nvidia.get("temp"))
+    temps = [t for t in temps if t is not None]
+    duties = [d for _, d in snapshot.fan_speeds or () if d is not None]
+    return (max(temps) if temps else None), (max(duties) if duties else None)
+
+
+@functools.lru_cache(maxsize=None)
+def image(band, level):
+    """Icon for a temperature band (None: unknown) and duty level."""
+    from PIL import Image, ImageDraw
+
+    colour = IDLE_COLOUR if band is None else TEMP_BANDS[band][1]
+    icon = Image.new("RGBA", (SIZE, SIZE), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(icon)
+    draw.ellipse((4, 4, SIZE - 4, SIZE - 4), outline=colour, width=8)
+    # Duty bar in the middle, filled from the bottom
+    left, right, top, bottom = 26, 38, 16, SIZE - 16
+    draw.rectangle((left, top, right, bottom), outline="#f8f8f2", width=2)
+    if level:
+        fill_top = bottom - (bottom - top) * level // (DUTY_LEVELS - 1)
+        draw.rectangle((left, fill_top, right, bottom), fill=colour)
+    return icon
+
+
+class Tray:
+    """A pystray icon with Show/Exit entries, kept in step with core snapshots."""
+
+    def __init__(self, title, on_show, on_exit):
+        self.title = title
+        self.on_show = on_show
+        self.on_exit = on_exit
+        self.icon = None
+        self.key = None
+        self.text = title
+
+    def start(self, snapshot=None):
+        import pystray
+
+        if snapshot is not None:
+            self._describe(snapshot)
+        menu = pystray.Menu(
+            pystray.MenuItem("Show", lambda icon, item: self.on_show(), default=True),
+            pystray.MenuItem("Exit", lambda icon, item: self.on_exit()),
+        )
+        self.icon = pystray.Icon("fanctl", image(*(self.key or (None, 0))), self.text, menu)
+        threading.Thread(target=self.icon.run, name="fanctl-tray", daemon=True).start()
+
+    def _describe(self, snapshot):
+        """Update key and text; True when the image needs to change."""
+        temp, duty = readings(snapshot)
+        key = (temp_band(temp), duty_level(duty))
+        parts = [self.title]
+        if temp is not None:
+            parts.append(f"{temp:.0f}°C")
+        if duty is not None:
+            parts.append(f"fans {duty}%")
+        self.text = " - ".join(parts)
+        changed, self.key = key != self.key, key
+        return changed
+
+    def update(self, snapshot):
+        """Reflect a snapshot; the image is only swapped when its bucket changed."""
+        icon = self.icon
+        previous = self.text
+        changed = self._describe(snapshot)
+        if icon is None:
+            return
+        if changed:
+            icon.icon = image(*self.key)
+        if self.text != previous:
+            icon.title = self.text
+
+    def stop(self):
+        icon, self.icon = self.icon, None
+        if icon is not None:
+            icon.stop()
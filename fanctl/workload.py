@@ -0,0 +1,269 @@
+"""Workload-aware pre-ramp for Auto mode.
+
+Temperature lags a heavy job by tens of seconds. WorkloadWatcher recognises
+the job itself and hands the controller a duty floor, so the fans are
+already up when the heat arrives:
+
+- process rules match the command name (/proc/PID/comm, shell-style
+  patterns) and/or the cgroup of running processes;
+- load rules match aggregate CPU load and how fast it climbs (%/s), taken
+  from the sampler snapshots.
+
+Processes are found incrementally. As root, exec events arrive from the
+kernel's proc connector, so only processes that just started are looked
+at, and a matching one wakes the sampler at once. Otherwise each sample
+diffs the PIDs in /proc against the previous scan and reads only the new
+ones. Either way the whole process table is read once, at start.
+
+While a rule matches, the floor is its speed (or its fan mode's speed).
+Once nothing matches, the floor falls at `decay` %/s, so the fans follow
+the cooling package down instead of dropping at once.
+
+A rules file looks like:
+
+    {"rules": [
+        {"name": "build", "process": ["make", "ninja", "cc1*", "rustc"], "min_load": 25,
+         "mode": "Performance"},
+        {"name": "steam", "cgroup": "steam", "speed": 70},
+        {"name": "spike", "load_slope": 15, "min_load": 60, "speed": 60, "hold": 20}
+    ], "decay": 2}
+
+Every condition a rule sets must hold; `hold` keeps a rule active for that
+many seconds after its conditions last held.
+"""
+import fnmatch
+import json
+import os
+import socket
+import struct
+from collections import namedtuple
+
+PROC_ROOT = "/proc"
+
+Rule = namedtuple("Rule", "name process cgroup load_slope min_load speed hold",
+                  defaults=((), None, None, None, 0, 0.0))
+
+DEFAULT_RULES = (
+    Rule("build", process=("make", "gmake", "ninja", "cc1", "cc1plus", "rustc", "cargo", "javac",
+                           "go", "clang*", "ld", "ld.lld", "mold", "cmake"), min_load=25, speed=75),
+    Rule("game", process=("*.exe", "wine*-preload", "gamescope", "steam"), min_load=25, speed=75),
+    Rule("spike", load_slope=20, min_load=70, speed=60, hold=20),
+)
+# %/s the floor falls once no rule matches (the default curve's ramp-down)
+DEFAULT_DECAY = 2.0
+
+# Kernel proc connector (linux/connector.h, linux/cn_proc.h)
+_NETLINK_CONNECTOR = 11
+_CN_IDX_PROC = 1
+_CN_VAL_PROC = 1
+_PROC_CN_MCAST_LISTEN = 1
+_PROC_EVENT_EXEC = 0x2
+_NLMSG_DONE = 3
+_NLMSG = struct.Struct("=IHHII")
+_CN_MSG = struct.Struct("=IIIIHH")
+_EVENT = struct.Struct("=IIQII")
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def parse_exec(data):
+    """PID (tgid) of the process in a proc connector exec event; None for other messages."""
+    offset = _NLMSG.size + _CN_MSG.size
+    if len(data) < offset + _EVENT.size:
+        return None
+    what, _, _, _, tgid = _EVENT.unpack_from(data, offset)
+    return tgid if what == _PROC_EVENT_EXEC else None
+
+
+def load(path, modes):
+    """Rules and decay from a rules file; raises ValueError on malformed content."""
+    with open(path) as f:
+        data = json.load(f)
+    rules = []
+    for spec in data.get("rules", []):
+        try:
+            fields = {key: spec[key] for key in Rule._fields if key in spec and key not in ("process", "speed")}
+            fields["process"] = tuple(spec.get("process", ()))
+            if "mode" in spec:
+                if modes.get(spec["mode"], -1) < 0:
+                    raise ValueError(f"mode {spec['mode']!r} has no fixed speed")
+                fields["speed"] = modes[spec["mode"]]
+            else:
+                fields["speed"] = int(spec["speed"])
+            rule = Rule(**fields)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid workload rule {spec!r}: {e}") from None
+        if not (rule.process or rule.cgroup or rule.load_slope is not None or rule.min_load is not None):
+            raise ValueError(f"Workload rule {rule.name!r} has no condition")
+        rules.append(rule)
+    return rules, float(data.get("decay", DEFAULT_DECAY))
+
+
+class ExecMonitor:
+    """Non-blocking listener for process exec events; needs root (CAP_NET_ADMIN)."""
+
+    def __init__(self):
+        self.sock = None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, _NETLINK_CONNECTOR)
+        except (AttributeError, OSError):
+            return
+        try:
+            sock.bind((0, _CN_IDX_PROC))
+            payload = struct.pack("=I", _PROC_CN_MCAST_LISTEN)
+            msg = _CN_MSG.pack(_CN_IDX_PROC, _CN_VAL_PROC, 0, 0, len(payload), 0) + payload
+            sock.send(_NLMSG.pack(_NLMSG.size + len(msg), _NLMSG_DONE, 0, 0, 0) + msg)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            return
+        self.sock = sock
+
+    def started(self):
+        """Drain pending events; PIDs of processes that exec'd since the last call."""
+        pids = []
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(8192)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # Overrun: events were lost; the caller falls back to a /proc scan
+                return None
+            pid = parse_exec(data)
+            if pid is not None:
+                pids.append(pid)
+        return pids
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class WorkloadWatcher:
+    """Turns matching processes and load patterns into a fan-duty floor."""
+
+    def __init__(self, rules=DEFAULT_RULES, decay=DEFAULT_DECAY, proc_root=PROC_ROOT):
+        self.rules = tuple(rules)
+        self.decay = decay
+        self.proc_root = proc_root
+        self.process_rules = [r for r in self.rules if r.process or r.cgroup]
+        self.wants_cgroup = any(r.cgroup for r in self.rules)
+        # PIDs of the last /proc scan, and {pid: rule names} for those matching a process rule
+        self.seen = set()
+        self.matches = {}
+        self.monitor = None
+        self.loop = None
+        self.on_match = None
+        self.until = {}
+        self.floor = 0.0
+        self.active = ()
+        self.scans = 0
+        self._last = None
+        self.scan()
+
+    def _match(self, pid):
+        comm = _read(os.path.join(self.proc_root, str(pid), "comm"))
+        if comm is None:
+            return None
+        cgroup = _read(os.path.join(self.proc_root, str(pid), "cgroup")) if self.wants_cgroup else None
+        names = []
+        for rule in self.process_rules:
+            if rule.process and not any(fnmatch.fnmatchcase(comm, p) for p in rule.process):
+                continue
+            if rule.cgroup and (cgroup is None or rule.cgroup not in cgroup):
+                continue
+            names.append(rule.name)
+        return names
+
+    def _add(self, pids):
+        found = False
+        for pid in pids:
+            names = self._match(pid)
+            if names:
+                self.matches[pid] = names
+                found = True
+            else:
+                # An exec can also turn a matching process into something else
+                self.matches.pop(pid, None)
+        return found
+
+    def scan(self):
+        """Diff /proc against the previous scan; only new PIDs are read."""
+        try:
+            pids = {int(e) for e in os.listdir(self.proc_root) if e.isdigit()}
+        except OSError:
+            return
+        self.scans += 1
+        for pid in self.seen - pids:
+            self.matches.pop(pid, None)
+        new = pids - self.seen
+        self.seen = pids
+        self._add(new)
+
+    def start(self, loop, on_match):
+        """Follow exec events from `loop` (a fanctl.eventloop.EventLoop) when the kernel allows it."""
+        if not self.process_rules:
+            return
+        monitor = ExecMonitor()
+        if monitor.sock is None:
+            return
+        self.monitor, self.loop, self.on_match = monitor, loop, on_match
+        loop.aio.add_reader(monitor.sock.fileno(), self._exec_events)
+
+    def _exec_events(self):
+        pids = self.monitor.started()
+        if pids is None:
+            self.scan()
+        elif self._add(pids):
+            # Ramp now rather than at the next (possibly slow) sample
+            self.on_match()
+
+    def _prune(self):
+        # With exec events only the matching PIDs need checking for exits
+        for pid in list(self.matches):
+            if not os.path.exists(os.path.join(self.proc_root, str(pid))):
+                del self.matches[pid]
+
+    def update(self, snapshot, now):
+        """Duty floor in % for this snapshot (0 when no workload needs one)."""
+        if self.monitor is not None:
+            self._prune()
+        elif self.process_rules:
+            self.scan()
+        load = snapshot.cpu_usage
+        last, self._last = self._last, (now, load)
+        slope = None
+        if last is not None and load is not None and last[1] is not None and now > last[0]:
+            slope = (load - last[1]) / (now - last[0])
+        running = {name for names in self.matches.values() for name in names}
+        target = 0
+        active = []
+        for rule in self.rules:
+            unmet = (rule.process or rule.cgroup) and rule.name not in running
+            unmet = unmet or rule.min_load is not None and (load is None or load < rule.min_load)
+            unmet = unmet or rule.load_slope is not None and (slope is None or slope < rule.load_slope)
+            if not unmet:
+                self.until[rule.name] = now + rule.hold
+            if now <= self.until.get(rule.name, float("-inf")):
+                target = max(target, rule.speed)
+                active.append(rule.name)
+        dt = 0.0 if last is None else now - last[0]
+        # Straight up to a new floor, down at `decay` %/s
+        self.floor = max(float(target), self.floor - self.decay * dt)
+        self.active = tuple(active)
+        return self.floor
+
+    def close(self):
+        if self.monitor is not None:
+            if self.loop is not None:
+                self.loop.aio.remove_reader(self.monitor.sock.fileno())
+            self.monitor.close()
+            self.monitor = None
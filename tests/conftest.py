@@ -0,0 +1,21 @@
+"""Fixtures shared by the tests: fake hardware and a running core event loop."""
+import pytest
+
+from fanctl.eventloop import EventLoop
+from fanctl.sim import Simulation
+
+
+@pytest.fixture
+def sim():
+    """A fanctl.sim.Simulation with its fake tools first on PATH."""
+    with Simulation() as s:
+        yield s
+
+
+@pytest.fixture
+def loop():
+    """A started fanctl.eventloop.EventLoop, stopped after the test."""
+    loop = EventLoop()
+    loop.start()
+    yield loop
+    loop.stop()
@@ -0,0 +1,123 @@
+"""fanctl.actuator: coalescing, slew, deadband and NBFC readback on a simulated clock."""
+import json
+
+import pytest
+
+from fanctl import nbfc
+from fanctl.actuator import MAX_RESENDS, Actuator
+from fanctl.sim import Simulation
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def actuator(backend, **kwargs):
+    clock = Clock()
+    return Actuator(backend, clock=clock, **kwargs), clock
+
+
+def test_requests_are_coalesced():
+    backend = nbfc.StubBackend()
+    act, clock = actuator(backend, min_interval=2.0, max_slew=0)
+    act.request(40)
+    clock.now = 0.5
+    act.request(60)
+    act.request(70)
+    assert backend.calls == [{0: 40, 1: 40}]
+    assert act.coalesced == 2
+    clock.now = 2.0
+    act.flush()
+    assert backend.calls[-1] == {0: 70, 1: 70}
+    assert len(backend.calls) == 2
+
+
+def test_slew_rate_limits_each_write():
+    backend = nbfc.StubBackend(fans=1)
+    act, clock = actuator(backend, min_interval=1.0, max_slew=10.0)
+    act.request(30)
+    clock.now = 2.0
+    act.request(90)
+    assert backend.applied == {0: 50}
+    clock.now = 3.0
+    act.flush()
+    assert backend.applied == {0: 60}
+    assert act.slew_limited == 2
+    # Full speed is never slowed down
+    act.request(100)
+    clock.now = 4.0
+    act.flush()
+    assert backend.applied == {0: 100}
+
+
+def test_deadband_skips_small_changes():
+    backend = nbfc.StubBackend(fans=1)
+    act, clock = actuator(backend, min_interval=0.0, max_slew=0, deadband=2)
+    act.request(50)
+    act.request(51)
+    assert backend.applied == {0: 50}
+    assert act.deadband_skips == 1
+    # Manual modes and overrides are exact
+    act.request(51, exact=True)
+    assert backend.applied == {0: 51}
+
+
+def quantized(steps=7):
+    """A one-fan sim whose EC has `steps` duty levels."""
+    return Simulation(fans=1, speed_steps=steps)
+
+
+def test_quantized_speed_is_accepted_after_bounded_resends():
+    with quantized() as sim:
+        backend = nbfc.CliBackend(state_files=(sim.state_file,))
+        act, clock = actuator(backend, min_interval=0.0, max_slew=0, readback_delay=5.0)
+        act.request(50)
+        # NBFC reports 57.14 % for 50 %: re-sent with a doubling readback delay, then accepted
+        for _ in range(200):
+            clock.now += 1.0
+            act.flush()
+            act.request(50)
+        assert len(sim.commands()) == 1 + MAX_RESENDS
+        assert backend.applied == {0: 57}
+        assert act.settled == {0: {50: 57}}
+        assert act.mismatches == MAX_RESENDS + 1
+        # Asking again for a speed that is known to end up quantised writes nothing
+        clock.now += 60.0
+        act.request(50)
+        assert len(sim.commands()) == 1 + MAX_RESENDS
+
+
+def test_fan_back_in_auto_mode_is_resent(sim):
+    backend = nbfc.CliBackend(state_files=(sim.state_file,))
+    act, clock = actuator(backend, min_interval=0.0, max_slew=0, readback_delay=5.0)
+    act.request(40)
+    with open(sim.state_file) as f:
+        state = json.load(f)
+    for fan in state["fans"]:
+        fan["auto_mode"] = True
+    with open(sim.state_file, "w") as f:
+        json.dump(state, f)
+    clock.now = 5.0
+    act.flush()
+    assert backend.applied == {}
+    clock.now = 5.5
+    act.flush()
+    assert sim.commands()[-1] == ["set", "--speed", "40"]
+    assert sim.fan_targets() == [40.0, 40.0]
+
+
+@pytest.mark.parametrize("steps", [100, 50])
+def test_matching_readback_writes_once(steps):
+    with quantized(steps) as sim:
+        backend = nbfc.CliBackend(state_files=(sim.state_file,))
+        act, clock = actuator(backend, min_interval=0.0, max_slew=0, readback_delay=5.0)
+        act.request(50)
+        for _ in range(30):
+            clock.now += 1.0
+            act.flush()
+        assert len(sim.commands()) == 1
+        assert act.mismatches == 0
@@ -0,0 +1,102 @@
+"""fanctl.configs: recommendations from DMI data, search and the cached index."""
+import json
+import os
+
+import pytest
+
+from fanctl import configs
+from fanctl.configs import ConfigIndex
+
+NAMES = [
+    "Acer Nitro AN515-55",
+    "Asus ROG Strix G531GT",
+    "HP Omen 15-dc0xxx",
+    "HP Pavilion Gaming Laptop 15-ec1xxx",
+    "HP Victus 16-d0xxx",
+    "HP Victus 16-d1xxx",
+    "HP Victus 15-fa0xxx",
+    "Lenovo Legion 5 15ARH05",
+]
+
+VICTUS = {"sys_vendor": "HP", "product_name": "Victus by HP Laptop 16-d0xxx",
+          "product_family": "103C_5335KV HP Victus", "board_name": "88F8"}
+
+
+@pytest.fixture
+def index():
+    return ConfigIndex.from_names(NAMES)
+
+
+def test_recommend_ranks_this_model_first(index):
+    best = index.recommend(VICTUS)
+    assert best[0] == "HP Victus 16-d0xxx"
+    assert set(best) <= {name for name in NAMES if name.startswith("HP")}
+    assert index.recommend({"sys_vendor": "Dell Inc.", "product_name": "XPS 13 9310"}) == []
+
+
+def test_recommend_matches_model_ranges(index):
+    dmi = {"sys_vendor": "Hewlett-Packard", "product_name": "OMEN by HP Laptop 15-dc0023nw"}
+    assert index.recommend(dmi)[0] == "HP Omen 15-dc0xxx"
+
+
+def test_search_prefix_substring_and_fuzzy(index):
+    # Word prefixes rank above the fuzzy match h-p-v-i-c through "HP Pavilion Gaming"
+    assert index.search("hp vic") == ["HP Victus 15-fa0xxx", "HP Victus 16-d0xxx", "HP Victus 16-d1xxx",
+                                      "HP Pavilion Gaming Laptop 15-ec1xxx"]
+    assert index.search("strix") == ["Asus ROG Strix G531GT"]
+    # Substring inside a word, then a subsequence
+    assert index.search("gion") == ["Lenovo Legion 5 15ARH05"]
+    assert index.search("lgn515") == ["Lenovo Legion 5 15ARH05"]
+    assert index.search("nothing like it") == []
+    assert len(index.search("")) == len(NAMES)
+    assert len(index.search("", limit=3)) == 3
+
+
+def test_search_puts_recommendations_first(index):
+    index.recommend(VICTUS)
+    assert index.search("16")[0] == "HP Victus 16-d0xxx"
+
+
+def test_narrowed_search_matches_a_fresh_one(index):
+    typed = "hp victus 16-d1"
+    for n in range(1, len(typed) + 1):
+        narrowed = index.search(typed[:n])
+        assert narrowed == ConfigIndex.from_names(NAMES).search(typed[:n])
+    # Deleting a character searches everything again
+    assert index.search("hp victus 16-d") == ["HP Victus 16-d0xxx", "HP Victus 16-d1xxx"]
+
+
+def test_index_is_cached_until_the_directory_changes(tmp_path):
+    directory = tmp_path / "configs"
+    directory.mkdir()
+    for name in NAMES[:3]:
+        (directory / f"{name}.json").write_text("{}")
+    (directory / "README.md").write_text("")
+    cache = str(tmp_path / "configs.json")
+    index = ConfigIndex.load([str(directory)], cache)
+    assert [name for name, _, _ in index.entries] == NAMES[:3]
+    with open(cache) as f:
+        cached = json.load(f)
+    assert cached["fingerprint"] == configs.fingerprint([str(directory)])
+    # A cache hit does not list the directory again
+    cached["entries"] = [["From the cache", ["from", "the", "cache"]]]
+    with open(cache, "w") as f:
+        json.dump(cached, f)
+    assert ConfigIndex.load([str(directory)], cache).search("") == ["From the cache"]
+    (directory / f"{NAMES[3]}.xml").write_text("<xml/>")
+    os.utime(directory, ns=(0, 1))
+    assert len(ConfigIndex.load([str(directory)], cache)) == 4
+
+
+def test_fallback_names_are_not_cached(tmp_path):
+    cache = str(tmp_path / "configs.json")
+    index = ConfigIndex.load([str(tmp_path / "missing")], cache, fallback=NAMES[:2])
+    assert len(index) == 2
+    assert not os.path.exists(cache)
+
+
+def test_read_dmi(tmp_path):
+    (tmp_path / "sys_vendor").write_text("HP\n")
+    (tmp_path / "product_name").write_text("Victus by HP Laptop 16-d0xxx\n")
+    (tmp_path / "board_name").write_text("\n")
+    assert configs.read_dmi(str(tmp_path)) == {"sys_vendor": "HP", "product_name": "Victus by HP Laptop 16-d0xxx"}
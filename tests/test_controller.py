@@ -0,0 +1,85 @@
+"""fanctl.controller.Controller with the stub backend."""
+import time
+
+from fanctl import hwmon, nbfc
+from fanctl.actuator import FULL_SPEED, Actuator
+from fanctl.controller import THROTTLE_HOLD, Controller
+from fanctl.cpustate import CpuMonitor
+from fanctl.sampler import EMPTY, Sampler, Snapshot
+
+
+def controller(loop=None):
+    backend = nbfc.StubBackend()
+    return Controller(backend, actuator=Actuator(backend, loop=loop), loop=loop), backend
+
+
+def test_override_expires_on_the_loop(loop):
+    ctrl, backend = controller(loop)
+    loop.run(ctrl.set_mode, "Silent")
+    loop.run(ctrl.override, 90, 0.05)
+    assert ctrl.override_speed == 90
+    deadline = time.monotonic() + 5.0
+    while ctrl.override_speed is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ctrl.override_speed is None
+    assert ctrl.mode == "Silent"
+
+
+def test_cleared_override_cancels_its_timer(loop):
+    ctrl, _ = controller(loop)
+    loop.run(ctrl.set_mode, "Balanced")
+    loop.run(ctrl.override, 90, 60.0)
+    timer = ctrl._override_timer
+    loop.run(ctrl.clear_override)
+    assert timer.handle.cancelled()
+    assert ctrl.override_speed is None
+
+
+def test_override_without_a_loop_ends_at_the_next_step():
+    ctrl, _ = controller()
+    ctrl.set_mode("Auto")
+    ctrl.override(100, 0.0)
+    assert ctrl.override_speed == 100
+    ctrl.tick(EMPTY)
+    assert ctrl.override_speed is None
+    assert ctrl.mode == "Auto"
+
+
+def test_throttling_holds_full_duty():
+    ctrl, _ = controller()
+    ctrl.set_mode("Auto")
+    cool = Snapshot(cpu_temp=50.0, throttling=False)
+    ctrl.tick(cool, now=0.0)
+    assert set(ctrl.speeds.values()) != {FULL_SPEED}
+    # The counters moved while the temperature still looks fine
+    ctrl.tick(Snapshot(cpu_temp=50.0, throttling=True), now=1.0)
+    assert ctrl.speeds == {0: FULL_SPEED, 1: FULL_SPEED}
+    assert ctrl.throttle_boosts == 1
+    assert "throttling" in ctrl.status
+    ctrl.tick(cool, now=1.0 + THROTTLE_HOLD - 0.5)
+    assert ctrl.speeds == {0: FULL_SPEED, 1: FULL_SPEED}
+    # Throttling again within the hold extends it without counting a new boost
+    ctrl.tick(Snapshot(cpu_temp=50.0, throttling=True), now=10.0)
+    ctrl.tick(cool, now=10.0 + THROTTLE_HOLD - 0.5)
+    assert ctrl.throttle_boosts == 1
+    ctrl.tick(cool, now=10.0 + THROTTLE_HOLD)
+    assert ctrl.speeds[0] < FULL_SPEED
+    assert "throttling" not in ctrl.status
+
+
+def test_throttle_counters_reach_the_controller(sim):
+    backend = nbfc.StubBackend()
+    sampler = Sampler(hwmon.SensorRegistry(sim.hwmon_root, watch=False), backend,
+                      cpus=CpuMonitor(sim.proc_stat, sim.cpu_root))
+    ctrl = Controller(backend)
+    ctrl.attach(sampler)
+    ctrl.set_mode("Auto")
+    sim.set_cpu(0.3)
+    sampler.sample()
+    assert ctrl.throttle_boosts == 0
+    sim.set_cpu(1.0, throttle_count=1)
+    snapshot = sampler.sample()
+    assert snapshot.throttling and snapshot.throttle_events > 0
+    assert ctrl.throttle_boosts == 1
+    assert ctrl.speeds == {0: FULL_SPEED, 1: FULL_SPEED}
+    sampler.stop()
@@ -0,0 +1,43 @@
+"""fanctl.cpustate.CpuMonitor against fanctl.sim's fake CPU tree."""
+import os
+
+from fanctl.cpustate import CpuMonitor
+from fanctl.sim import CPU_COUNT, SMT
+
+
+def test_throttle_counters_are_read_once_per_core_and_package(sim):
+    sim.set_cpu(0.2)
+    monitor = CpuMonitor(sim.proc_stat, sim.cpu_root)
+    assert len(monitor.core_fds) == CPU_COUNT // SMT
+    assert len(monitor.package_fds) == 1
+    assert monitor.read()["throttling"] is False
+    # Both threads of a core show the same counter: one event per core, not per thread
+    sim.set_cpu(1.0, throttle_count=3)
+    values = monitor.read()
+    assert values["throttling"] is True
+    assert values["throttle_events"] == 3 + 3 * CPU_COUNT // SMT
+    assert monitor.read()["throttling"] is False
+    monitor.close()
+
+
+def test_without_core_ids_every_cpu_counts(sim):
+    for cpu in range(CPU_COUNT):
+        os.remove(os.path.join(sim.cpu_root, f"cpu{cpu}", "topology", "core_id"))
+    sim.set_cpu(0.2)
+    monitor = CpuMonitor(sim.proc_stat, sim.cpu_root)
+    assert len(monitor.core_fds) == CPU_COUNT
+    monitor.close()
+
+
+def test_utilization_and_clocks(sim):
+    sim.set_cpu(0.0)
+    monitor = CpuMonitor(sim.proc_stat, sim.cpu_root)
+    assert monitor.read()["cpu_usage"] is None
+    sim.set_cpu(0.5)
+    values = monitor.read()
+    assert values["cpu_usage"] == 50.0
+    assert values["cpu_cores"] == (50.0,) * CPU_COUNT
+    assert values["cpu_freqs"] == (2500,) * CPU_COUNT
+    # Hidden GUI: no clocks
+    assert "cpu_freqs" not in monitor.read(detail=False)
+    monitor.close()
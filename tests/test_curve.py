@@ -0,0 +1,103 @@
+"""fanctl.curve replayed over recorded temperature traces."""
+import math
+
+from fanctl import curve
+from fanctl.curve import Curve, Point
+
+# (seconds, °C) from a laptop idling at the 60 °C breakpoint: sensor noise of ±1 °C
+HOVER = [(t, 60 + (1 if t % 2 else -1)) for t in range(0, 120)]
+# A compile job: idle, a jump to full load, a plateau, then back to idle
+COMPILE = ([(t, 42.0) for t in range(0, 10)] + [(t, 88.0) for t in range(10, 70)]
+           + [(t, 45.0) for t in range(70, 160)])
+
+LINEAR = (Point(40, 20), Point(60, 50), Point(80, 80), Point(90, 100))
+
+
+def reversals(speeds):
+    """How often the speed changes direction."""
+    count, direction = 0, 0
+    for a, b in zip(speeds, speeds[1:]):
+        if a == b:
+            continue
+        new = 1 if b > a else -1
+        if direction and new != direction:
+            count += 1
+        direction = new
+    return count
+
+
+def test_hysteresis_holds_speed_at_breakpoint():
+    points = tuple(p._replace(hysteresis=3.0) for p in LINEAR)
+    speeds = curve.run(Curve(points=points), HOVER)
+    assert reversals(speeds) <= 1
+    assert len(set(speeds[2:])) == 1
+
+
+def test_without_hysteresis_the_trace_oscillates():
+    # Makes sure HOVER actually exercises the hysteresis band
+    points = tuple(p._replace(hysteresis=0.0) for p in LINEAR)
+    speeds = curve.run(Curve(points=points), HOVER)
+    assert reversals(speeds) > 50
+
+
+def test_ramp_rates_are_respected():
+    fan = Curve(points=LINEAR, ramp_up=10.0, ramp_down=2.0)
+    speeds = curve.run(fan, COMPILE)
+    for (t0, _), (t1, _), a, b in zip(COMPILE, COMPILE[1:], speeds, speeds[1:]):
+        # Speeds are rounded to whole percent
+        assert b - a <= fan.ramp_up * (t1 - t0) + 1
+        assert a - b <= fan.ramp_down * (t1 - t0) + 1
+    # Both limits bind on this trace: 10 %/s up from 23 % to 96 %, 2 %/s down to 32 %
+    assert speeds[9:13] == [23, 33, 43, 53]
+    assert speeds[16:18] == [93, 96]
+    assert speeds[70:73] == [94, 92, 90]
+    assert speeds[-1] == 32
+
+
+def test_ema_follows_time_constant():
+    tau = 8.0
+    fan = Curve(points=LINEAR, smoothing=tau)
+    state = None
+    _, state = curve.step(fan, state, 40.0, 0.0)
+    for _ in range(int(tau)):
+        _, state = curve.step(fan, state, 80.0, 1.0)
+    assert math.isclose(state.temp, 40.0 + 40.0 * (1 - math.exp(-1)), abs_tol=1e-9)
+
+
+def test_ema_does_not_depend_on_sample_rate():
+    fan = Curve(points=LINEAR, smoothing=8.0)
+    fast = [(0, 40.0)] + [(t / 2, 80.0) for t in range(1, 41)]
+    slow = [(0, 40.0)] + [(t * 4, 80.0) for t in range(1, 6)]
+    assert curve.run(fan, fast)[-1] == curve.run(fan, slow)[-1]
+
+
+def test_ema_rises_monotonically_without_overshoot():
+    fan = Curve(points=LINEAR, smoothing=8.0)
+    speeds = curve.run(fan, COMPILE[:70])
+    assert speeds == sorted(speeds)
+    assert speeds[-1] <= curve.interpolate(LINEAR, 88.0)
+
+
+def test_missing_reading_holds_speed():
+    fan = Curve(points=LINEAR, ramp_up=10.0)
+    speeds = curve.run(fan, [(0, 50.0), (1, 70.0), (2, None), (3, None)])
+    assert speeds[2] == speeds[3] == speeds[1]
+    assert curve.run(fan, [(0, None)]) == [None]
+
+
+def test_pid_reaches_max_speed_without_winding_up():
+    fan = Curve(points=(), pid=curve.Pid(70.0), min_speed=0, max_speed=100)
+    # 10 °C over target: 40 % proportional plus 10 % integral per 5 s sample
+    hot = [(t * 5, 80.0) for t in range(20)]
+    speeds = curve.run(fan, hot)
+    assert speeds[:7] == [40, 50, 60, 70, 80, 90, 100]
+    assert speeds[-1] == 100
+    # No integral was stored while saturated: the fan drops as soon as it is cool
+    cool = [(100 + t * 5, 60.0) for t in range(3)]
+    assert curve.run(fan, hot + cool)[20:] == [10, 0, 0]
+
+
+def test_pid_follows_the_feed_forward_curve():
+    fan = Curve(points=LINEAR, pid=curve.Pid(70.0, ki=0.0), min_speed=0, max_speed=100)
+    # At the target only the curve point is left
+    assert curve.run(fan, [(0, 70.0), (5, 70.0)]) == [65, 65]
@@ -0,0 +1,84 @@
+"""fanctl.fanmap per-fan inputs and mapping files."""
+import json
+
+import pytest
+
+from fanctl import curve, fanmap, nbfc
+from fanctl.controller import FAN_MODES, Controller
+from fanctl.sampler import Snapshot
+
+BASE = curve.ladder(FAN_MODES)
+
+# The example from the module docstring
+MAPPING = {"fans": [
+    {"fan": 0, "inputs": {"cpu": 1}},
+    {"fan": 1, "inputs": {"cpu": 0.3, "gpu": 0.7}, "combine": "blend",
+     "curve": [[50, 25], [65, 50], [80, 100, 4]], "ramp_down": 1.5},
+]}
+
+
+def write(tmp_path, data):
+    path = tmp_path / "fans.json"
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_load_mapping_file(tmp_path):
+    fans = fanmap.load(write(tmp_path, MAPPING), BASE)
+    assert [cfg.fan for cfg in fans] == [0, 1]
+    assert fans[0].input == fanmap.FanInput({"cpu": 1}, "max")
+    assert fans[0].curve == BASE
+    gpu_fan = fans[1]
+    assert gpu_fan.input.combine == "blend"
+    assert gpu_fan.curve.points == (curve.Point(50, 25), curve.Point(65, 50), curve.Point(80, 100, 4))
+    assert gpu_fan.curve.ramp_down == 1.5
+    # Settings the file leaves out come from the base curve
+    assert gpu_fan.curve.ramp_up == BASE.ramp_up
+    assert gpu_fan.curve.min_speed == BASE.min_speed
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"fans": []}, "defines no fans"),
+    ({"fans": [{"inputs": {"cpu": 1}}]}, "Invalid fan entry"),
+    ({"fans": [{"fan": 0, "inputs": {"cpu": 1}, "combine": "mean"}]}, "unknown combine 'mean'"),
+])
+def test_malformed_mapping_is_rejected(tmp_path, data, message):
+    with pytest.raises(ValueError, match=message):
+        fanmap.load(write(tmp_path, data), BASE)
+
+
+def test_inputs_combine_and_skip_missing_sensors():
+    snapshot = Snapshot(cpu_temp=60.0, nvidia={"temp": 80}, amd=None, temps={"nvme": 45.0})
+    assert fanmap.snapshot_temp(snapshot, "gpu") == 80
+    assert fanmap.snapshot_temp(snapshot, "nvme") == 45.0
+    assert fanmap.snapshot_temp(snapshot, "acpitz") is None
+    assert fanmap.input_temp(fanmap.FanInput({"cpu": 1, "nvme": 1}), snapshot) == 60.0
+    blend = fanmap.FanInput({"cpu": 0.3, "gpu": 0.7}, "blend")
+    assert fanmap.input_temp(blend, snapshot) == pytest.approx(74.0)
+    # A suspended dGPU has no reading: the blend falls back to the CPU alone
+    assert fanmap.input_temp(blend, Snapshot(cpu_temp=60.0)) == 60.0
+    assert fanmap.input_temp(blend, Snapshot()) is None
+
+
+def test_hwmon_chips_of_a_mapping():
+    fans = [fanmap.FanConfig(0, fanmap.FanInput({"cpu": 1, "nvme": 1}), BASE),
+            fanmap.FanConfig(1, fanmap.FanInput({"acpitz": 1, "gpu": 1}), BASE)]
+    assert fanmap.hwmon_chips(fans) == ["acpitz", "nvme"]
+
+
+def test_default_fans_follow_the_nbfc_fan_names(sim):
+    backend = nbfc.CliBackend(state_files=(sim.state_file,))
+    fans = fanmap.default_fans(backend, BASE)
+    # The sim's fans are "CPU Fan" and "GPU Fan"
+    assert [cfg.input for cfg in fans] == [fanmap.FanInput({"cpu": 1.0}),
+                                          fanmap.FanInput({"cpu": 0.3, "gpu": 0.7}, "blend")]
+
+
+def test_each_fan_follows_its_own_input(tmp_path):
+    mapping = {"fans": [{"fan": 0, "inputs": {"cpu": 1}, "smoothing": 0},
+                        {"fan": 1, "inputs": {"nvme": 1}, "smoothing": 0, "curve": [[30, 20], [60, 80]]}]}
+    backend = nbfc.StubBackend()
+    ctrl = Controller(backend, fanmap.load(write(tmp_path, mapping), BASE))
+    ctrl.set_mode("Auto")
+    ctrl.tick(Snapshot(cpu_temp=45.0, temps={"nvme": 45.0}), now=0.0)
+    assert ctrl.speeds == {0: FAN_MODES["Silent"], 1: 50}
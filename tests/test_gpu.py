@@ -0,0 +1,115 @@
+"""fanctl.gpu against fanctl.sim's fake nvidia-smi."""
+import os
+import time
+
+import pytest
+
+from fanctl import gpu, hwmon
+from fanctl.sim import GPU_NAME
+
+
+def provider(sim, loop, mode="smi", interval=0.05, nvidia_smi=None):
+    sensors = hwmon.SensorRegistry(sim.hwmon_root, watch=False)
+    return gpu.GpuProvider(sensors, mode, interval=interval, pci_root=sim.pci_root, loop=loop,
+                           nvidia_smi=nvidia_smi or os.path.join(sim.bin, "nvidia-smi"))
+
+
+def read_until(loop, gpus, check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        values = loop.run(gpus.read)
+        if check(values):
+            return values
+        time.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_parse_nvidia_csv():
+    assert gpu.parse_nvidia_csv(f"0, {GPU_NAME}, 37, 61, 1024, 4096") == {
+        "index": 0, "name": GPU_NAME, "usage": 37, "temp": 61, "mem_used": 1024, "mem_total": 4096}
+    with pytest.raises(ValueError):
+        gpu.parse_nvidia_csv("[N/A]")
+
+
+def test_stream_follows_readings(sim, loop):
+    gpus = provider(sim, loop)
+    assert gpus.mode == "smi"
+    values = read_until(loop, gpus, lambda v: v["nvidia"] is not None)
+    assert values["nvidia"]["name"] == GPU_NAME
+    assert values["amd"] is None
+    sim.set_gpu(72.0, 90)
+    assert sim.wait_gpu(gpus.nvidia, 72.0)
+    assert loop.run(gpus.read)["nvidia"]["usage"] == 90
+    loop.wait(gpus.wait_closed())
+    assert gpus.nvidia.running is None
+
+
+def test_suspended_gpu_is_not_queried(sim, loop):
+    gpus = provider(sim, loop)
+    read_until(loop, gpus, lambda v: v["nvidia"] is not None)
+    sim.set_gpu_power("suspended")
+    assert loop.run(gpus.read)["nvidia"] is None
+    assert gpus.nvidia.task is None
+    sim.set_gpu_power("active")
+    read_until(loop, gpus, lambda v: v["nvidia"] is not None)
+    loop.wait(gpus.wait_closed())
+
+
+def test_failing_stream_backs_off_and_gives_up(sim, loop, capsys):
+    failing = os.path.join(sim.bin, "nvidia-smi-broken")
+    with open(failing, "w") as f:
+        f.write("#!/bin/sh\necho 'Failed to initialize NVML: Driver/library version mismatch' >&2\nexit 9\n")
+    os.chmod(failing, 0o755)
+    gpus = provider(sim, loop, nvidia_smi=failing, interval=0.01)
+    reader = gpus.nvidia
+    read_until(loop, gpus, lambda v: gpus.mode == "sysfs")
+    assert reader.failed
+    assert reader.failures == reader.MAX_FAILURES
+    assert gpus.nvidia is None
+    out = capsys.readouterr().out
+    assert out.count("exited with status 9: Failed to initialize NVML") == reader.MAX_FAILURES
+    assert "restarting in 0.01s" in out and "restarting in 0.08s" in out
+    assert "NVIDIA readings disabled" in out
+
+
+def test_sysfs_mode_without_loop(sim):
+    gpus = provider(sim, None, mode="auto")
+    assert gpus.mode == "sysfs"
+    assert gpus.read() == {"nvidia": None, "amd": None}
+
+
+def test_idle_gpu_is_released_until_it_wakes(sim, loop):
+    gpus = provider(sim, loop)
+    sim.set_gpu(45.0, 0)
+    read_until(loop, gpus, lambda v: v["nvidia"] is not None)
+    reader = gpus.nvidia
+    for _ in range(gpu.IDLE_RELEASE - 1):
+        assert loop.run(gpus.read)["nvidia"] is not None
+    # The stream is stopped and its process reaped, so the driver can suspend the GPU
+    assert reader.task is None
+    loop.wait(reader.wait_closed())
+    assert reader.running is None
+    # Still active but idle: left alone
+    assert loop.run(gpus.read)["nvidia"] is None
+    assert reader.task is None
+    sim.set_gpu_power("suspended")
+    assert loop.run(gpus.read)["nvidia"] is None
+    # Woken by something else: read again
+    sim.set_gpu(70.0, 80)
+    sim.set_gpu_power("active")
+    values = read_until(loop, gpus, lambda v: v["nvidia"] is not None)
+    assert values["nvidia"]["usage"] == 80
+    assert gpus.released_at is None
+    loop.wait(gpus.wait_closed())
+
+
+def test_gpu_that_never_suspends_is_read_again(sim, loop, monkeypatch):
+    monkeypatch.setattr(gpu, "RELEASE_GRACE", 0.0)
+    gpus = provider(sim, loop)
+    sim.set_gpu(45.0, 0)
+    read_until(loop, gpus, lambda v: v["nvidia"] is not None)
+    for _ in range(gpu.IDLE_RELEASE - 1):
+        loop.run(gpus.read)
+    assert gpus.released_at is not None
+    read_until(loop, gpus, lambda v: v["nvidia"] is not None)
+    loop.wait(gpus.wait_closed())
@@ -0,0 +1,88 @@
+"""Control socket: a hosted Core served over fanctl.ipc, and RemoteCore attached to it."""
+import threading
+import time
+
+import pytest
+
+from fanctl import hwmon, ipc, nbfc
+from fanctl.core import Core, RemoteCore
+
+
+@pytest.fixture
+def core(sim, tmp_path):
+    sensors = hwmon.SensorRegistry(sim.hwmon_root, watch=False)
+    core = Core(nbfc.StubBackend(), sensors=sensors, gpu_mode="sysfs", interval=0.2, history=False,
+                state=False, workloads=False, power_limits=False)
+    core.start(serve=True, socket_path=str(tmp_path / "fanctl.sock"))
+    yield core
+    core.stop()
+    sensors.close()
+
+
+def wait_for(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_requests(core):
+    client = ipc.connect([core.server.path])
+    try:
+        assert client.call("get_mode")["mode"] == "Silent"
+        client.call("set_mode", mode="Balanced")
+        assert wait_for(lambda: core.backend.applied == {0: 50, 1: 50})
+        assert client.call("get_mode")["mode"] == "Balanced"
+        assert client.call("snapshot")["snapshot"]["cpu_temp"] == 40.0
+        status = nbfc.parse_status(client.call("nbfc_status")["state"])
+        assert status.config == "stub"
+        with pytest.raises(ipc.IpcError, match="Unknown fan mode"):
+            client.call("set_mode", mode="Loud")
+        with pytest.raises(ipc.IpcError, match="unknown command"):
+            client.call("nonsense")
+    finally:
+        client.close()
+
+
+def test_remote_core_follows_events(core):
+    remote = RemoteCore(ipc.connect([core.server.path]), core.server.path)
+    seen = []
+    changed = threading.Event()
+
+    def on_status(mode, status):
+        seen.append(mode)
+        if mode == "Turbo":
+            changed.set()
+    remote.add_status_listener(on_status)
+    remote.start()
+    try:
+        assert remote.mode == "Silent"
+        assert wait_for(lambda: remote.snapshot.seq > 0)
+        # The subscription is live once snapshots arrive; mode changes follow
+        remote.set_mode("Turbo")
+        assert changed.wait(5.0)
+        assert remote.mode == "Turbo"
+        assert wait_for(lambda: core.backend.applied == {0: 100, 1: 100})
+        assert remote.nbfc_status().fans[0].target_speed == 100.0
+    finally:
+        remote.stop()
+
+
+def test_second_server_is_refused(core):
+    other = ipc.Server(core, core.server.path)
+    with pytest.raises(OSError, match="already listening"):
+        core.loop.wait(other.start())
+
+
+def test_connect_without_controller(tmp_path):
+    assert ipc.connect([str(tmp_path / "missing.sock")]) is None
+
+
+def test_connect_refuses_an_inaccessible_controller(monkeypatch, tmp_path):
+    def denied(path, timeout=2.0):
+        raise PermissionError(13, "Permission denied", path)
+    monkeypatch.setattr(ipc, "Client", denied)
+    with pytest.raises(PermissionError, match="group"):
+        ipc.connect([str(tmp_path / "root.sock")])
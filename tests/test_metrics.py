@@ -0,0 +1,16 @@
+"""fanctl.metrics rendering from in-memory state."""
+from fanctl import hwmon, nbfc
+from fanctl.controller import Controller
+from fanctl.metrics import Exporter
+from fanctl.sampler import Sampler
+
+
+def test_fan_duty_is_labelled_with_the_nbfc_fan_id(sim):
+    backend = nbfc.StubBackend(fans=3)
+    backend.set_speeds({1: 45, 2: 70})
+    sampler = Sampler(hwmon.SensorRegistry(sim.hwmon_root, watch=False), backend)
+    sampler.sample()
+    text = Exporter(sampler, Controller(backend), backend).render()
+    duty = [line for line in text.splitlines() if line.startswith("fanctl_fan_duty_percent{")]
+    assert duty == ['fanctl_fan_duty_percent{fan="1"} 45', 'fanctl_fan_duty_percent{fan="2"} 70']
+    assert "fanctl_nbfc_writes_total 1" in text
@@ -0,0 +1,101 @@
+"""fanctl.nbfc backends: the stub, and the CLI client against fanctl.sim's fake nbfc."""
+import asyncio
+
+from fanctl import nbfc
+
+
+def test_stub_skips_identical_writes():
+    backend = nbfc.StubBackend()
+    assert backend.set_speeds(40)
+    assert backend.set_speeds(40)
+    assert backend.set_speeds({0: 40, 1: 40})
+    assert backend.calls == [{0: 40, 1: 40}]
+    assert backend.writes == 1
+    assert backend.skipped == 2
+
+
+def test_stub_writes_only_changed_fans():
+    backend = nbfc.StubBackend(fans=3)
+    backend.set_speeds(30)
+    backend.set_speeds({0: 30, 1: 60, 2: 30})
+    assert backend.calls == [{0: 30, 1: 30, 2: 30}, {1: 60}]
+    assert backend.applied == {0: 30, 1: 60, 2: 30}
+
+
+def test_stub_failure_is_retried():
+    backend = nbfc.StubBackend(fail=True)
+    assert not backend.set_speeds(50)
+    assert backend.errors == 1
+    assert backend.last_error == "stub backend failure"
+    assert backend.applied == {}
+    backend.fail = False
+    assert backend.set_speeds(50)
+    assert backend.calls == [{0: 50, 1: 50}]
+    assert backend.last_error is None
+
+
+def test_stub_forget_rewrites():
+    backend = nbfc.StubBackend()
+    backend.set_speeds(70)
+    backend.forget()
+    backend.set_speeds(70)
+    assert len(backend.calls) == 2
+
+
+def test_stub_async_and_status():
+    backend = nbfc.StubBackend()
+    assert asyncio.run(backend.set_speeds_async({0: 25, 1: 45}))
+    status = nbfc.parse_status(backend.status())
+    assert status.config == "stub"
+    assert [fan.target_speed for fan in status.fans] == [25.0, 45.0]
+
+
+def test_cli_batches_fans_without_restart(sim):
+    backend = nbfc.CliBackend(state_files=(sim.state_file,))
+    assert backend.fan_count() == 2
+    assert backend.set_speeds(60)
+    assert backend.set_speeds(60)
+    assert backend.set_speeds({0: 60, 1: 80})
+    assert sim.commands() == [["set", "--speed", "60"], ["set", "--fan", "1", "--speed", "80"]]
+    assert sim.fan_targets() == [60.0, 80.0]
+
+
+def test_cli_async_write(sim):
+    backend = nbfc.CliBackend(state_files=(sim.state_file,))
+    assert asyncio.run(backend.set_speeds_async(35))
+    assert sim.commands() == [["set", "--speed", "35"]]
+
+
+def test_cli_failure_is_reported(sim):
+    backend = nbfc.CliBackend(nbfc="/nonexistent/nbfc", state_files=(sim.state_file,))
+    assert not asyncio.run(backend.set_speeds_async(35))
+    assert backend.errors == 1
+    assert backend.applied == {}
+
+
+def test_parse_status_reads_nbfc_linux_state():
+    state = {"pid": 812, "selected_config_id": "HP Victus 16-d0xxx", "read_only": False, "fans": [
+        {"name": "CPU Fan", "temperature": 61.5, "auto_mode": True, "critical": False,
+         "current_speed": 41.2, "target_speed": 40.0, "speed_steps": 48}]}
+    status = nbfc.parse_status(state)
+    assert status.config == "HP Victus 16-d0xxx"
+    assert status.read_only is False
+    assert status.temperature == 61.5
+    assert status.fans == (nbfc.FanStatus("CPU Fan", True, False, 61.5, 41.2, 40.0),)
+
+
+def test_parse_status_accepts_older_spellings():
+    status = nbfc.parse_status({"config": "Old", "read-only": True, "fans": [{"automode": False}]})
+    assert status.config == "Old"
+    assert status.read_only is True
+    assert status.fans[0].automode is False
+    assert status.fans[0].name == "Fan 0"
+    assert nbfc.parse_status(None) is None
+
+
+def test_cli_status_of_the_sim(sim):
+    backend = nbfc.CliBackend(state_files=(sim.state_file,))
+    backend.set_speeds({0: 30})
+    status = nbfc.parse_status(backend.status())
+    assert status.config == "Simulated Laptop"
+    assert [fan.automode for fan in status.fans] == [False, True]
@@ -0,0 +1,101 @@
+"""fanctl.powercap.PowerLimiter against fanctl.sim's fake powercap tree."""
+import os
+
+import pytest
+
+from fanctl.powercap import PowerLimiter
+from fanctl.sim import POWER_LIMITS
+
+
+def limit(sim, n):
+    with open(os.path.join(sim.powercap_root, "intel-rapl:0", f"constraint_{n}_power_limit_uw")) as f:
+        return int(f.read())
+
+
+def test_scan_finds_package_limits(sim):
+    limiter = PowerLimiter(sim.powercap_root)
+    # PL1 and PL2 of the package; peak_power and the core subzone are left alone
+    assert sorted(limiter.labels.values()) == [("intel-rapl:0", "long_term"), ("intel-rapl:0", "short_term")]
+    assert limiter.active
+    assert limiter.saved() is None
+
+
+def test_no_powercap_tree(tmp_path):
+    limiter = PowerLimiter(str(tmp_path / "missing"))
+    assert not limiter.active
+    assert limiter.step(99.0, True, 1.0) == 1.0
+
+
+def test_lowers_holds_and_restores(sim):
+    limiter = PowerLimiter(sim.powercap_root, limit_temp=90.0, release_temp=82.0, min_scale=0.5,
+                           down_rate=0.05, up_rate=0.025)
+    # Hot but the fans still have headroom: nothing changes
+    assert limiter.step(95.0, False, 1.0) == 1.0
+    for _ in range(4):
+        limiter.step(95.0, True, 1.0)
+    assert limiter.scale == pytest.approx(0.8)
+    assert limiter.reductions == 1
+    assert limit(sim, 0) == 48000000
+    assert limit(sim, 1) == 64000000
+    assert limiter.saved() == {path: POWER_LIMITS[c] for path, (_, c) in limiter.labels.items()}
+    # Between release_temp and limit_temp the limits hold
+    limiter.step(86.0, True, 5.0)
+    assert limiter.scale == pytest.approx(0.8)
+    # Cool again: climb back at up_rate
+    limiter.step(80.0, False, 4.0)
+    assert limiter.scale == pytest.approx(0.9)
+    limiter.step(80.0, False, 10.0)
+    assert limiter.scale == 1.0
+    assert limit(sim, 0) == POWER_LIMITS["long_term"]
+    assert limiter.saved() is None
+    # The untouched constraint stays as it was
+    assert limit(sim, 2) == POWER_LIMITS["peak_power"]
+
+
+def test_floor_at_min_scale(sim):
+    limiter = PowerLimiter(sim.powercap_root, min_scale=0.5, down_rate=0.1)
+    limiter.step(99.0, True, 60.0)
+    assert limiter.scale == 0.5
+    assert limit(sim, 0) == 30000000
+
+
+def test_restore_and_saved_limits_of_a_crashed_run(sim):
+    limiter = PowerLimiter(sim.powercap_root, down_rate=0.1)
+    limiter.step(99.0, True, 2.0)
+    saved = limiter.saved()
+    # A new run starts with the lowered limits still in place and restores the saved ones
+    again = PowerLimiter(sim.powercap_root, saved=saved)
+    assert again.saved() == saved
+    again.restore()
+    assert limit(sim, 0) == POWER_LIMITS["long_term"]
+    assert limit(sim, 1) == POWER_LIMITS["short_term"]
+    assert again.saved() is None
+
+
+def test_reapply_after_firmware_reset(sim):
+    limiter = PowerLimiter(sim.powercap_root, down_rate=0.1)
+    limiter.step(99.0, True, 2.0)
+    lowered = limit(sim, 0)
+    with open(os.path.join(sim.powercap_root, "intel-rapl:0", "constraint_0_power_limit_uw"), "w") as f:
+        f.write(f"{POWER_LIMITS['long_term']}\n")
+    limiter.reapply()
+    assert limit(sim, 0) == lowered
+
+
+def test_write_error_puts_limits_back_and_disables(sim, capsys):
+    limiter = PowerLimiter(sim.powercap_root, down_rate=0.1)
+    limiter.step(99.0, True, 1.0)
+    assert limit(sim, 0) < POWER_LIMITS["long_term"]
+    # PL2 becomes unwritable: the next step lowers PL1, fails on PL2 and undoes PL1
+    pl2 = os.path.join(sim.powercap_root, "intel-rapl:0", "constraint_1_power_limit_uw")
+    os.remove(pl2)
+    os.mkdir(pl2)
+    limiter.step(99.0, True, 1.0)
+    assert "power limiting disabled" in capsys.readouterr().out
+    assert not limiter.active
+    assert limiter.scale == 1.0
+    assert limit(sim, 0) == POWER_LIMITS["long_term"]
+    # Disabled: further steps and reapply() leave the limits alone
+    assert limiter.step(99.0, True, 10.0) == 1.0
+    limiter.reapply()
+    assert limit(sim, 0) == POWER_LIMITS["long_term"]
@@ -0,0 +1,98 @@
+"""fanctl.sampler against fanctl.sim's fake hardware."""
+import math
+import time
+
+import pytest
+
+from fanctl import hwmon, nbfc, schedule
+from fanctl import sampler as sampler_module
+from fanctl.controller import Controller
+from fanctl.history import History
+from fanctl.sampler import Sampler
+from fanctl.schedule import AdaptiveInterval
+
+
+def test_fan_speeds_keep_the_nbfc_fan_ids(sim):
+    backend = nbfc.StubBackend(fans=3)
+    backend.set_speeds({0: 30, 2: 60})
+    sampler = Sampler(hwmon.SensorRegistry(sim.hwmon_root, watch=False), backend)
+    snapshot = sampler.sample()
+    assert snapshot.fan_speeds == ((0, 30), (2, 60))
+    history = History(capacity=4)
+    history.record(snapshot)
+    assert history.rings["fan0"].last()[1] == 30
+    assert math.isnan(history.rings["fan1"].last()[1])
+    assert history.rings["fan2"].last()[1] == 60
+
+
+class Suspend:
+    """Stands in for schedule.suspended_seconds()."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __call__(self):
+        return self.seconds
+
+
+def started(sim, loop, monkeypatch, timerfd=True):
+    suspend = Suspend()
+    monkeypatch.setattr(sampler_module, "suspended_seconds", suspend)
+    if not timerfd:
+        monkeypatch.setattr(schedule, "_timerfd", lambda: (None, None))
+    backend = nbfc.StubBackend()
+    sampler = Sampler(hwmon.SensorRegistry(sim.hwmon_root, watch=False), backend,
+                      schedule=AdaptiveInterval(base=60.0, fast=60.0, slow=60.0))
+    ctrl = Controller(backend)
+    ctrl.attach(sampler)
+    ctrl.set_mode("Balanced")
+    events = []
+    sampler.add_resume_listener(lambda: events.append("resume"))
+    sampler.add_listener(lambda snapshot: events.append(snapshot.seq))
+    loop.run(sampler.start, loop)
+    return sampler, backend, suspend, events
+
+
+def fire(loop, sampler):
+    """Let the pending sample timer expire now, as it does right after a resume."""
+    if sampler.wake is not None:
+        loop.run(sampler.wake.arm, 0.0)
+    else:
+        loop.run(sampler.timer.cancel)
+        loop.call(sampler._tick)
+
+
+def wait_for(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("timerfd", [True, False])
+def test_resume_runs_listeners_before_the_next_sample(sim, loop, monkeypatch, timerfd):
+    sampler, backend, suspend, events = started(sim, loop, monkeypatch, timerfd)
+    if not timerfd:
+        assert sampler.wake is None and sampler.timer is not None
+    assert events == [1]
+    # Slept for a minute while the timer was pending
+    suspend.seconds = 60.0
+    fire(loop, sampler)
+    wait_for(lambda: len(events) == 3)
+    assert events == [1, "resume", 2]
+    # The controller re-sent the mode to the embedded controller
+    assert backend.calls == [{0: 50, 1: 50}, {0: 50, 1: 50}]
+    # The next timer is armed from the new suspend total: no second resume
+    fire(loop, sampler)
+    wait_for(lambda: len(events) == 4)
+    assert events[-1] == 3
+    loop.run(sampler.stop)
+
+
+def test_short_stall_is_not_a_resume(sim, loop, monkeypatch):
+    sampler, _, suspend, events = started(sim, loop, monkeypatch)
+    suspend.seconds = 0.5
+    fire(loop, sampler)
+    wait_for(lambda: len(events) == 2)
+    assert events == [1, 2]
+    loop.run(sampler.stop)
@@ -0,0 +1,41 @@
+"""fanctl.state.StateStore persistence."""
+import json
+import time
+
+from fanctl.state import StateStore
+
+
+def saved(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_writes_are_debounced_on_the_loop(tmp_path, loop):
+    path = tmp_path / "state.json"
+    store = StateStore(str(path), delay=0.05, loop=loop)
+    store.set("mode", "Silent")
+    store.set("mode", "Turbo")
+    assert not path.exists()
+    deadline = time.monotonic() + 5.0
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert saved(path) == {"mode": "Turbo"}
+    assert store.timer is None
+    assert StateStore(str(path)).get("mode") == "Turbo"
+
+
+def test_close_writes_what_is_pending(tmp_path, loop):
+    path = tmp_path / "state.json"
+    store = StateStore(str(path), delay=60.0, loop=loop)
+    store.set("mode", "Auto")
+    store.close()
+    assert saved(path) == {"mode": "Auto"}
+
+
+def test_without_a_loop_close_writes(tmp_path):
+    path = tmp_path / "state.json"
+    store = StateStore(str(path))
+    store.set("probes", {"version": "0.3"})
+    assert not path.exists()
+    store.close()
+    assert saved(path) == {"probes": {"version": "0.3"}}
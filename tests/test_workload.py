@@ -0,0 +1,149 @@
+"""fanctl.workload rules against a fake /proc, and proc connector messages."""
+import json
+import socket
+import struct
+
+import pytest
+
+from fanctl import workload
+from fanctl.controller import FAN_MODES
+from fanctl.sampler import Snapshot
+from fanctl.workload import Rule, WorkloadWatcher
+
+
+class FakeProc:
+    """A /proc with only comm and cgroup files."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def spawn(self, pid, comm, cgroup="0::/user.slice/session-2.scope"):
+        path = self.root / str(pid)
+        path.mkdir(exist_ok=True)
+        (path / "comm").write_text(comm + "\n")
+        (path / "cgroup").write_text(cgroup + "\n")
+
+    def exit(self, pid):
+        for name in ("comm", "cgroup"):
+            (self.root / str(pid) / name).unlink()
+        (self.root / str(pid)).rmdir()
+
+
+@pytest.fixture
+def proc(tmp_path):
+    fake = FakeProc(tmp_path)
+    fake.spawn(1, "systemd", "0::/init.scope")
+    return fake
+
+
+def exec_event(pid, what=workload._PROC_EVENT_EXEC):
+    """One proc connector message as the kernel sends it."""
+    event = struct.pack("=IIQII", what, 0, 123456789, pid, pid)
+    cn = struct.pack("=IIIIHH", workload._CN_IDX_PROC, workload._CN_VAL_PROC, 0, 0, len(event), 0)
+    return struct.pack("=IHHII", 16 + len(cn) + len(event), workload._NLMSG_DONE, 0, 0, 0) + cn + event
+
+
+def load(tmp_path, data):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(data))
+    return workload.load(str(path), FAN_MODES)
+
+
+def test_load_rules_file(tmp_path):
+    rules, decay = load(tmp_path, {"rules": [
+        {"name": "build", "process": ["make", "cc1*"], "min_load": 25, "mode": "Performance"},
+        {"name": "steam", "cgroup": "steam", "speed": 70},
+    ], "decay": 3})
+    assert rules == [Rule("build", process=("make", "cc1*"), min_load=25, speed=75),
+                     Rule("steam", cgroup="steam", speed=70)]
+    assert decay == 3.0
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"name": "x", "speed": 50}, "has no condition"),
+    ({"name": "x", "process": ["make"], "mode": "Auto"}, "has no fixed speed"),
+    ({"process": ["make"], "speed": 50}, "Invalid workload rule"),
+])
+def test_malformed_rules_are_rejected(tmp_path, spec, message):
+    with pytest.raises(ValueError, match=message):
+        load(tmp_path, {"rules": [spec]})
+
+
+def test_process_rule_raises_the_floor_and_decays(proc):
+    watcher = WorkloadWatcher([Rule("build", process=("make", "cc1*"), min_load=25, speed=75)],
+                              decay=2.0, proc_root=str(proc.root))
+    busy = Snapshot(cpu_usage=80.0)
+    assert watcher.update(busy, 0.0) == 0.0
+    proc.spawn(200, "cc1plus")
+    assert watcher.update(busy, 1.0) == 75.0
+    assert watcher.active == ("build",)
+    # Matched but the CPU is idle: the rule's load condition fails
+    assert watcher.update(Snapshot(cpu_usage=5.0), 2.0) == 73.0
+    proc.exit(200)
+    assert watcher.update(busy, 3.0) == 71.0
+    assert watcher.active == ()
+    assert watcher.update(busy, 40.0) == 0.0
+
+
+def test_scans_read_only_new_pids(proc):
+    proc.spawn(300, "bash")
+    watcher = WorkloadWatcher([Rule("build", process=("make",), speed=75)], proc_root=str(proc.root))
+    # An existing PID is not read again, even if its comm changes without an exec event
+    (proc.root / "300" / "comm").write_text("make\n")
+    watcher.update(Snapshot(), 0.0)
+    assert watcher.matches == {}
+    proc.spawn(301, "make")
+    watcher.update(Snapshot(), 1.0)
+    assert watcher.matches == {301: ["build"]}
+    assert watcher.scans == 3
+
+
+def test_cgroup_rule(proc):
+    watcher = WorkloadWatcher([Rule("steam", cgroup="steam", speed=70)], proc_root=str(proc.root))
+    proc.spawn(400, "reaper", "0::/user.slice/app-steam.scope")
+    assert watcher.update(Snapshot(), 0.0) == 70.0
+
+
+def test_load_spike_rule_holds():
+    watcher = WorkloadWatcher([Rule("spike", load_slope=20, min_load=70, speed=60, hold=20)], decay=2.0)
+    assert watcher.update(Snapshot(cpu_usage=10.0), 0.0) == 0.0
+    # 10 % -> 90 % in two seconds: 40 %/s
+    assert watcher.update(Snapshot(cpu_usage=90.0), 2.0) == 60.0
+    # Still loaded but no longer climbing: held for 20 s, then decaying
+    assert watcher.update(Snapshot(cpu_usage=90.0), 22.0) == 60.0
+    assert watcher.update(Snapshot(cpu_usage=90.0), 23.0) == 58.0
+
+
+def test_parse_exec():
+    assert workload.parse_exec(exec_event(4242)) == 4242
+    # fork events and truncated messages are ignored
+    assert workload.parse_exec(exec_event(4242, what=0x1)) is None
+    assert workload.parse_exec(exec_event(4242)[:30]) is None
+
+
+def test_exec_events_wake_the_sampler(proc):
+    ours, kernel = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    monitor = workload.ExecMonitor.__new__(workload.ExecMonitor)
+    monitor.sock = ours
+    ours.setblocking(False)
+    watcher = WorkloadWatcher([Rule("build", process=("make",), speed=75)], proc_root=str(proc.root))
+    woken = []
+    watcher.monitor, watcher.on_match = monitor, lambda: woken.append(True)
+    proc.spawn(500, "bash")
+    proc.spawn(501, "make")
+    kernel.send(exec_event(500))
+    kernel.send(exec_event(501, what=0x1))
+    watcher._exec_events()
+    assert woken == [] and watcher.matches == {}
+    kernel.send(exec_event(501))
+    watcher._exec_events()
+    assert woken == [True]
+    assert watcher.matches == {501: ["build"]}
+    assert watcher.update(Snapshot(), 0.0) == 75.0
+    # With exec events only the matching PIDs are checked for exits, no /proc scan
+    proc.exit(501)
+    assert watcher.update(Snapshot(), 1.0) == 73.0
+    assert watcher.matches == {}
+    assert watcher.scans == 1
+    watcher.close()
+    kernel.close()